@@ -1,6 +1,6 @@
 
 from fastapi import APIRouter
-from app.api import modules, execute, upload, history
+from app.api import modules, execute, upload, history, jobs, admin
 
 api_router = APIRouter()
 
@@ -9,3 +9,5 @@ api_router.include_router(modules.router, prefix="/modules", tags=["modules"])
 api_router.include_router(execute.router, prefix="/execute", tags=["execute"])
 api_router.include_router(upload.router, prefix="/upload", tags=["upload"])
 api_router.include_router(history.router, prefix="/history", tags=["history"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
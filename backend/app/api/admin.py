@@ -0,0 +1,76 @@
+"""
+管理API - 数据库大小、数据保留、模块目录和响应缓存状态
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+from app.core.database import async_db
+from app.services.catalog_discovery import catalog_discovery
+from app.services.response_cache import response_cache
+from app.services.retention import retention_manager
+
+router = APIRouter()
+
+
+@router.get("/db")
+async def get_db_status():
+    """获取数据库文件大小、页使用情况、各表行数和数据保留状态"""
+    try:
+        return {
+            "storage": await async_db.get_storage_stats(),
+            "retention": retention_manager.stats(),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/db/prune")
+async def prune_db():
+    """立即执行一次数据保留规则并回收空间"""
+    try:
+        result = await retention_manager.run_once()
+        return {"success": True, "message": "清理完成", "result": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/db/vacuum")
+async def vacuum_db():
+    """把已有数据库一次性切换为增量回收模式
+
+    执行完整VACUUM：期间写入会等待，耗时与数据库大小成正比，需要最多两倍数据库大小的
+    磁盘空间。新建的数据库已是增量模式，不需要调用。
+    """
+    try:
+        result = await async_db.enable_incremental_vacuum()
+        message = "已切换为增量回收" if result["converted"] else "已是增量回收模式"
+        return {"success": True, "message": message, "result": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/catalog")
+async def get_catalog_status():
+    """获取模块目录来源（静态/自动发现）、源码指纹和最近一次内省结果"""
+    return catalog_discovery.stats()
+
+
+@router.post("/catalog/refresh")
+async def refresh_catalog():
+    """立即重新内省ai_toolkit并更新模块目录"""
+    try:
+        return await catalog_discovery.refresh(force=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache")
+async def get_response_cache_stats():
+    """获取响应缓存统计（命中率、条数、内存占用、淘汰和失效次数）"""
+    return response_cache.stats()
+
+
+@router.delete("/cache")
+async def clear_response_cache(namespace: str = Query(None, pattern="^(history|favorites)$")):
+    """清除响应缓存，不指定命名空间时清除全部"""
+    removed = response_cache.invalidate(namespace) if namespace else response_cache.clear_all()
+    return {"success": True, "message": "缓存已清除", "removed": removed}
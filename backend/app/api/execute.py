@@ -1,111 +1,524 @@
-
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from app.models.execute import ExecuteRequest, ExecuteResponse
-from app.core.database import db
-import subprocess
-import asyncio
-import os
-import sys
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Query
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.api.modules import find_command, find_module, validate_params
+from app.models.execute import (
+    BatchExecuteRequest, ExecuteRequest, ExecuteResponse, ExecutionResult
+)
+from app.core.config import settings
+from app.services.executor import (
+    build_command_args, get_ai_toolkit_path, resolve_limits, run_command,
+    stream_command, timeout_message,
+)
+from app.services.artifacts import artifact_store, new_capture
+from app.services.history_writer import history_writer
+from app.services.idempotency import IdempotencyConflict, idempotency_store, request_fingerprint
+from app.services.result_cache import result_cache
+from app.services.scheduler import SchedulerBusy, scheduler
+from app.services.singleflight import single_flight
 from pathlib import Path
+from typing import Optional, Set, Tuple
+import asyncio
+import contextlib
+import json
+import logging
+import re
+import time
 
 router = APIRouter()
 
-# 找到AI Toolkit项目的路径
-def get_ai_toolkit_path():
-    """获取AI Toolkit项目路径"""
-    # 从backend目录向上找到ai-toolkit
-    backend_dir = Path(__file__).parent.parent.parent  # ai-toolkit-web/backend
-    web_project_dir = backend_dir.parent                 # ai-toolkit-web
-    projects_dir = web_project_dir.parent                # projects
-    ai_toolkit_dir = projects_dir / "ai-toolkit"
-    
-    if ai_toolkit_dir.exists():
-        return ai_toolkit_dir
-    return None
+logger = logging.getLogger(__name__)
+
+# 命中结果缓存时没有启动进程，不记录排队和资源使用
+_CACHED_USAGE = {"queue_ms": None, "cpu_ms": None, "max_rss_kb": None}
+
+# 正在进行的后台记录任务（保持引用，避免任务未完成就被回收）
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _busy_error(e: SchedulerBusy) -> HTTPException:
+    """调度队列已满时返回429"""
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _scheduler_slot(request: ExecuteRequest, command_meta: dict, bounded: bool = True):
+    """按目录中的通道和模块并发配置获取执行名额"""
+    module_meta = find_module(request.module) or {}
+    return scheduler.slot(
+        request.module,
+        lane=command_meta.get("lane"),
+        module_limit=module_meta.get("max_concurrency"),
+        bounded=bounded,
+    )
+
+
+async def _execute(request: ExecuteRequest, ai_toolkit_path: Path,
+                   bounded: bool = True) -> Tuple[ExecutionResult, bool]:
+    """执行单个请求（结果缓存 -> 请求合并 -> 调度 -> 执行 -> 缓存失效），返回 (结果, 是否命中缓存)"""
+    command_meta = find_command(request.module, request.command) or {}
+    limits = resolve_limits(
+        command_meta, request.timeout, request.cpu_limit, request.memory_limit
+    )
+
+    # 只读命令先查结果缓存（键包含资源限制）
+    cache_ttl = command_meta.get("cache_ttl") if settings.RESULT_CACHE_ENABLED else None
+    cache_key = (
+        result_cache.make_key(request.module, request.command, request.params, limits)
+        if cache_ttl else None
+    )
+    result = result_cache.get(cache_key) if cache_key else None
+    if result is not None:
+        return result, True
+
+    async def run() -> ExecutionResult:
+        # 获得调度名额后执行命令（优先使用常驻进程池）
+        async with _scheduler_slot(request, command_meta, bounded) as wait:
+            # 开始执行前取得模块代数，执行期间被写操作失效时不缓存结果
+            generation = result_cache.generation(request.module)
+            result = await run_command(
+                request.module, request.command, request.params, ai_toolkit_path, limits
+            )
+        result.queue_ms = round(wait * 1000, 3)
+        if cache_key and result.success:
+            result_cache.set(cache_key, result, cache_ttl, generation)
+        result_cache.invalidate_targets(command_meta.get("invalidates", []))
+        return result
+
+    # 声明了coalesce的命令，参数和资源限制都相同的并发请求共享一次执行
+    if command_meta.get("coalesce") and settings.SINGLE_FLIGHT_ENABLED:
+        key = cache_key or result_cache.make_key(
+            request.module, request.command, request.params, limits
+        )
+        result, _ = await single_flight.do(key, run)
+        return result, False
+
+    return await run(), False
+
+
+def _build_response(result: ExecutionResult, cached: bool) -> ExecuteResponse:
+    """根据执行结果构建响应"""
+    if not result.success:
+        return ExecuteResponse(
+            success=False,
+            message="命令执行超时" if result.timed_out else "命令执行失败",
+            output=result.output,
+            status=result.status,
+            truncated=result.artifact_id is not None,
+            artifact_id=result.artifact_id,
+        )
+
+    return ExecuteResponse(
+        success=True,
+        message="命令执行成功",
+        output=result.output,
+        cached=cached,
+        status=result.status,
+        truncated=result.artifact_id is not None,
+        artifact_id=result.artifact_id,
+    )
+
+
+async def _execute_and_record(request: ExecuteRequest, ai_toolkit_path: Path) -> ExecuteResponse:
+    """执行命令并保存历史记录"""
+    started = time.monotonic()
+    result, cached = await _execute(request, ai_toolkit_path)
+    duration_ms = round((time.monotonic() - started) * 1000, 3)
+
+    logger.debug(
+        "执行完成: %s %s 返回码 %s，耗时 %sms，输出 %d / %d 字符%s",
+        request.module, request.command, result.returncode, duration_ms,
+        len(result.stdout), len(result.stderr), "（缓存）" if cached else "",
+    )
+
+    # 保存历史记录
+    try:
+        await history_writer.add(
+            module=request.module,
+            command=request.command,
+            params=request.params,
+            success=result.success,
+            output=result.output,
+            status=result.status,
+            artifact_id=result.artifact_id,
+            duration_ms=duration_ms,
+            **(_CACHED_USAGE if cached else result.usage()),
+        )
+    except Exception:
+        logger.exception("保存历史记录失败")
+        # 即使保存历史失败，也不影响命令执行结果
+
+    return _build_response(result, cached)
 
 
 @router.post("", response_model=ExecuteResponse)
-async def execute_command(request: ExecuteRequest):
-    """执行AI Toolkit命令"""
+async def execute_command(
+    request: ExecuteRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """执行AI Toolkit命令
+
+    带 Idempotency-Key 请求头时，相同键的重试不会重复执行：原执行进行中则等待其结果，
+    已完成则重放保存的响应，此时响应头 Idempotent-Replayed 为 true。
+    """
 
     try:
+        validate_params(request)
         ai_toolkit_path = get_ai_toolkit_path()
         
         if not ai_toolkit_path:
             raise HTTPException(status_code=500, detail="未找到AI Toolkit项目")
 
-        # 构建Python路径，确保能找到ai_toolkit模块
-        python_path = os.environ.get("PYTHONPATH", "")
-        new_python_path = f"{ai_toolkit_path}/src:{python_path}"
-        
-        # 构建命令
-        cmd = [
-            sys.executable,
-            "-m",
-            "ai_toolkit",
-            request.module,
-            request.command
-        ]
-
-        # 添加参数
-        for key, value in request.params.items():
-            cmd.extend([f"--{key}", str(value)])
-
-        print(f"执行命令: {' '.join(cmd)}")
-        print(f"AI Toolkit路径: {ai_toolkit_path}")
-        print(f"PYTHONPATH: {new_python_path}")
-
-        # 设置环境变量
-        env = os.environ.copy()
-        env["PYTHONPATH"] = new_python_path
-
-        # 执行命令
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=str(ai_toolkit_path),
-            env=env,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+        logger.debug("AI Toolkit路径: %s", ai_toolkit_path)
+
+        if idempotency_key is None:
+            return await _execute_and_record(request, ai_toolkit_path)
+
+        if not idempotency_key or len(idempotency_key) > settings.IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Idempotency-Key长度必须在1到{settings.IDEMPOTENCY_KEY_MAX_LENGTH}之间",
+            )
+
+        async def run() -> dict:
+            return (await _execute_and_record(request, ai_toolkit_path)).model_dump()
+
+        data, reused = await idempotency_store.do(
+            idempotency_key, request_fingerprint(request.model_dump()), run
         )
+        if reused:
+            response.headers["Idempotent-Replayed"] = "true"
+        return ExecuteResponse(**data)
+
+    except HTTPException:
+        raise
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except SchedulerBusy as e:
+        raise _busy_error(e)
+    except Exception as e:
+        logger.exception("执行命令失败: %s %s", request.module, request.command)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data: dict) -> str:
+    """编码一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def execute_command_stream(request: ExecuteRequest):
+    """流式执行AI Toolkit命令（Server-Sent Events）
 
-        stdout, stderr = await process.communicate()
+    事件类型：
+    - stdout / stderr: {"data": 输出片段}
+    - timeout: {"timeout": 秒数}，超时被终止
+    - done: {"success": bool, "status": str, "returncode": int, "message": str,
+      "artifact_id": 输出过长时完整内容所在的产物ID}
+    - busy: {"status_code": 429, "detail": str, "retry_after": 秒数}，开始前调度队列已满，
+      命令没有执行，不记录历史
+    - error: {"status_code": 500, "detail": str}，开始执行前出错，命令没有执行，不记录历史
 
-        output = stdout.decode() if stdout else ""
-        error = stderr.decode() if stderr else ""
+    客户端中途断开时仍会结束进程、失效缓存并保存历史记录。
+    """
 
-        print(f"返回码: {process.returncode}")
-        print(f"输出: {output}")
-        print(f"错误: {error}")
+    validate_params(request)
+    ai_toolkit_path = get_ai_toolkit_path()
+    if not ai_toolkit_path:
+        raise HTTPException(status_code=500, detail="未找到AI Toolkit项目")
 
-        success = process.returncode == 0
-        final_output = output if success else (error or output)
+    command_meta = find_command(request.module, request.command) or {}
+    try:
+        scheduler.ensure_capacity(command_meta.get("lane"))
+    except SchedulerBusy as e:
+        raise _busy_error(e)
+
+    limits = resolve_limits(
+        command_meta, request.timeout, request.cpu_limit, request.memory_limit
+    )
+    args = build_command_args(request.module, request.command, request.params)
+    logger.debug("流式执行命令: ai_toolkit %s", " ".join(args))
 
-        # 保存历史记录
+    async def record(result: ExecutionResult, duration_ms: float):
+        """失效缓存并保存历史记录"""
+        result_cache.invalidate_targets(command_meta.get("invalidates", []))
         try:
-            db.add_history(
+            await history_writer.add(
                 module=request.module,
                 command=request.command,
                 params=request.params,
-                success=success,
-                output=final_output,
-            )
-        except Exception as history_error:
-            print(f"保存历史记录失败: {history_error}")
-            # 即使保存历史失败，也不影响命令执行结果
-
-        if not success:
-            return ExecuteResponse(
-                success=False,
-                message="命令执行失败",
-                output=final_output,
+                success=result.success,
+                output=result.output,
+                status=result.status,
+                artifact_id=result.artifact_id,
+                duration_ms=duration_ms,
+                **result.usage(),
             )
+        except Exception:
+            logger.exception("保存历史记录失败")
 
-        return ExecuteResponse(
-            success=True,
-            message="命令执行成功",
-            output=final_output,
-        )
+    async def event_stream():
+        # 只有历史记录需要完整输出，按内存上限收集，超出部分写入产物文件
+        stdout = new_capture()
+        stderr = new_capture()
+        returncode = -1
+        timed_out = False
+        usage = {}
+        started = time.monotonic()
+        spawned = False
+        busy: Optional[SchedulerBusy] = None
+        error: Optional[Exception] = None
+        recording: Optional[asyncio.Task] = None
 
-    except Exception as e:
-        print(f"异常: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        try:
+            async with _scheduler_slot(request, command_meta) as wait:
+                usage["queue_ms"] = round(wait * 1000, 3)
+                spawned = True
+                # 客户端断开时显式关闭，立即结束子进程，不依赖异步生成器的垃圾回收
+                async with contextlib.aclosing(stream_command(args, ai_toolkit_path, limits)) as events:
+                    async for name, data in events:
+                        if name == "exit":
+                            returncode = data
+                            break
+                        if name == "usage":
+                            usage.update(data)
+                            continue
+                        if name == "timeout":
+                            timed_out = True
+                            stderr.write(timeout_message(data))
+                            yield _sse("timeout", {"timeout": data})
+                            continue
+                        (stdout if name == "stdout" else stderr).write(data)
+                        yield _sse(name, {"data": data})
+        except SchedulerBusy as e:
+            busy = e
+        except Exception as e:
+            logger.exception("流式执行命令失败: %s %s", request.module, request.command)
+            if not spawned:
+                error = e
+            stderr.write(str(e))
+            returncode = -1
+        finally:
+            stdout.close()
+            stderr.close()
+            # 客户端断开时生成器被取消（CancelledError/GeneratorExit），记录放到独立任务中，
+            # 不受取消影响；排队期间断开或调度队列已满时命令没有执行，不记录
+            if spawned:
+                result = ExecutionResult(
+                    returncode=returncode,
+                    stdout=stdout.getvalue(),
+                    stderr=stderr.getvalue(),
+                    timed_out=timed_out,
+                    stdout_artifact=stdout.artifact_id,
+                    stderr_artifact=stderr.artifact_id,
+                    **usage,
+                )
+                recording = asyncio.create_task(
+                    record(result, round((time.monotonic() - started) * 1000, 3))
+                )
+                _background_tasks.add(recording)
+                recording.add_done_callback(_background_tasks.discard)
+
+        if busy is not None:
+            yield _sse("busy", {"status_code": 429, "detail": str(busy), "retry_after": busy.retry_after})
+            return
+        if error is not None:
+            yield _sse("error", {"status_code": 500, "detail": str(error)})
+            return
+
+        await asyncio.shield(recording)
+        yield _sse("done", {
+            "success": result.success,
+            "status": result.status,
+            "returncode": returncode,
+            "message": _build_response(result, False).message,
+            "artifact_id": result.artifact_id,
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/batch")
+async def execute_batch(request: BatchExecuteRequest):
+    """批量并发执行命令，按完成顺序逐行返回结果（NDJSON）
+
+    每行为一个条目的结果：{"index": 序号, "module", "command", "success", "message",
+    "output", "cached", "status"}，最后一行为汇总 {"done": true, "total", "succeeded"}。
+    全部历史记录在结束时一次性提交给历史记录写缓冲。客户端中途断开时，已开始的条目
+    继续执行到结束并记录，尚未开始的条目不再执行。
+    """
+    ai_toolkit_path = get_ai_toolkit_path()
+    if not ai_toolkit_path:
+        raise HTTPException(status_code=500, detail="未找到AI Toolkit项目")
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"批量条目不能超过{settings.BATCH_MAX_ITEMS}个")
+
+    # 任一条目参数不合法时整个批量不执行，返回所有条目的错误
+    errors = []
+    for index, item in enumerate(request.items):
+        try:
+            validate_params(item, ["items", index])
+        except HTTPException as e:
+            errors.extend(e.detail)
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    fan_out = min(request.fan_out or settings.BATCH_DEFAULT_FAN_OUT, settings.BATCH_MAX_FAN_OUT)
+    semaphore = asyncio.Semaphore(max(fan_out, 1))
+    records = []
+    disconnected = False
+
+    async def run_item(index: int, item: ExecuteRequest):
+        # 批量自身已限制并发，调度器中不受等待队列约束
+        async with semaphore:
+            # 客户端已断开时，尚未开始的条目不再执行
+            if disconnected:
+                return None
+            started = time.monotonic()
+            try:
+                result, cached = await _execute(item, ai_toolkit_path, bounded=False)
+            except Exception as e:
+                logger.exception("批量条目执行失败: %s %s", item.module, item.command)
+                result, cached = ExecutionResult(returncode=-1, stdout="", stderr=str(e)), False
+            # 条目结束时即加入待保存的记录，不依赖客户端读取到它的结果
+            records.append({
+                "module": item.module,
+                "command": item.command,
+                "params": item.params,
+                "success": result.success,
+                "output": result.output,
+                "status": result.status,
+                "artifact_id": result.artifact_id,
+                "duration_ms": round((time.monotonic() - started) * 1000, 3),
+                **(_CACHED_USAGE if cached else result.usage()),
+            })
+            return index, item, result, cached
+
+    async def record(tasks):
+        """等待全部条目结束后保存历史记录（单个事务）"""
+        if tasks:
+            await asyncio.wait(tasks)
+        try:
+            await history_writer.add_many(records)
+        except Exception:
+            logger.exception("保存历史记录失败")
+
+    async def result_stream():
+        nonlocal disconnected
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(request.items)]
+        # 记录放到独立任务中：客户端断开时生成器被取消，已开始的条目继续执行到结束并记录
+        recording = asyncio.create_task(record(tasks))
+        _background_tasks.add(recording)
+        recording.add_done_callback(_background_tasks.discard)
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, item, result, cached = await next_done
+                succeeded += 1 if result.success else 0
+
+                line = {"index": index, "module": item.module, "command": item.command}
+                line.update(_build_response(result, cached).model_dump())
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+            await asyncio.shield(recording)
+            yield json.dumps({"done": True, "total": len(tasks), "succeeded": succeeded}) + "\n"
+        finally:
+            disconnected = True
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单段 Range 头（bytes=a-b / bytes=a- / bytes=-n），无法满足时返回None"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+@router.get("/artifacts/{artifact_id}")
+async def get_artifact(
+    artifact_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1024 * 1024, ge=1, le=16 * 1024 * 1024),
+    range_header: Optional[str] = Header(None, alias="Range"),
+):
+    """分段读取被截断输出的完整内容
+
+    支持 Range 请求头（返回206），否则按 offset/limit 字节分页，
+    响应头 X-Artifact-Size 为总字节数，X-Next-Offset 为下一页的起点。
+    """
+    path = artifact_store.path_for(artifact_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="产物不存在或已过期")
+
+    size = path.stat().st_size
+    headers = {"Accept-Ranges": "bytes", "X-Artifact-Size": str(size)}
+
+    if range_header:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        content = await run_in_threadpool(artifact_store.read_range, artifact_id, start, end)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content, status_code=206, media_type="text/plain; charset=utf-8", headers=headers)
+
+    end = min(offset + limit, size) - 1
+    content = await run_in_threadpool(artifact_store.read_range, artifact_id, offset, end) if offset < size else b""
+    if end + 1 < size:
+        headers["X-Next-Offset"] = str(end + 1)
+    return Response(content, media_type="text/plain; charset=utf-8", headers=headers)
+
+
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """获取调度统计：各通道/模块的运行数、排队深度和等待时间"""
+    return scheduler.stats()
+
+
+@router.get("/singleflight")
+async def get_singleflight_stats():
+    """获取请求合并统计"""
+    return single_flight.stats()
+
+
+@router.get("/idempotency")
+async def get_idempotency_stats():
+    """获取幂等键统计"""
+    return idempotency_store.stats()
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """获取结果缓存统计"""
+    return result_cache.stats()
+
+
+@router.delete("/cache")
+async def invalidate_cache(
+    module: str = Query(None),
+    command: str = Query(None),
+):
+    """失效结果缓存，不指定模块时清空全部"""
+    if module:
+        removed = result_cache.invalidate(module, command)
+    else:
+        removed = result_cache.clear()
+    return {"success": True, "message": "缓存已失效", "removed": removed}
@@ -1,47 +1,201 @@
 
 """
 历史记录API
+
+读接口经过响应缓存（见 response_cache），历史记录和收藏写入后自动失效。
 """
 
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from datetime import datetime
+
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from app.models.history import (
-    HistoryItem, HistoryListResponse,
-    AddFavoriteRequest, FavoriteItem, FavoriteListResponse
+    HistoryItem, HistoryListResponse, HistorySearchResponse, RunStatsResponse,
+    BulkDeleteHistoryRequest, BulkDeleteFavoritesRequest, ImportFavoritesRequest,
+    AddFavoriteRequest, FavoriteItem, FavoriteListResponse, FavoriteExportResponse
 )
-from app.core.database import db
+from app.core.config import settings
+from app.core.database import async_db
+from app.services.history_export import EXPORT_FORMATS, export_history
+from app.services.history_writer import history_writer
+from app.services.response_cache import cached
+from app.services.run_stats import get_run_stats
 
 router = APIRouter()
 
 
+def _encode_cursor(item: Dict[str, Any]) -> str:
+    """由一页的最后一条记录生成游标"""
+    raw = json.dumps([item["created_at"], item["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析游标为 (created_at, id)，格式错误时返回400"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(item_id, int):
+            raise ValueError(cursor)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的游标")
+    return created_at, item_id
+
+
+def _page(items: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """查询时多取一条：超出limit说明还有下一页"""
+    if len(items) > limit:
+        items = items[:limit]
+        return items, _encode_cursor(items[-1])
+    return items, None
+
+
 @router.get("", response_model=HistoryListResponse)
+@cached(expire=settings.RESPONSE_CACHE_TTL_HISTORY, namespace="history")
 async def get_history(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
     module: str = Query(None),
     command: str = Query(None),
+    cursor: str = Query(None),
 ):
-    """获取历史记录列表"""
+    """获取历史记录列表
+
+    传入上一页返回的 next_cursor 时按游标翻页（忽略offset），任意深度的翻页代价相同。
+    """
     try:
-        items = db.get_history(limit=limit, offset=offset, module=module, command=command)
-        
-        # 为了简单，我们先不计算总数，直接返回当前数量
-        total = len(items)
+        before = _decode_cursor(cursor)
+        await history_writer.flush()
+        items = await async_db.get_history(
+            limit=limit + 1, offset=0 if before else offset,
+            module=module, command=command, before=before,
+        )
+        items, next_cursor = _page(items, limit)
+        total = await async_db.count_history(module=module, command=command)
         
         return HistoryListResponse(
             items=items,
             total=total,
             limit=limit,
             offset=offset,
+            next_cursor=next_cursor,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _fts_query(q: str) -> Tuple[Optional[str], List[str]]:
+    """把搜索词转为 (FTS5查询, 短词列表)
+
+    按空白拆分，每个词作为短语匹配，多个词同时满足。trigram索引只能匹配至少3个字符的词，
+    更短的词（如两个字的中文词“模型”、ok、db）改为子串匹配。
+    """
+    terms = q.split()
+    if not terms:
+        raise HTTPException(status_code=400, detail="搜索词不能为空")
+    long_terms = [term.replace('"', '""') for term in terms if len(term) >= 3]
+    short_terms = [term for term in terms if len(term) < 3]
+    query = " ".join(f'"{term}"' for term in long_terms) or None
+    return query, short_terms
+
+
+@router.get("/search", response_model=HistorySearchResponse)
+@cached(expire=settings.RESPONSE_CACHE_TTL_HISTORY, namespace="history")
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    module: str = Query(None),
+    command: str = Query(None),
+    since: str = Query(None, description="起始时间（含），格式同created_at"),
+    until: str = Query(None, description="结束时间（不含），格式同created_at"),
+):
+    """全文搜索历史记录的命令、参数和输出，按相关度排序并返回高亮片段
+
+    不足3个字符的词按子串匹配；全部是短词时按时间从新到旧排序。
+    """
+    try:
+        query, short_terms = _fts_query(q)
+        await history_writer.flush()
+        items = await async_db.search_history(
+            query, limit=limit + 1, offset=offset,
+            module=module, command=command, since=since, until=until,
+            substrings=short_terms,
+        )
+        return HistorySearchResponse(
+            items=items[:limit],
+            query=q,
+            limit=limit,
+            offset=offset,
+            has_more=len(items) > limit,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export")
+async def export_history_file(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    module: str = Query(None),
+    command: str = Query(None),
+    since: str = Query(None, description="起始时间（含），格式同created_at"),
+    until: str = Query(None, description="结束时间（不含），格式同created_at"),
+    include_output: bool = Query(True, description="为false时只导出输出预览"),
+    gzip: bool = Query(False),
+):
+    """流式导出历史记录（按时间升序），内存占用与行数无关"""
+    filename = f"history-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        export_history(format, module=module, command=command, since=since, until=until,
+                       include_output=include_output, gzip=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/stats", response_model=RunStatsResponse)
+@cached(expire=settings.RESPONSE_CACHE_TTL_STATS, namespace="history")
+async def get_history_stats(
+    window: str = Query("24h", pattern="^(1h|24h|7d|30d)$"),
+    module: str = Query(None),
+    command: str = Query(None),
+    interval: str = Query(None, pattern="^(hour|day)$", description="时间序列粒度，默认1h/24h按小时，其余按天"),
+):
+    """获取执行统计：各命令的p50/p95/p99耗时、成功率、排队和资源使用以及吞吐量序列"""
+    try:
+        return await get_run_stats(window, module=module, command=command, interval=interval)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/writer")
+async def get_writer_stats():
+    """获取历史记录写缓冲统计（缓冲条数、批次数、背压次数）"""
+    return history_writer.stats()
+
+
 @router.delete("/{history_id}")
 async def delete_history(history_id: int):
     """删除历史记录"""
     try:
-        success = db.delete_history(history_id)
+        success = await async_db.delete_history(history_id)
         if not success:
             raise HTTPException(status_code=404, detail="历史记录不存在")
         return {"success": True, "message": "删除成功"}
@@ -51,11 +205,41 @@ async def delete_history(history_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/bulk-delete")
+async def bulk_delete_history(request: BulkDeleteHistoryRequest):
+    """批量删除历史记录（一个事务）：传ids按ID删除，否则按模块/命令/时间/成功与否删除"""
+    filters = {
+        "module": request.module,
+        "command": request.command,
+        "since": request.since,
+        "until": request.until,
+        "success": request.success,
+    }
+    has_filters = any(value not in (None, "") for value in filters.values())
+    if request.ids is not None and has_filters:
+        raise HTTPException(status_code=400, detail="ids与过滤条件不能同时使用")
+    if request.ids is None and not has_filters:
+        raise HTTPException(status_code=400, detail="需要ids或至少一个过滤条件，清空全部请使用DELETE /api/history")
+    if request.ids is not None and len(request.ids) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"批量条目不能超过{settings.BULK_MAX_ITEMS}个")
+
+    try:
+        await history_writer.flush()
+        if request.ids is not None:
+            deleted = await async_db.delete_history_batch(request.ids)
+        else:
+            deleted = await async_db.delete_history_where(**filters)
+        return {"success": True, "message": "删除成功", "deleted": deleted}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("")
 async def clear_history():
     """清空历史记录"""
     try:
-        success = db.clear_history()
+        await history_writer.flush()
+        success = await async_db.clear_history()
         return {"success": True, "message": "清空成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -65,40 +249,85 @@ async def clear_history():
 async def add_favorite(request: AddFavoriteRequest):
     """添加收藏"""
     try:
-        favorite_id = db.add_favorite(
+        return await async_db.add_favorite(
             module=request.module,
             command=request.command,
             name=request.name,
             description=request.description,
             params=request.params,
         )
-        
-        # 获取刚添加的收藏
-        favorites = db.get_favorites(limit=1, offset=0)
-        if favorites:
-            return favorites[0]
-        
-        raise HTTPException(status_code=500, detail="添加失败")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/favorites/export", response_model=FavoriteExportResponse)
+@cached(expire=settings.RESPONSE_CACHE_TTL_FAVORITES, namespace="favorites")
+async def export_favorites():
+    """导出全部收藏"""
+    try:
+        items = await async_db.export_favorites()
+        return FavoriteExportResponse(items=items, total=len(items))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/favorites/import")
+async def import_favorites(request: ImportFavoritesRequest):
+    """批量导入收藏（一个事务）"""
+    if len(request.items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"批量条目不能超过{settings.BULK_MAX_ITEMS}个")
+    try:
+        imported = await async_db.add_favorites_batch(
+            [item.model_dump() for item in request.items],
+            skip_duplicates=request.skip_duplicates,
+        )
+        return {
+            "success": True,
+            "message": "导入成功",
+            "imported": imported,
+            "skipped": len(request.items) - imported,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/favorites/bulk-delete")
+async def bulk_delete_favorites(request: BulkDeleteFavoritesRequest):
+    """按ID列表批量删除收藏（一个事务）"""
+    if len(request.ids) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"批量条目不能超过{settings.BULK_MAX_ITEMS}个")
+    try:
+        deleted = await async_db.delete_favorites_batch(request.ids)
+        return {"success": True, "message": "删除成功", "deleted": deleted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/favorites", response_model=FavoriteListResponse)
+@cached(expire=settings.RESPONSE_CACHE_TTL_FAVORITES, namespace="favorites")
 async def get_favorites(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str = Query(None),
 ):
-    """获取收藏列表"""
+    """获取收藏列表，游标翻页同历史记录"""
     try:
-        items = db.get_favorites(limit=limit, offset=offset)
-        total = len(items)
+        before = _decode_cursor(cursor)
+        items = await async_db.get_favorites(
+            limit=limit + 1, offset=0 if before else offset, before=before
+        )
+        items, next_cursor = _page(items, limit)
+        total = await async_db.count_favorites()
         
         return FavoriteListResponse(
             items=items,
             total=total,
             limit=limit,
             offset=offset,
+            next_cursor=next_cursor,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -107,7 +336,7 @@ async def get_favorites(
 async def delete_favorite(favorite_id: int):
     """删除收藏"""
     try:
-        success = db.delete_favorite(favorite_id)
+        success = await async_db.delete_favorite(favorite_id)
         if not success:
             raise HTTPException(status_code=404, detail="收藏不存在")
         return {"success": True, "message": "删除成功"}
@@ -115,3 +344,19 @@ async def delete_favorite(favorite_id: int):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{history_id}", response_model=HistoryItem)
+@cached(expire=settings.RESPONSE_CACHE_TTL_HISTORY, namespace="history")
+async def get_history_item(history_id: int):
+    """获取单条历史记录及完整输出（放在/favorites之后，避免路径被当作ID匹配）"""
+    try:
+        await history_writer.flush()
+        item = await async_db.get_history_item(history_id)
+        if not item:
+            raise HTTPException(status_code=404, detail="历史记录不存在")
+        return item
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
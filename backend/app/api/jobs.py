@@ -0,0 +1,53 @@
+"""
+后台任务API - 提交、查询、取消
+"""
+
+from fastapi import APIRouter, HTTPException
+from app.api.modules import find_command, find_module, validate_params
+from app.models.execute import ExecuteRequest
+from app.models.job import JobItem, JobSubmitResponse
+from app.services.executor import get_ai_toolkit_path
+from app.services.jobs import FINISHED_STATUSES, JobQueueFull, job_manager
+
+router = APIRouter()
+
+
+@router.post("", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: ExecuteRequest):
+    """提交后台任务，立即返回任务ID"""
+    validate_params(request)
+    ai_toolkit_path = get_ai_toolkit_path()
+    if not ai_toolkit_path:
+        raise HTTPException(status_code=500, detail="未找到AI Toolkit项目")
+
+    try:
+        command_meta = find_command(request.module, request.command)
+        module_meta = find_module(request.module)
+        job_id = await job_manager.submit(request, ai_toolkit_path, command_meta, module_meta)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@router.get("/{job_id}", response_model=JobItem)
+async def get_job(job_id: str):
+    """获取任务状态和（部分）输出"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.delete("/{job_id}", response_model=JobItem)
+async def cancel_job(job_id: str):
+    """取消任务并结束其进程"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job["status"] in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail="任务已结束")
+
+    return await job_manager.cancel(job_id)
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from app.models.module import Module, Command
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import Any, Dict, List, Optional
+from app.models.module import Module, Command, ModuleSearchResponse
+from app.models.execute import ExecuteRequest
+from app.services.catalog import EncodedBody, catalog
+from app.services.param_validation import ParamValidationError, validation_errors
 
 router = APIRouter()
 
 # 模块数据（完整版，包含所有分类）
+#
+# 命令可选的执行元数据：
+# - cache_ttl: 结果缓存秒数，仅用于只读、输出确定的命令
+# - invalidates: 执行后需要失效的缓存，格式为 "模块:命令"
+# - coalesce: 相同的并发请求合并为一次执行，仅用于无副作用的命令
+# - lane: 调度通道，长时间运行的命令为 "heavy"，默认 "interactive"
+# - timeout / cpu_limit / memory_limit: 墙钟秒数、CPU秒数、数据段内存MB，覆盖全局默认值（默认不限制）
+#
+# 模块可选的 max_concurrency 限制该模块同时运行的进程数。
 MODULES = [
     # AI核心分类
     {
@@ -82,6 +95,8 @@ MODULES = [
                 "name": "列出模型",
                 "description": "列出可用的AI模型",
                 "category": "api",
+                "coalesce": True,
+                "cache_ttl": 60,
                 "params": [],
             },
             {
@@ -89,6 +104,8 @@ MODULES = [
                 "name": "显示配置",
                 "description": "显示当前API配置",
                 "category": "api",
+                "coalesce": True,
+                "cache_ttl": 60,
                 "params": [],
             },
         ],
@@ -104,6 +121,8 @@ MODULES = [
                 "name": "列出本地模型",
                 "description": "显示已安装的模型",
                 "category": "models",
+                "coalesce": True,
+                "cache_ttl": 60,
                 "params": [],
             },
             {
@@ -111,6 +130,9 @@ MODULES = [
                 "name": "下载模型",
                 "description": "从Ollama Hub下载模型",
                 "category": "models",
+                "timeout": 3600,
+                "lane": "heavy",
+                "invalidates": ["models:list", "models:info"],
                 "params": [
                     {
                         "name": "model",
@@ -132,6 +154,8 @@ MODULES = [
                 "name": "运行模型",
                 "description": "执行模型推理",
                 "category": "models",
+                "timeout": 900,
+                "lane": "heavy",
                 "params": [
                     {
                         "name": "model",
@@ -154,6 +178,7 @@ MODULES = [
                 "name": "删除模型",
                 "description": "删除已安装的模型",
                 "category": "models",
+                "invalidates": ["models:list", "models:info"],
                 "params": [
                     {
                         "name": "model",
@@ -168,6 +193,8 @@ MODULES = [
                 "name": "模型信息",
                 "description": "查看模型详情",
                 "category": "models",
+                "coalesce": True,
+                "cache_ttl": 60,
                 "params": [
                     {
                         "name": "model",
@@ -191,6 +218,8 @@ MODULES = [
                 "name": "创建知识库",
                 "description": "创建RAG知识库",
                 "category": "rag",
+                "lane": "heavy",
+                "invalidates": ["rag:list"],
                 "params": [
                     {
                         "name": "name",
@@ -241,6 +270,8 @@ MODULES = [
                 "name": "列出知识库",
                 "description": "查看所有知识库",
                 "category": "rag",
+                "coalesce": True,
+                "cache_ttl": 60,
                 "params": [],
             },
             {
@@ -248,6 +279,7 @@ MODULES = [
                 "name": "删除知识库",
                 "description": "删除指定知识库",
                 "category": "rag",
+                "invalidates": ["rag:list"],
                 "params": [
                     {
                         "name": "name",
@@ -262,6 +294,9 @@ MODULES = [
                 "name": "导入文档",
                 "description": "导入单个文档到知识库",
                 "category": "rag",
+                "timeout": 1800,
+                "lane": "heavy",
+                "invalidates": ["rag:list"],
                 "params": [
                     {
                         "name": "file",
@@ -344,6 +379,8 @@ MODULES = [
                 "name": "代码解释",
                 "description": "解释代码功能",
                 "category": "coding",
+                "coalesce": True,
+                "cache_ttl": 3600,
                 "params": [
                     {
                         "name": "code",
@@ -359,6 +396,7 @@ MODULES = [
                 "name": "运行测试",
                 "description": "运行代码测试",
                 "category": "coding",
+                "lane": "heavy",
                 "params": [
                     {
                         "name": "file",
@@ -445,6 +483,7 @@ MODULES = [
                 "name": "生成报告",
                 "description": "生成完整分析报告",
                 "category": "analytics",
+                "lane": "heavy",
                 "params": [
                     {
                         "name": "file",
@@ -475,6 +514,7 @@ MODULES = [
                 "name": "部署应用",
                 "description": "部署应用到云平台",
                 "category": "cloud",
+                "lane": "heavy",
                 "params": [
                     {
                         "name": "app",
@@ -520,6 +560,7 @@ MODULES = [
                 "name": "监控服务",
                 "description": "监控云服务状态",
                 "category": "cloud",
+                "coalesce": True,
                 "params": [
                     {
                         "name": "service",
@@ -535,6 +576,7 @@ MODULES = [
                 "name": "查看日志",
                 "description": "查看云服务日志",
                 "category": "cloud",
+                "coalesce": True,
                 "params": [
                     {
                         "name": "service",
@@ -557,6 +599,7 @@ MODULES = [
                 "name": "成本估算",
                 "description": "估算云服务成本",
                 "category": "cloud",
+                "coalesce": True,
                 "params": [],
             },
         ],
@@ -566,10 +609,11 @@ MODULES = [
         "name": "Docker容器",
         "description": "Docker容器管理",
         "category": "cloud",
+        "max_concurrency": 2,
         "commands": [
-            {"id": "build", "name": "构建镜像", "description": "构建Docker镜像", "category": "docker", "params": [{"name": "path", "type": "string", "description": "Dockerfile路径", "required": False, "default": "."}]},
-            {"id": "run", "name": "运行容器", "description": "运行Docker容器", "category": "docker", "params": [{"name": "image", "type": "string", "description": "镜像名称", "required": True}]},
-            {"id": "ps", "name": "列出容器", "description": "列出运行中的容器", "category": "docker", "params": []},
+            {"id": "build", "name": "构建镜像", "description": "构建Docker镜像", "category": "docker", "lane": "heavy", "timeout": 3600, "params": [{"name": "path", "type": "string", "description": "Dockerfile路径", "required": False, "default": "."}]},
+            {"id": "run", "name": "运行容器", "description": "运行Docker容器", "category": "docker", "lane": "heavy", "params": [{"name": "image", "type": "string", "description": "镜像名称", "required": True}]},
+            {"id": "ps", "name": "列出容器", "description": "列出运行中的容器", "category": "docker", "coalesce": True, "params": []},
         ],
     },
 
@@ -611,9 +655,10 @@ MODULES = [
         "name": "科学计算",
         "description": "科学研究相关功能",
         "category": "science",
+        "max_concurrency": 2,
         "commands": [
-            {"id": "simulate", "name": "科学模拟", "description": "运行科学模拟", "category": "scientific", "params": [{"name": "model", "type": "string", "description": "模拟模型", "required": True}]},
-            {"id": "analyze", "name": "数据分析", "description": "分析科研数据", "category": "scientific", "params": [{"name": "file", "type": "file", "description": "数据文件", "required": True}]},
+            {"id": "simulate", "name": "科学模拟", "description": "运行科学模拟", "category": "scientific", "lane": "heavy", "timeout": 1800, "cpu_limit": 1800, "memory_limit": 8192, "params": [{"name": "model", "type": "string", "description": "模拟模型", "required": True}]},
+            {"id": "analyze", "name": "数据分析", "description": "分析科研数据", "category": "scientific", "lane": "heavy", "params": [{"name": "file", "type": "file", "description": "数据文件", "required": True}]},
         ],
     },
     {
@@ -621,9 +666,10 @@ MODULES = [
         "name": "生物信息",
         "description": "生物信息学分析",
         "category": "science",
+        "max_concurrency": 2,
         "commands": [
-            {"id": "sequence", "name": "序列分析", "description": "分析生物序列", "category": "bioinfo", "params": [{"name": "file", "type": "file", "description": "序列文件", "required": True}]},
-            {"id": "align", "name": "序列比对", "description": "比对生物序列", "category": "bioinfo", "params": []},
+            {"id": "sequence", "name": "序列分析", "description": "分析生物序列", "category": "bioinfo", "lane": "heavy", "params": [{"name": "file", "type": "file", "description": "序列文件", "required": True}]},
+            {"id": "align", "name": "序列比对", "description": "比对生物序列", "category": "bioinfo", "lane": "heavy", "timeout": 1800, "cpu_limit": 1800, "memory_limit": 8192, "params": []},
         ],
     },
 
@@ -651,24 +697,69 @@ MODULES = [
 ]
 
 
+# 启动时建立目录索引并预编码响应；启用自动发现时由ai_toolkit内省结果替换
+catalog.set_static(MODULES)
+
+
+def find_module(module_id: str) -> Optional[Dict[str, Any]]:
+    """查找模块定义"""
+    return catalog.find_module(module_id)
+
+
+def find_command(module_id: str, command_id: str) -> Optional[Dict[str, Any]]:
+    """查找命令定义"""
+    return catalog.find_command(module_id, command_id)
+
+
+def validate_params(request: ExecuteRequest, loc: Optional[List[Any]] = None):
+    """按目录中的参数定义校验并规范化 request.params，不通过时返回422
+
+    目录中没有的命令不做校验，由ai_toolkit自行处理。
+    """
+    validator = catalog.validator(request.module, request.command)
+    if validator is None:
+        return
+    try:
+        request.params = validator.validate(request.params)
+    except ParamValidationError as e:
+        raise HTTPException(status_code=422, detail=validation_errors(e.errors, loc))
+
+
+def _encoded_response(request: Request, encoded: EncodedBody) -> Response:
+    """返回预编码的响应，If-None-Match命中时返回304"""
+    headers = {"ETag": encoded.etag, "Cache-Control": "no-cache"}
+    if encoded.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(encoded.body, media_type="application/json", headers=headers)
+
+
 @router.get("", response_model=List[Module])
-async def get_modules():
+async def get_modules(request: Request):
     """获取所有模块"""
-    return MODULES
+    return _encoded_response(request, catalog.encoded_all())
+
+
+@router.get("/search", response_model=ModuleSearchResponse)
+async def search_modules(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    type: str = Query(None, pattern="^(module|command|param)$"),
+):
+    """搜索模块、命令和参数（ID、名称、描述），支持前缀匹配和中文，按相关度排序"""
+    items, total = catalog.search(q, limit, type)
+    return ModuleSearchResponse(query=q, items=items, total=total)
 
 
 @router.get("/{module_id}", response_model=Module)
-async def get_module(module_id: str):
+async def get_module(module_id: str, request: Request):
     """获取模块详情"""
-    for module in MODULES:
-        if module["id"] == module_id:
-            return module
-    raise HTTPException(status_code=404, detail="模块不存在")
+    encoded = catalog.encoded_module(module_id)
+    if encoded is None:
+        raise HTTPException(status_code=404, detail="模块不存在")
+    return _encoded_response(request, encoded)
 
 
 @router.get("/category/{category}", response_model=List[Module])
-async def get_modules_by_category(category: str):
+async def get_modules_by_category(category: str, request: Request):
     """按分类获取模块"""
-    if category == "all":
-        return MODULES
-    return [m for m in MODULES if m["category"] == category]
+    return _encoded_response(request, catalog.encoded_category(category))
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -10,6 +10,9 @@ class Settings(BaseSettings):
     APP_VERSION: str = "0.1.0"
     API_PREFIX: str = "/api"
 
+    # 日志级别（DEBUG时记录每次执行的命令和返回码）
+    LOG_LEVEL: str = "INFO"
+
     # CORS配置
     CORS_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -20,9 +23,111 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 100 * 1024 * 1024  # 100MB
 
+    # 数据库（SQLite，WAL模式，连接池复用连接）
+    DB_PATH: str = "./history.db"
+    DB_POOL_SIZE: int = 4  # 连接数，也是异步访问的线程数
+    DB_BUSY_TIMEOUT: float = 5.0  # 等待写锁的秒数
+    DB_CACHE_SIZE_KB: int = 16 * 1024  # 每个连接的页缓存
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024  # 内存映射读取的字节数
+    DB_CACHED_STATEMENTS: int = 128  # 每个连接缓存的预编译语句数
+
+    # 历史记录后写（执行结果先入缓冲，按条数或时间批量写入）
+    HISTORY_WRITE_BEHIND: bool = True
+    HISTORY_BUFFER_SIZE: int = 1000  # 缓冲区满时入队等待
+    HISTORY_BUFFER_CHARS: int = 64 * 1024 * 1024  # 缓冲区中输出的总字符数上限，达到后入队等待
+    HISTORY_FLUSH_BATCH: int = 100
+    HISTORY_FLUSH_INTERVAL: float = 0.5  # 秒
+    HISTORY_PREVIEW_CHARS: int = 200  # 列表中返回的输出预览长度
+    HISTORY_OUTPUT_CODEC: str = "auto"  # 输出压缩：auto（有zstandard时用zstd，否则zlib）/ zstd / zlib / none
+    HISTORY_OUTPUT_LEVEL: int = 6
+    HISTORY_EXPORT_CHUNK: int = 1000  # 导出时每次读取的行数
+    HISTORY_EXPORT_CHUNK_CHARS: int = 8 * 1024 * 1024  # 导出时每段输出的总字符数上限，达到后提前结束该段
+
+    # 数据保留（后台分批清理，0表示不限制，默认不删除历史记录；需要时在.env中开启，
+    # 如 HISTORY_RETENTION_DAYS=90、HISTORY_RETENTION_MAX_ROWS=100000；
+    # HISTORY_RETENTION_MODULES可按模块覆盖，如 {"models": {"days": 30, "max_rows": 1000}}）
+    HISTORY_RETENTION_DAYS: int = 0
+    HISTORY_RETENTION_MAX_ROWS: int = 0
+    HISTORY_RETENTION_MAX_BYTES: int = 0  # 数据库已用空间上限（字节）
+    HISTORY_RETENTION_MODULES: Dict[str, Dict[str, int]] = {}
+    JOB_RETENTION_DAYS: int = 30
+    RETENTION_INTERVAL: int = 600  # 两次清理之间的秒数
+    RETENTION_BATCH_SIZE: int = 500  # 每个事务删除的行数
+    RETENTION_BATCH_PAUSE: float = 0.05  # 批次之间让出写锁的秒数
+    RETENTION_VACUUM_PAGES: int = 1000  # 每批增量回收的页数
+    RUN_STATS_RETENTION_DAYS: int = 30  # 执行统计汇总保留的天数
+
     # AI Toolkit路径
     AI_TOOLKIT_PATH: str = "../../ai-toolkit"
 
+    # 模块目录自动发现（内省ai_toolkit命令行定义，结果按源码指纹缓存到文件，失败时使用静态目录）
+    CATALOG_DISCOVERY_ENABLED: bool = True
+    CATALOG_CACHE_PATH: str = "catalog_cache.json"
+    CATALOG_REFRESH_INTERVAL: int = 60  # 检查源码变化的间隔秒数
+    CATALOG_INTROSPECT_TIMEOUT: int = 30
+
+    # 常驻进程池（预先导入ai_toolkit，避免每次请求启动解释器）
+    WORKER_POOL_ENABLED: bool = True
+    WORKER_POOL_SIZE: int = 4
+    WORKER_MAX_JOBS: int = 100  # 每个进程执行多少次后回收
+
+    # 后台任务
+    JOB_MAX_CONCURRENCY: int = 4
+    JOB_MAX_PENDING: int = 100
+
+    # 结果缓存（仅对目录中声明了cache_ttl的只读命令生效）
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 256
+
+    # 响应缓存（历史记录/收藏的读接口，LRU淘汰，写入后按命名空间失效）
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # 缓存占用内存上限
+    RESPONSE_CACHE_TTL_HISTORY: int = 60  # 历史记录列表、搜索和详情（秒）
+    RESPONSE_CACHE_TTL_STATS: int = 10  # 执行统计（时间窗口随时间推移）
+    RESPONSE_CACHE_TTL_FAVORITES: int = 300
+
+    # 请求合并（仅对目录中声明了coalesce的命令生效）
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # 幂等键（Idempotency-Key请求头，重试时复用原执行或重放已保存的结果）
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    IDEMPOTENCY_KEY_MAX_LENGTH: int = 255
+
+    # 执行调度（全局/模块/通道并发上限，通道等待队列满时返回429）
+    SCHEDULER_MAX_CONCURRENCY: int = 8
+    SCHEDULER_MODULE_CONCURRENCY: int = 4  # 目录未声明max_concurrency时的默认值
+    SCHEDULER_INTERACTIVE_CONCURRENCY: int = 8
+    SCHEDULER_INTERACTIVE_QUEUE: int = 32
+    SCHEDULER_HEAVY_CONCURRENCY: int = 2
+    SCHEDULER_HEAVY_QUEUE: int = 8
+
+    # 执行资源限制（0表示不限制，默认不限制；目录中的命令和请求可以设置限制，
+    # 上限只约束设置的值，不会给不限制的命令加上限制）
+    EXECUTE_DEFAULT_TIMEOUT: int = 0  # 墙钟时间（秒）
+    EXECUTE_MAX_TIMEOUT: int = 3600
+    EXECUTE_DEFAULT_CPU_LIMIT: int = 0  # CPU时间（秒）
+    EXECUTE_MAX_CPU_LIMIT: int = 3600
+    EXECUTE_DEFAULT_MEMORY_LIMIT: int = 0  # 数据段内存（MB，RLIMIT_DATA）
+    EXECUTE_MAX_MEMORY_LIMIT: int = 16384
+
+    # 参数预检：按目录中的参数定义校验，失败时不启动进程直接返回422
+    EXECUTE_ALLOW_UNKNOWN_PARAMS: bool = False  # 是否放行目录中未定义的参数
+
+    # 命令输出：内存中最多保留的字符数，超出部分写入产物文件
+    OUTPUT_MEMORY_LIMIT: int = 1024 * 1024
+    ARTIFACTS_DIR: str = "artifacts"
+    ARTIFACTS_TTL_HOURS: int = 24  # 不再被历史记录、后台任务引用的产物保留时间
+
+    # 批量执行
+    BATCH_MAX_ITEMS: int = 100
+    BATCH_DEFAULT_FAN_OUT: int = 4
+    BATCH_MAX_FAN_OUT: int = 16
+
+    # 批量修改（按ID删除历史记录/收藏、导入收藏），每个请求在一个事务中完成
+    BULK_MAX_ITEMS: int = 10000
+
     # JWT配置
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
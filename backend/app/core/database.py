@@ -1,30 +1,244 @@
 
 """
 数据库配置 - SQLite存储历史记录
+
+连接在进程内复用（连接池），使用WAL日志模式，读写可以并发进行；每个连接
+缓存预编译语句。AsyncHistoryDatabase 把所有调用放到专用线程池中执行，
+异步接口中通过 async_db 访问数据库，不阻塞事件循环。
 """
 
+import asyncio
+import functools
+import logging
+import math
+import queue
 import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+try:
+    import zstandard
+except ImportError:  # 未安装zstandard时使用zlib
+    zstandard = None
+
+
+def _output_codec() -> str:
+    codec = settings.HISTORY_OUTPUT_CODEC
+    if codec == "auto":
+        return "zstd" if zstandard else "zlib"
+    if codec == "zstd" and not zstandard:
+        return "zlib"
+    return codec
+
+
+def compress_output(output: str) -> Tuple[str, bytes]:
+    """压缩命令输出，返回 (编码, 数据)；压缩后不更小时原样保存"""
+    raw = output.encode()
+    codec = _output_codec()
+    if codec == "zstd":
+        data = zstandard.ZstdCompressor(level=settings.HISTORY_OUTPUT_LEVEL).compress(raw)
+    elif codec == "zlib":
+        data = zlib.compress(raw, settings.HISTORY_OUTPUT_LEVEL)
+    else:
+        return "raw", raw
+    return (codec, data) if len(data) < len(raw) else ("raw", raw)
+
+
+def decompress_output(codec: Optional[str], data: Optional[bytes]) -> Optional[str]:
+    """解压命令输出（同时注册为SQL函数 output_text）"""
+    if data is None:
+        return None
+    if codec == "zstd":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode(errors="replace")
+
+
+# 执行耗时按对数分桶：第n个桶为 (BASE^(n-1), BASE^n] 毫秒，分位数的相对误差不超过约5%
+LATENCY_BIN_BASE = 1.1
+
+
+def latency_bin(duration_ms: float) -> int:
+    """耗时所在的分桶编号"""
+    if duration_ms <= 1:
+        return 0
+    return math.ceil(math.log(duration_ms) / math.log(LATENCY_BIN_BASE))
+
+
+def _bin_value(bin_index: int) -> float:
+    """分桶的代表值（上下界的几何中点）"""
+    return LATENCY_BIN_BASE ** (bin_index - 0.5) if bin_index > 0 else 1.0
+
+
+def percentiles(bins: Dict[int, int], quantiles: Iterable[float]) -> Dict[float, Optional[float]]:
+    """由分桶计数估算分位数（毫秒）"""
+    total = sum(bins.values())
+    result: Dict[float, Optional[float]] = {}
+    ordered = sorted(bins.items())
+    for q in quantiles:
+        if not total:
+            result[q] = None
+            continue
+        rank = q * total
+        seen = 0
+        for bin_index, count in ordered:
+            seen += count
+            if seen >= rank:
+                result[q] = round(_bin_value(bin_index), 2)
+                break
+    return result
+
+
+def _writes(table: str):
+    """标记写方法：提交后以表名通知写入监听者（返回值为假即没有改动时不通知）"""
+    def decorator(method: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(method)
+        def wrapper(self: "HistoryDatabase", *args: Any, **kwargs: Any) -> Any:
+            result = method(self, *args, **kwargs)
+            if result:
+                self._notify_write(table)
+            return result
+        return wrapper
+    return decorator
+
+
+def _substring_snippet(texts: Iterable[Optional[str]], terms: List[str], width: int = 32) -> str:
+    """子串匹配的片段：取第一个命中词前后共约width个字符，格式同FTS5的snippet"""
+    for text in texts:
+        if not text:
+            continue
+        lowered = text.lower()
+        for term in terms:
+            index = lowered.find(term)
+            if index < 0:
+                continue
+            start = max(index - (width - len(term)) // 2, 0)
+            end = min(start + width, len(text))
+            end_term = index + len(term)
+            return (("…" if start > 0 else "") + text[start:index]
+                    + "<mark>" + text[index:end_term] + "</mark>"
+                    + text[end_term:end] + ("…" if end < len(text) else ""))
+    return ""
+
+
+def make_preview(output: str) -> str:
+    """列表中显示的输出预览"""
+    return output[:settings.HISTORY_PREVIEW_CHARS]
 
 
 class HistoryDatabase:
     """历史记录数据库"""
 
-    def __init__(self, db_path: str = "./history.db"):
+    def __init__(self, db_path: str = "./history.db", pool_size: int = 4):
         self.db_path = Path(db_path)
+        self.pool_size = max(pool_size, 1)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._write_listeners: List[Callable[[str], None]] = []
+        self._counts_ready = True  # 计数表是否可用（升级旧数据库时在后台重建完成后才可用）
         self._init_database()
 
-    def _get_connection(self):
-        """获取数据库连接"""
-        return sqlite3.connect(str(self.db_path))
+    def add_write_listener(self, listener: Callable[[str], None]):
+        """注册写入监听者，history / favorites 表提交改动后以表名调用（在数据库线程中）"""
+        self._write_listeners.append(listener)
+
+    def _notify_write(self, table: str):
+        for listener in self._write_listeners:
+            try:
+                listener(table)
+            except Exception:
+                logger.exception("写入通知失败: %s", table)
+
+    def _new_connection(self) -> sqlite3.Connection:
+        """创建连接并设置性能相关的pragma"""
+        conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            cached_statements=settings.DB_CACHED_STATEMENTS,
+            timeout=settings.DB_BUSY_TIMEOUT,
+        )
+        conn.execute("PRAGMA synchronous = NORMAL")  # WAL模式下NORMAL已保证不损坏
+        conn.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {settings.DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.create_function("output_text", 2, decompress_output, deterministic=True)
+        return conn
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """从连接池取出连接，池中没有空闲连接且未达上限时新建"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._new_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._pool.get()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """借用连接：正常结束时提交，异常时回滚，之后归还连接池"""
+        conn = self._get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        """关闭连接池中的全部连接"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
 
     def _init_database(self):
         """初始化数据库表"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            # 增量回收空间：删除数据后由incremental_vacuum逐步归还空闲页。
+            # 只有新建的空数据库能直接设置；已有数据库切换需要完整VACUUM（大库耗时很长，
+            # 需要最多两倍磁盘空间），不在启动时执行，由管理接口手动触发（见enable_incremental_vacuum）
+            if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info("数据库未启用增量回收，删除数据后文件不会缩小；"
+                            "可调用 POST /api/admin/db/vacuum 转换")
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._create_tables(conn.cursor())
+            self._counts_ready = "row_counts" not in self._pending_migrations_with(conn)
 
+    def _create_tables(self, cursor):
+        """创建数据表并补充旧版本缺少的列"""
         # 创建历史记录表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS history (
@@ -35,9 +249,37 @@ class HistoryDatabase:
                 params TEXT,
                 success INTEGER,
                 output TEXT,
+                status TEXT,
+                artifact_id TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        self._ensure_column(cursor, "history", "status", "TEXT")
+        self._ensure_column(cursor, "history", "artifact_id", "TEXT")
+        # 执行耗时和资源使用（毫秒 / KB，未测量时为空）
+        for column, definition in (("duration_ms", "REAL"), ("queue_ms", "REAL"),
+                                   ("cpu_ms", "REAL"), ("max_rss_kb", "INTEGER")):
+            self._ensure_column(cursor, "history", column, definition)
+
+        # 列表按 created_at DESC, id DESC 排序；id为rowid，已隐含在索引末尾
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_history_module_command_created_at
+            ON history (module, command, created_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_history_created_at
+            ON history (created_at)
+        """)
+        # 只按模块过滤时，按时间翻页和导出不需要临时排序
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_history_module_created_at
+            ON history (module, created_at)
+        """)
+        # 清理产物文件时查询是否仍被历史记录引用
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_history_artifact_id
+            ON history (artifact_id) WHERE artifact_id IS NOT NULL
+        """)
 
         # 创建收藏表
         cursor.execute("""
@@ -51,167 +293,1195 @@ class HistoryDatabase:
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_favorites_created_at
+            ON favorites (created_at)
+        """)
+
+        # 命令输出单独压缩存储，history中只保留预览和长度
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS history_output (
+                history_id INTEGER PRIMARY KEY,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        self._ensure_column(cursor, "history", "preview", "TEXT")
+        self._ensure_column(cursor, "history", "output_size", "INTEGER")
 
-        conn.commit()
-        conn.close()
+        # 全文索引：外部内容FTS5表，内容来自解压输出的视图，由触发器同步；
+        # trigram分词支持任意子串（含中文）
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'history_fts_source'")
+        if cursor.fetchone() is None:
+            # 旧版本：输出保存在history.output中，全文索引直接基于history表
+            for trigger in ("history_fts_insert", "history_fts_delete", "history_fts_update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute("DROP TABLE IF EXISTS history_fts")
+            # 旧输出由后台分批迁移（见 migrate_history_output_batch），视图和读取接口兼容未迁移的行
+            cursor.execute("""
+                CREATE VIEW history_fts_source AS
+                SELECT h.id AS id, h.command AS command, h.params AS params,
+                       COALESCE(output_text(o.codec, o.data), h.output) AS output
+                FROM history h LEFT JOIN history_output o ON o.history_id = h.id
+            """)
+
+        # 升级已有数据库时需要处理全部数据的迁移（补建全文索引、重建计数表），启动时只登记，
+        # 由后台分批执行（见 retention.RetentionManager.run_migrations）。
+        # position为已处理到的id，end_id为登记时的最大id，之后插入的行由触发器维护
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pending_migrations (
+                name TEXT PRIMARY KEY,
+                position INTEGER NOT NULL DEFAULT 0,
+                end_id INTEGER NOT NULL DEFAULT 0
+            )
+        """)
 
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'")
+        fts_exists = cursor.fetchone() is not None
+        if not fts_exists:
+            # 删除触发器只从索引中删除已建立索引的行，补建期间需要新版本的触发器
+            cursor.execute("DROP TRIGGER IF EXISTS history_fts_delete")
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                command, params, output,
+                content = 'history_fts_source', content_rowid = 'id', tokenize = 'trigram'
+            )
+        """)
+        # 输出写入后再建立索引（history行先于输出插入）
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_output_fts_insert AFTER INSERT ON history_output
+            BEGIN
+                INSERT INTO history_fts (rowid, command, params, output)
+                SELECT id, command, params, output_text(NEW.codec, NEW.data)
+                FROM history WHERE id = NEW.history_id;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history
+            BEGIN
+                INSERT INTO history_fts (history_fts, rowid, command, params, output)
+                SELECT 'delete', OLD.id, OLD.command, OLD.params, COALESCE(
+                    (SELECT output_text(codec, data) FROM history_output WHERE history_id = OLD.id),
+                    OLD.output
+                )
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM pending_migrations
+                    WHERE name = 'history_fts' AND OLD.id > position AND OLD.id <= end_id
+                );
+                DELETE FROM history_output WHERE history_id = OLD.id;
+            END
+        """)
+        if not fts_exists:
+            # 已有的行由后台分批建立索引（见 backfill_history_fts_batch）
+            cursor.execute("""
+                INSERT OR REPLACE INTO pending_migrations (name, position, end_id)
+                SELECT 'history_fts', 0, MAX(id) FROM history HAVING MAX(id) IS NOT NULL
+            """)
+
+        # 计数表：由触发器维护历史记录和收藏的行数，列表总数不需要COUNT(*)
+        # 历史记录按 (module, command)、(module, *)、(*, command)、(*, *) 四个维度计数
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'row_counts'")
+        counts_exist = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS row_counts (
+                scope TEXT NOT NULL,
+                module TEXT NOT NULL,
+                command TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, module, command)
+            ) WITHOUT ROWID
+        """)
+        history_keys = [
+            ("{row}.module", "{row}.command"),
+            ("{row}.module", "'*'"),
+            ("'*'", "{row}.command"),
+            ("'*'", "'*'"),
+        ]
+        self._create_count_triggers(cursor, "history", history_keys)
+        self._create_count_triggers(cursor, "favorites", [("'*'", "'*'")])
+        if not counts_exist:
+            # 触发器已开始计数，已有的行由后台重建（见 rebuild_counts），完成前直接统计
+            cursor.execute("""
+                INSERT OR REPLACE INTO pending_migrations (name)
+                SELECT 'row_counts' WHERE EXISTS (SELECT 1 FROM history) OR EXISTS (SELECT 1 FROM favorites)
+            """)
+
+        # 执行统计：按小时和 (module, command) 预聚合，写入历史记录时同步累加；
+        # run_latency_bins 保存耗时的对数分桶计数，用于估算分位数
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS run_rollups (
+                bucket TEXT NOT NULL,
+                module TEXT NOT NULL,
+                command TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                successes INTEGER NOT NULL DEFAULT 0,
+                total_ms REAL NOT NULL DEFAULT 0,
+                queue_runs INTEGER NOT NULL DEFAULT 0,
+                total_queue_ms REAL NOT NULL DEFAULT 0,
+                cpu_runs INTEGER NOT NULL DEFAULT 0,
+                total_cpu_ms REAL NOT NULL DEFAULT 0,
+                max_rss_kb INTEGER,
+                PRIMARY KEY (bucket, module, command)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS run_latency_bins (
+                bucket TEXT NOT NULL,
+                module TEXT NOT NULL,
+                command TEXT NOT NULL,
+                bin INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, module, command, bin)
+            ) WITHOUT ROWID
+        """)
+
+        # 创建后台任务表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                module TEXT NOT NULL,
+                command TEXT NOT NULL,
+                params TEXT,
+                status TEXT NOT NULL,
+                returncode INTEGER,
+                output TEXT,
+                error TEXT,
+                output_artifact TEXT,
+                error_artifact TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                started_at TEXT,
+                finished_at TEXT
+            )
+        """)
+        self._ensure_column(cursor, "jobs", "output_artifact", "TEXT")
+        self._ensure_column(cursor, "jobs", "error_artifact", "TEXT")
+
+        # 创建幂等键表（保存已完成执行的响应，过期或超出上限时清理）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at
+            ON idempotency_keys (expires_at)
+        """)
+
+    def migrate_history_output_batch(self, after_id: int,
+                                     batch_size: int = 500) -> Tuple[Optional[int], int]:
+        """把旧版本保存在history.output中的输出迁移到压缩表，每批一个事务
+
+        按id顺序迁移id大于after_id的一批，返回 (本批最后一行的id, 条数)，没有剩余时id为None。
+        """
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT id, command, params, output FROM history
+                WHERE id > ? AND output IS NOT NULL ORDER BY id LIMIT ?
+            """, (after_id, batch_size)).fetchall()
+            for history_id, command, params, output in rows:
+                # 全文索引中该行按history.output建立，先删除，写入压缩输出时由触发器重新索引
+                conn.execute("""
+                    INSERT INTO history_fts (history_fts, rowid, command, params, output)
+                    VALUES ('delete', ?, ?, ?, ?)
+                """, (history_id, command, params, output))
+                codec, data = compress_output(output)
+                conn.execute("""
+                    INSERT OR REPLACE INTO history_output (history_id, codec, data) VALUES (?, ?, ?)
+                """, (history_id, codec, data))
+                conn.execute("""
+                    UPDATE history SET output = NULL, preview = ?, output_size = ? WHERE id = ?
+                """, (make_preview(output), len(output), history_id))
+        return (rows[-1][0] if rows else None), len(rows)
+
+    @staticmethod
+    def _pending_migrations_with(conn) -> List[str]:
+        return [row[0] for row in conn.execute("SELECT name FROM pending_migrations ORDER BY name")]
+
+    def pending_migrations(self) -> List[str]:
+        """尚未完成的后台迁移"""
+        with self._connection() as conn:
+            return self._pending_migrations_with(conn)
+
+    def backfill_history_fts_batch(self, batch_size: int = 500) -> int:
+        """为升级前已有的历史记录分批建立全文索引，每批一个事务
+
+        按id顺序处理登记时已存在的行，返回本批条数，没有剩余时返回0并结束迁移。
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT position, end_id FROM pending_migrations WHERE name = 'history_fts'"
+            ).fetchone()
+            if row is None:
+                return 0
+            position, end_id = row
+            last_id, count = conn.execute("""
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM history WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                )
+            """, (position, end_id, batch_size)).fetchone()
+            if count == 0:
+                conn.execute("DELETE FROM pending_migrations WHERE name = 'history_fts'")
+                return 0
+            conn.execute("""
+                INSERT INTO history_fts (rowid, command, params, output)
+                SELECT id, command, params, output FROM history_fts_source WHERE id > ? AND id <= ?
+            """, (position, last_id))
+            conn.execute(
+                "UPDATE pending_migrations SET position = ? WHERE name = 'history_fts'", (last_id,)
+            )
+        return count
+
+    def rebuild_counts(self) -> bool:
+        """根据现有数据重建计数表（升级旧数据库后执行一次），没有待重建时返回False"""
+        with self._connection() as conn:
+            if conn.execute("SELECT 1 FROM pending_migrations WHERE name = 'row_counts'").fetchone() is None:
+                return False
+            self._rebuild_counts(conn.cursor())
+            conn.execute("DELETE FROM pending_migrations WHERE name = 'row_counts'")
+        self._counts_ready = True
+        return True
+
+    @staticmethod
+    def _create_count_triggers(cursor, table: str, keys: List[Tuple[str, str]]):
+        """创建插入/删除时维护row_counts的触发器，keys为 (module表达式, command表达式)"""
+        increments = "\n".join(
+            f"""INSERT INTO row_counts (scope, module, command, count)
+                VALUES ('{table}', {module.format(row='NEW')}, {command.format(row='NEW')}, 1)
+                ON CONFLICT (scope, module, command) DO UPDATE SET count = count + 1;"""
+            for module, command in keys
+        )
+        decrements = "\n".join(
+            f"""UPDATE row_counts SET count = count - 1
+                WHERE scope = '{table}' AND module = {module.format(row='OLD')}
+                AND command = {command.format(row='OLD')};"""
+            for module, command in keys
+        )
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                {increments}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                {decrements}
+            END
+        """)
+
+    @staticmethod
+    def _rebuild_counts(cursor):
+        """根据现有数据重建row_counts（在一个事务中，期间的写入等待完成后由触发器继续计数）"""
+        cursor.execute("DELETE FROM row_counts")
+        cursor.execute("""
+            INSERT INTO row_counts (scope, module, command, count)
+            SELECT 'history', module, command, COUNT(*) FROM history GROUP BY module, command
+            UNION ALL
+            SELECT 'history', module, '*', COUNT(*) FROM history GROUP BY module
+            UNION ALL
+            SELECT 'history', '*', command, COUNT(*) FROM history GROUP BY command
+            UNION ALL
+            SELECT 'history', '*', '*', COUNT(*) FROM history
+            UNION ALL
+            SELECT 'favorites', '*', '*', COUNT(*) FROM favorites
+        """)
+
+    @staticmethod
+    def _ensure_column(cursor, table: str, column: str, definition: str):
+        """为旧版本数据库补充新增的列"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @_writes("history")
     def add_history(self, module: str, command: str, params: Dict[str, Any], 
-                    success: bool, output: str) -&gt; int:
-        """添加历史记录"""
-        import json
-        
-        conn = self._get_connection()
-        cursor = conn.cursor()
+                    success: bool, output: str, status: Optional[str] = None,
+                    artifact_id: Optional[str] = None) -> int:
+        """添加历史记录
+
+        status为 success / failed / timeout，默认由success推导；
+        输出被截断时artifact_id为完整输出所在的产物。
+        """
+        record = {
+            "module": module,
+            "command": command,
+            "params": params,
+            "success": success,
+            "output": output,
+            "status": status,
+            "artifact_id": artifact_id,
+        }
+        with self._connection() as conn:
+            return self._insert_history(conn.cursor(), record, datetime.utcnow().isoformat())
+
+    @_writes("history")
+    def add_history_batch(self, records: List[Dict[str, Any]]) -> int:
+        """在一个事务中批量添加历史记录，records的字段同add_history"""
+        if not records:
+            return 0
 
         timestamp = datetime.utcnow().isoformat()
-        params_json = json.dumps(params) if params else None
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            for record in records:
+                self._insert_history(cursor, record, timestamp)
 
-        cursor.execute("""
-            INSERT INTO history (timestamp, module, command, params, success, output)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (timestamp, module, command, params_json, 1 if success else 0, output))
+        return len(records)
+
+    @staticmethod
+    def _insert_history(cursor, record: Dict[str, Any], timestamp: str) -> int:
+        """插入一条历史记录：元数据和预览写入history，完整输出压缩后写入history_output"""
+        import json
 
+        output = record.get("output") or ""
+        success = record["success"]
+        cursor.execute("""
+            INSERT INTO history (timestamp, module, command, params, success, status, artifact_id,
+                                 preview, output_size, duration_ms, queue_ms, cpu_ms, max_rss_kb)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            record.get("timestamp") or timestamp,
+            record["module"],
+            record["command"],
+            json.dumps(record["params"]) if record.get("params") else None,
+            1 if success else 0,
+            record.get("status") or ("success" if success else "failed"),
+            record.get("artifact_id"),
+            make_preview(output),
+            len(output),
+            record.get("duration_ms"),
+            record.get("queue_ms"),
+            record.get("cpu_ms"),
+            record.get("max_rss_kb"),
+        ))
         history_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
 
+        codec, data = compress_output(output)
+        cursor.execute("""
+            INSERT INTO history_output (history_id, codec, data) VALUES (?, ?, ?)
+        """, (history_id, codec, data))
+
+        if record.get("duration_ms") is not None:
+            HistoryDatabase._add_rollup(cursor, record)
         return history_id
 
-    def get_history(self, limit: int = 50, offset: int = 0, 
-                    module: Optional[str] = None, 
-                    command: Optional[str] = None) -&gt; List[Dict[str, Any]]:
-        """获取历史记录"""
-        import json
-        
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    @staticmethod
+    def _add_rollup(cursor, record: Dict[str, Any]):
+        """把一次执行累加到所在小时的统计汇总中"""
+        bucket = datetime.utcnow().strftime("%Y-%m-%d %H:00:00")
+        key = (bucket, record["module"], record["command"])
+        queue_ms = record.get("queue_ms")
+        cpu_ms = record.get("cpu_ms")
+        cursor.execute("""
+            INSERT INTO run_rollups (bucket, module, command, runs, successes, total_ms,
+                                     queue_runs, total_queue_ms, cpu_runs, total_cpu_ms, max_rss_kb)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (bucket, module, command) DO UPDATE SET
+                runs = runs + 1,
+                successes = successes + excluded.successes,
+                total_ms = total_ms + excluded.total_ms,
+                queue_runs = queue_runs + excluded.queue_runs,
+                total_queue_ms = total_queue_ms + excluded.total_queue_ms,
+                cpu_runs = cpu_runs + excluded.cpu_runs,
+                total_cpu_ms = total_cpu_ms + excluded.total_cpu_ms,
+                max_rss_kb = NULLIF(max(COALESCE(max_rss_kb, 0), COALESCE(excluded.max_rss_kb, 0)), 0)
+        """, key + (
+            1 if record["success"] else 0,
+            record["duration_ms"],
+            0 if queue_ms is None else 1,
+            queue_ms or 0,
+            0 if cpu_ms is None else 1,
+            cpu_ms or 0,
+            record.get("max_rss_kb"),
+        ))
+        cursor.execute("""
+            INSERT INTO run_latency_bins (bucket, module, command, bin, count) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (bucket, module, command, bin) DO UPDATE SET count = count + 1
+        """, key + (latency_bin(record["duration_ms"]),))
 
-        query = "SELECT id, timestamp, module, command, params, success, output, created_at FROM history"
-        conditions = []
-        params = []
+    def get_run_stats(self, since: str, module: Optional[str] = None,
+                      command: Optional[str] = None) -> Dict[str, Any]:
+        """读取since（小时桶）之后的执行统计汇总
 
+        返回 {"rollups": 每小时每个命令的汇总行, "bins": {(module, command): {分桶: 次数}}}。
+        """
+        conditions = ["bucket >= ?"]
+        params: List[Any] = [since]
         if module:
             conditions.append("module = ?")
             params.append(module)
-        
         if command:
             conditions.append("command = ?")
             params.append(command)
+        where = " AND ".join(conditions)
+
+        with self._connection() as conn:
+            rollups = conn.execute(f"""
+                SELECT bucket, module, command, runs, successes, total_ms, queue_runs,
+                       total_queue_ms, cpu_runs, total_cpu_ms, max_rss_kb
+                FROM run_rollups WHERE {where} ORDER BY bucket
+            """, params).fetchall()
+            bin_rows = conn.execute(f"""
+                SELECT module, command, bin, SUM(count)
+                FROM run_latency_bins WHERE {where} GROUP BY module, command, bin
+            """, params).fetchall()
+
+        columns = ("bucket", "module", "command", "runs", "successes", "total_ms", "queue_runs",
+                   "total_queue_ms", "cpu_runs", "total_cpu_ms", "max_rss_kb")
+        bins: Dict[Tuple[str, str], Dict[int, int]] = {}
+        for row_module, row_command, bin_index, count in bin_rows:
+            bins.setdefault((row_module, row_command), {})[bin_index] = count
+        return {"rollups": [dict(zip(columns, row)) for row in rollups], "bins": bins}
+
+    @_writes("history")
+    def delete_run_stats_before(self, cutoff: str, limit: int) -> int:
+        """删除早于cutoff（小时桶）的执行统计，最多limit个小时桶，返回删除的汇总行数"""
+        with self._connection() as conn:
+            buckets = [row[0] for row in conn.execute(
+                "SELECT DISTINCT bucket FROM run_rollups WHERE bucket < ? ORDER BY bucket LIMIT ?",
+                (cutoff, limit),
+            )]
+            if not buckets:
+                return 0
+            last = buckets[-1]
+            conn.execute("DELETE FROM run_latency_bins WHERE bucket <= ?", (last,))
+            return conn.execute("DELETE FROM run_rollups WHERE bucket <= ?", (last,)).rowcount
+
+    def get_history(self, limit: int = 50, offset: int = 0, 
+                    module: Optional[str] = None, 
+                    command: Optional[str] = None,
+                    before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """获取历史记录，output为输出预览（完整输出通过get_history_item获取）
+
+        按 created_at DESC, id DESC 排序；before为 (created_at, id) 时只返回排在它之后的记录
+        （游标分页，不需要跳过前面的行）。
+        """
+        import json
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            query = ("SELECT id, timestamp, module, command, params, success, "
+                     "COALESCE(preview, substr(output, 1, ?)), created_at, status, artifact_id, "
+                     "COALESCE(output_size, length(output)), duration_ms, queue_ms, cpu_ms, max_rss_kb "
+                     "FROM history")
+            conditions = []
+            params: List[Any] = [settings.HISTORY_PREVIEW_CHARS]
+
+            if module:
+                conditions.append("module = ?")
+                params.append(module)
+        
+            if command:
+                conditions.append("command = ?")
+                params.append(command)
+
+            if before:
+                conditions.append("(created_at, id) < (?, ?)")
+                params.extend(before)
+
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+
+            query += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+            history = []
+            for row in rows:
+                history.append(self._history_row(row))
+        return history
+
+    @staticmethod
+    def _history_row(row) -> Dict[str, Any]:
+        import json
+
+        output = row[6] or ""
+        output_size = row[10] or 0
+        return {
+            "id": row[0],
+            "timestamp": row[1],
+            "module": row[2],
+            "command": row[3],
+            "params": json.loads(row[4]) if row[4] else {},
+            "success": bool(row[5]),
+            "output": output,
+            "created_at": row[7],
+            "status": row[8] or ("success" if row[5] else "failed"),
+            "artifact_id": row[9],
+            "output_size": output_size,
+            "output_truncated": output_size > len(output),
+            "duration_ms": row[11],
+            "queue_ms": row[12],
+            "cpu_ms": row[13],
+            "max_rss_kb": row[14],
+        }
+
+    def get_history_item(self, history_id: int) -> Optional[Dict[str, Any]]:
+        """获取单条历史记录及完整输出"""
+        with self._connection() as conn:
+            row = conn.execute("""
+                SELECT h.id, h.timestamp, h.module, h.command, h.params, h.success,
+                       COALESCE(output_text(o.codec, o.data), h.output), h.created_at,
+                       h.status, h.artifact_id, COALESCE(h.output_size, length(h.output)),
+                       h.duration_ms, h.queue_ms, h.cpu_ms, h.max_rss_kb
+                FROM history h LEFT JOIN history_output o ON o.history_id = h.id
+                WHERE h.id = ?
+            """, (history_id,)).fetchone()
+
+        return self._history_row(row) if row else None
+
+    def export_history_chunk(self, limit: int, after: Optional[Tuple[str, int]] = None,
+                             module: Optional[str] = None, command: Optional[str] = None,
+                             since: Optional[str] = None, until: Optional[str] = None,
+                             include_output: bool = True,
+                             max_chars: int = 0) -> List[Dict[str, Any]]:
+        """按 created_at, id 升序读取一段历史记录，用于导出
+
+        after为上一段最后一条的 (created_at, id)。每段在单独的短事务中读取，
+        导出再久也不会长时间占用连接或阻止WAL检查点。include_output为False时只导出预览。
+        max_chars大于0时，已读输出的总字符数达到该值就结束本段（至少一行）；
+        输出逐行解压，之后的行不会被读取。
+        """
+        output_expr = ("COALESCE(output_text(o.codec, o.data), h.output)" if include_output
+                       else "COALESCE(h.preview, substr(h.output, 1, ?))")
+        join = " LEFT JOIN history_output o ON o.history_id = h.id" if include_output else ""
+        params: List[Any] = [] if include_output else [settings.HISTORY_PREVIEW_CHARS]
+
+        conditions = []
+        for column, op, value in (("module", "=", module), ("command", "=", command),
+                                  ("created_at", ">=", since), ("created_at", "<", until)):
+            if value:
+                conditions.append(f"h.{column} {op} ?")
+                params.append(value)
+        if after:
+            conditions.append("(h.created_at, h.id) > (?, ?)")
+            params.extend(after)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+
+        rows = []
+        chars = 0
+        with self._connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT h.id, h.timestamp, h.module, h.command, h.params, h.success,
+                       {output_expr}, h.created_at, h.status, h.artifact_id,
+                       COALESCE(h.output_size, length(h.output)),
+                       h.duration_ms, h.queue_ms, h.cpu_ms, h.max_rss_kb
+                FROM history h{join}{where}
+                ORDER BY h.created_at, h.id LIMIT ?
+            """, params)
+            try:
+                for row in cursor:
+                    rows.append(self._history_row(row))
+                    chars += len(row[6] or "")
+                    if max_chars and chars >= max_chars:
+                        break
+            finally:
+                cursor.close()
+
+        return rows
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+    def search_history(self, query: Optional[str], limit: int = 50, offset: int = 0,
+                       module: Optional[str] = None, command: Optional[str] = None,
+                       since: Optional[str] = None, until: Optional[str] = None,
+                       substrings: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """全文搜索历史记录（命令、参数、输出）
 
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        query为FTS5查询表达式，按相关度排序；since/until按created_at过滤。
+        substrings为不足3个字符的词（trigram索引无法匹配），在命令、参数和输出中按子串
+        匹配（不区分ASCII大小写）。只有这类词时不使用索引，按时间从新到旧扫描到够数为止。
+        返回的snippet为匹配片段，命中词用<mark>标记。
+        """
+        import json
+
+        substrings = [term.lower() for term in substrings]
+        conditions = []
+        params: List[Any] = []
+        if query:
+            conditions.append("history_fts MATCH ?")
+            params.append(query)
+        for column, op, value in (("module", "=", module), ("command", "=", command),
+                                  ("created_at", ">=", since), ("created_at", "<", until)):
+            if value:
+                conditions.append(f"h.{column} {op} ?")
+                params.append(value)
+        for term in substrings:
+            conditions.append("instr(lower(s.command || ' ' || COALESCE(s.params, '') || ' ' || "
+                              "COALESCE(s.output, '')), ?) > 0")
+            params.append(term)
         params.extend([limit, offset])
+        where = " AND ".join(conditions)
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        with self._connection() as conn:
+            if query:
+                source = "JOIN history_fts_source s ON s.id = h.id" if substrings else ""
+                rows = conn.execute(f"""
+                    SELECT h.id, h.timestamp, h.module, h.command, h.params, h.success,
+                           h.created_at, h.status, h.artifact_id,
+                           snippet(history_fts, -1, '<mark>', '</mark>', '…', 32),
+                           bm25(history_fts, 5.0, 2.0, 1.0) AS rank
+                    FROM history_fts JOIN history h ON h.id = history_fts.rowid {source}
+                    WHERE {where}
+                    ORDER BY rank, h.id DESC LIMIT ? OFFSET ?
+                """, params).fetchall()
+            else:
+                rows = [
+                    row[:9] + (_substring_snippet(row[9:], substrings), 0.0)
+                    for row in conn.execute(f"""
+                        SELECT h.id, h.timestamp, h.module, h.command, h.params, h.success,
+                               h.created_at, h.status, h.artifact_id,
+                               s.command, s.params, s.output
+                        FROM history h JOIN history_fts_source s ON s.id = h.id
+                        WHERE {where}
+                        ORDER BY h.created_at DESC, h.id DESC LIMIT ? OFFSET ?
+                    """, params).fetchall()
+                ]
 
-        history = []
-        for row in rows:
-            history.append({
+        return [
+            {
                 "id": row[0],
                 "timestamp": row[1],
                 "module": row[2],
                 "command": row[3],
                 "params": json.loads(row[4]) if row[4] else {},
                 "success": bool(row[5]),
-                "output": row[6],
-                "created_at": row[7],
-            })
+                "created_at": row[6],
+                "status": row[7] or ("success" if row[5] else "failed"),
+                "artifact_id": row[8],
+                "snippet": row[9],
+                "score": -row[10],
+            }
+            for row in rows
+        ]
 
-        conn.close()
-        return history
+    def _get_count(self, scope: str, module: Optional[str], command: Optional[str]) -> int:
+        with self._connection() as conn:
+            return self._get_count_with(conn, scope, module, command)
 
-    def delete_history(self, history_id: int) -&gt; bool:
-        """删除历史记录"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def _get_count_with(self, conn, scope: str, module: Optional[str] = None,
+                        command: Optional[str] = None) -> int:
+        if not self._counts_ready:
+            # 计数表在后台重建完成之前直接统计
+            conditions = [f"{column} = ?" for column, value in (("module", module), ("command", command))
+                          if value]
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            table = "history" if scope == "history" else "favorites"
+            return conn.execute(
+                f"SELECT COUNT(*) FROM {table} {where}", [value for value in (module, command) if value]
+            ).fetchone()[0]
+        row = conn.execute("""
+            SELECT count FROM row_counts WHERE scope = ? AND module = ? AND command = ?
+        """, (scope, module or "*", command or "*")).fetchone()
+        return row[0] if row else 0
 
-        cursor.execute("DELETE FROM history WHERE id = ?", (history_id,))
-        deleted = cursor.rowcount &gt; 0
+    def count_history(self, module: Optional[str] = None, command: Optional[str] = None) -> int:
+        """历史记录总数（可按模块/命令过滤），从计数表读取"""
+        return self._get_count("history", module, command)
 
-        conn.commit()
-        conn.close()
+    def count_favorites(self) -> int:
+        """收藏总数，从计数表读取"""
+        return self._get_count("favorites", None, None)
+
+    @_writes("history")
+    def delete_history(self, history_id: int) -> bool:
+        """删除历史记录"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("DELETE FROM history WHERE id = ?", (history_id,))
+            deleted = cursor.rowcount > 0
 
         return deleted
 
-    def clear_history(self) -&gt; bool:
-        """清空历史记录"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    @_writes("history")
+    def delete_history_batch(self, history_ids: List[int]) -> int:
+        """在一个事务中按ID批量删除历史记录，返回删除条数"""
+        if not history_ids:
+            return 0
+        with self._connection() as conn:
+            cursor = conn.executemany("DELETE FROM history WHERE id = ?", [(i,) for i in history_ids])
+            return cursor.rowcount
+
+    @_writes("history")
+    def delete_history_where(self, module: Optional[str] = None, command: Optional[str] = None,
+                             since: Optional[str] = None, until: Optional[str] = None,
+                             success: Optional[bool] = None) -> int:
+        """在一个事务中删除符合条件的历史记录，返回删除条数（至少需要一个条件）"""
+        conditions = []
+        params: List[Any] = []
+        for column, op, value in (("module", "=", module), ("command", "=", command),
+                                  ("created_at", ">=", since), ("created_at", "<", until)):
+            if value:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        if success is not None:
+            conditions.append("success = ?")
+            params.append(1 if success else 0)
+        if not conditions:
+            raise ValueError("至少需要一个删除条件")
+
+        with self._connection() as conn:
+            cursor = conn.execute(f"DELETE FROM history WHERE {' AND '.join(conditions)}", params)
+            return cursor.rowcount
 
-        cursor.execute("DELETE FROM history")
-        cleared = cursor.rowcount &gt; 0
+    @_writes("history")
+    def clear_history(self) -> bool:
+        """清空历史记录"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute("DELETE FROM history")
+            cleared = cursor.rowcount > 0
 
         return cleared
 
+    @_writes("history")
+    def delete_history_before(self, cutoff: str, limit: int, module: Optional[str] = None,
+                              exclude_modules: Iterable[str] = ()) -> int:
+        """删除created_at早于cutoff的历史记录，最多limit条，返回删除条数"""
+        conditions = ["created_at < ?"]
+        params: List[Any] = [cutoff]
+        if module:
+            conditions.append("module = ?")
+            params.append(module)
+        exclude_modules = list(exclude_modules)
+        if exclude_modules:
+            conditions.append(f"module NOT IN ({', '.join('?' * len(exclude_modules))})")
+            params.extend(exclude_modules)
+        params.append(limit)
+
+        with self._connection() as conn:
+            cursor = conn.execute(f"""
+                DELETE FROM history WHERE id IN (
+                    SELECT id FROM history WHERE {" AND ".join(conditions)} LIMIT ?
+                )
+            """, params)
+            return cursor.rowcount
+
+    @_writes("history")
+    def delete_oldest_history(self, limit: int, module: Optional[str] = None) -> int:
+        """删除最早的limit条历史记录（可限定模块），返回删除条数"""
+        with self._connection() as conn:
+            if module:
+                cursor = conn.execute("""
+                    DELETE FROM history WHERE id IN (
+                        SELECT id FROM history WHERE module = ? ORDER BY created_at, id LIMIT ?
+                    )
+                """, (module, limit))
+            else:
+                cursor = conn.execute("""
+                    DELETE FROM history WHERE id IN (
+                        SELECT id FROM history ORDER BY created_at, id LIMIT ?
+                    )
+                """, (limit,))
+            return cursor.rowcount
+
+    def referenced_artifacts(self, artifact_ids: Iterable[str]) -> Set[str]:
+        """返回仍被历史记录、后台任务或未过期的幂等记录（重放的响应）引用的产物ID"""
+        import time
+
+        artifact_ids = list(artifact_ids)
+        referenced: Set[str] = set()
+        with self._connection() as conn:
+            # 幂等记录数量有上限（IDEMPOTENCY_MAX_ENTRIES），一次取出全部引用
+            rows = conn.execute("""
+                SELECT json_extract(response, '$.artifact_id') FROM idempotency_keys
+                WHERE expires_at > ? AND json_extract(response, '$.artifact_id') IS NOT NULL
+            """, (time.time(),)).fetchall()
+            referenced.update({row[0] for row in rows}.intersection(artifact_ids))
+            for start in range(0, len(artifact_ids), 500):
+                chunk = artifact_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(f"""
+                    SELECT artifact_id FROM history WHERE artifact_id IN ({placeholders})
+                    UNION SELECT output_artifact FROM jobs WHERE output_artifact IN ({placeholders})
+                    UNION SELECT error_artifact FROM jobs WHERE error_artifact IN ({placeholders})
+                """, chunk * 3).fetchall()
+                referenced.update(row[0] for row in rows)
+        return referenced
+
+    def delete_finished_jobs_before(self, cutoff: str, limit: int) -> int:
+        """删除早于cutoff的已结束后台任务，最多limit条"""
+        with self._connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM jobs WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE status NOT IN ('queued', 'running') AND created_at < ? LIMIT ?
+                )
+            """, (cutoff, limit))
+            return cursor.rowcount
+
+    def merge_fts(self, pages: int) -> int:
+        """增量合并全文索引段，清除已删除记录留下的数据，返回本次改动数（小于2表示已合并完）
+
+        参数为负数时即使段数未达到自动合并阈值也会合并，删除标记才能真正清除。
+        """
+        with self._connection() as conn:
+            before = conn.total_changes
+            conn.execute("INSERT INTO history_fts (history_fts, rank) VALUES ('merge', ?)", (-pages,))
+            return conn.total_changes - before
+
+    def checkpoint(self) -> None:
+        """把WAL写回数据库文件并截断WAL，使回收的空间体现在文件大小上"""
+        with self._connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def enable_incremental_vacuum(self) -> Dict[str, Any]:
+        """把已有数据库切换为增量回收模式（执行一次完整VACUUM）
+
+        VACUUM期间其他写入会等待，耗时与数据库大小成正比，需要最多两倍数据库大小的磁盘空间。
+        已是增量模式时直接返回。
+        """
+        with self._connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return {"converted": False, "auto_vacuum": "incremental"}
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            before = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            after = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return {
+            "converted": mode == 2,
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(mode),
+            "bytes_before": before,
+            "bytes_after": after,
+        }
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """归还最多pages个空闲页给文件系统，返回实际归还的页数"""
+        with self._connection() as conn:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # execute()只执行一步（每步只释放一页），executescript会执行到结束
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return before - after
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        """数据库文件大小、页使用情况和各表行数"""
+        with self._connection() as conn:
+            pragma = {
+                name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_size", "page_count", "freelist_count", "auto_vacuum", "journal_mode")
+            }
+            counts = {
+                "history": self._get_count_with(conn, "history"),
+                "favorites": self._get_count_with(conn, "favorites"),
+                "jobs": conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0],
+                "idempotency_keys": conn.execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()[0],
+            }
+            oldest = conn.execute("SELECT MIN(created_at) FROM history").fetchone()[0]
+            pending = self._pending_migrations_with(conn)
+
+        wal_path = Path(f"{self.db_path}-wal")
+        return {
+            "path": str(self.db_path),
+            "file_size": self.db_path.stat().st_size if self.db_path.exists() else 0,
+            "wal_size": wal_path.stat().st_size if wal_path.exists() else 0,
+            "page_size": pragma["page_size"],
+            "page_count": pragma["page_count"],
+            "freelist_count": pragma["freelist_count"],
+            "used_bytes": (pragma["page_count"] - pragma["freelist_count"]) * pragma["page_size"],
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(pragma["auto_vacuum"]),
+            "journal_mode": pragma["journal_mode"],
+            "rows": counts,
+            "oldest_history": oldest,
+            "pending_migrations": pending,
+        }
+
+    @_writes("favorites")
     def add_favorite(self, module: str, command: str, name: Optional[str] = None,
-                     description: Optional[str] = None, params: Optional[Dict[str, Any]] = None) -&gt; int:
-        """添加收藏"""
+                     description: Optional[str] = None,
+                     params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """添加收藏，返回插入的行"""
         import json
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-        params_json = json.dumps(params) if params else None
+            params_json = json.dumps(params) if params else None
 
-        cursor.execute("""
-            INSERT INTO favorites (module, command, name, description, params)
-            VALUES (?, ?, ?, ?, ?)
-        """, (module, command, name, description, params_json))
+            cursor.execute("""
+                INSERT INTO favorites (module, command, name, description, params)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING id, module, command, name, description, params, created_at
+            """, (module, command, name, description, params_json))
+
+            row = cursor.fetchone()
 
-        favorite_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        return self._favorite_row(row)
 
-        return favorite_id
+    @_writes("favorites")
+    def add_favorites_batch(self, favorites: List[Dict[str, Any]], skip_duplicates: bool = True) -> int:
+        """在一个事务中批量添加收藏，字段同add_favorite，返回实际添加的条数
 
-    def get_favorites(self, limit: int = 50, offset: int = 0) -&gt; List[Dict[str, Any]]:
-        """获取收藏列表"""
+        skip_duplicates为True时跳过模块、命令、名称和参数都相同的已有收藏。
+        """
         import json
-        
-        conn = self._get_connection()
-        cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT id, module, command, name, description, params, created_at
-            FROM favorites ORDER BY created_at DESC LIMIT ? OFFSET ?
-        """, (limit, offset))
+        rows = [
+            (item["module"], item["command"], item.get("name"), item.get("description"),
+             json.dumps(item["params"]) if item.get("params") else None)
+            for item in favorites
+        ]
+        if not rows:
+            return 0
 
-        rows = cursor.fetchall()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if skip_duplicates:
+                cursor.executemany("""
+                    INSERT INTO favorites (module, command, name, description, params)
+                    SELECT ?1, ?2, ?3, ?4, ?5 WHERE NOT EXISTS (
+                        SELECT 1 FROM favorites
+                        WHERE module = ?1 AND command = ?2 AND name IS ?3 AND params IS ?5
+                    )
+                """, rows)
+            else:
+                cursor.executemany("""
+                    INSERT INTO favorites (module, command, name, description, params)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+            return cursor.rowcount
 
-        favorites = []
-        for row in rows:
-            favorites.append({
-                "id": row[0],
-                "module": row[1],
-                "command": row[2],
-                "name": row[3],
-                "description": row[4],
-                "params": json.loads(row[5]) if row[5] else {},
-                "created_at": row[6],
-            })
+    def export_favorites(self) -> List[Dict[str, Any]]:
+        """全部收藏，按添加顺序"""
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT id, module, command, name, description, params, created_at
+                FROM favorites ORDER BY id
+            """).fetchall()
+        return [self._favorite_row(row) for row in rows]
+
+    @staticmethod
+    def _favorite_row(row) -> Dict[str, Any]:
+        import json
+
+        return {
+            "id": row[0],
+            "module": row[1],
+            "command": row[2],
+            "name": row[3],
+            "description": row[4],
+            "params": json.loads(row[5]) if row[5] else {},
+            "created_at": row[6],
+        }
+
+    def get_favorites(self, limit: int = 50, offset: int = 0,
+                      before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """获取收藏列表，排序和before的含义同get_history"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-        conn.close()
+            if before:
+                cursor.execute("""
+                    SELECT id, module, command, name, description, params, created_at
+                    FROM favorites WHERE (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+                """, (*before, limit, offset))
+            else:
+                cursor.execute("""
+                    SELECT id, module, command, name, description, params, created_at
+                    FROM favorites ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+                """, (limit, offset))
+
+            rows = cursor.fetchall()
+
+            favorites = []
+            for row in rows:
+                favorites.append(self._favorite_row(row))
         return favorites
 
-    def delete_favorite(self, favorite_id: int) -&gt; bool:
+    @_writes("favorites")
+    def delete_favorite(self, favorite_id: int) -> bool:
         """删除收藏"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM favorites WHERE id = ?", (favorite_id,))
-        deleted = cursor.rowcount &gt; 0
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute("DELETE FROM favorites WHERE id = ?", (favorite_id,))
+            deleted = cursor.rowcount > 0
 
         return deleted
 
+    @_writes("favorites")
+    def delete_favorites_batch(self, favorite_ids: List[int]) -> int:
+        """在一个事务中按ID批量删除收藏，返回删除条数"""
+        if not favorite_ids:
+            return 0
+        with self._connection() as conn:
+            cursor = conn.executemany("DELETE FROM favorites WHERE id = ?", [(i,) for i in favorite_ids])
+            return cursor.rowcount
+
+    def add_job(self, job_id: str, module: str, command: str,
+                params: Dict[str, Any], status: str = "queued",
+                created_at: Optional[str] = None) -> str:
+        """添加后台任务，created_at默认为当前时间"""
+        import json
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            params_json = json.dumps(params) if params else None
+
+            cursor.execute("""
+                INSERT INTO jobs (id, module, command, params, status, created_at)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            """, (job_id, module, command, params_json, status, created_at))
+
+        return job_id
+
+    def update_job(self, job_id: str, **fields: Any) -> bool:
+        """更新后台任务状态（status/returncode/output/error/产物ID/started_at/finished_at）"""
+        allowed = {
+            "status", "returncode", "output", "error",
+            "output_artifact", "error_artifact", "started_at", "finished_at",
+        }
+        fields = {k: v for k, v in fields.items() if k in allowed}
+        if not fields:
+            return False
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            assignments = ", ".join(f"{key} = ?" for key in fields)
+            cursor.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+            updated = cursor.rowcount > 0
+
+        return updated
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取后台任务"""
+        import json
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT id, module, command, params, status, returncode, output, error,
+                       created_at, started_at, finished_at, output_artifact, error_artifact
+                FROM jobs WHERE id = ?
+            """, (job_id,))
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        return {
+            "id": row[0],
+            "module": row[1],
+            "command": row[2],
+            "params": json.loads(row[3]) if row[3] else {},
+            "status": row[4],
+            "returncode": row[5],
+            "output": row[6] or "",
+            "error": row[7] or "",
+            "created_at": row[8],
+            "started_at": row[9],
+            "finished_at": row[10],
+            "output_artifact": row[11],
+            "error_artifact": row[12],
+        }
+
+    def get_idempotency_record(self, key: str) -> Optional[Dict[str, Any]]:
+        """获取未过期的幂等记录"""
+        import json
+        import time
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT fingerprint, response, created_at FROM idempotency_keys
+                WHERE key = ? AND expires_at > ?
+            """, (key, time.time()))
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        return {
+            "fingerprint": row[0],
+            "response": json.loads(row[1]),
+            "created_at": row[2],
+        }
+
+    def save_idempotency_record(self, key: str, fingerprint: str, response: Dict[str, Any],
+                                ttl_seconds: int, max_entries: int) -> None:
+        """保存幂等记录，同时清理过期记录和超出上限的最旧记录"""
+        import json
+        import time
+
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, response, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, fingerprint, json.dumps(response, ensure_ascii=False), now, now + ttl_seconds))
+            cursor.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+            cursor.execute("""
+                DELETE FROM idempotency_keys WHERE key IN (
+                    SELECT key FROM idempotency_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (max_entries,))
+
+    def interrupt_unfinished_jobs(self) -> int:
+        """将上次运行遗留的未完成任务标记为中断"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                UPDATE jobs SET status = 'interrupted', finished_at = CURRENT_TIMESTAMP
+                WHERE status IN ('queued', 'running')
+            """)
+            interrupted = cursor.rowcount
+
+        return interrupted
+
+
+class AsyncHistoryDatabase:
+    """HistoryDatabase的异步包装，调用在专用线程池中执行
+
+    线程数与连接池大小一致，每个线程总能拿到连接；
+    用法与HistoryDatabase相同：await async_db.get_history(...)
+    """
+
+    def __init__(self, database: HistoryDatabase):
+        self._db = database
+        self._executor = ThreadPoolExecutor(
+            max_workers=database.pool_size, thread_name_prefix="history-db"
+        )
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = getattr(self._db, name)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(method, *args, **kwargs)
+            )
+
+        return call
+
+    def close(self):
+        """等待进行中的调用完成后关闭线程池和连接"""
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
 
 # 全局数据库实例
-db = HistoryDatabase()
+db = HistoryDatabase(settings.DB_PATH, pool_size=settings.DB_POOL_SIZE)
+
+# 全局异步数据库实例
+async_db = AsyncHistoryDatabase(db)
@@ -1,10 +1,25 @@
 
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from app.core.config import settings
 from app.api import api_router
+from app.core.database import async_db
+from app.services.artifacts import artifact_store
+from app.services.catalog_discovery import catalog_discovery
+from app.services.executor import build_env, get_ai_toolkit_path
+from app.services.history_writer import history_writer
+from app.services.jobs import job_manager
+from app.services.response_cache import response_cache
+from app.services.retention import retention_manager
+from app.services.worker_pool import worker_pool
+
+logging.basicConfig(
+    level=settings.LOG_LEVEL.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -28,7 +43,38 @@ app.include_router(api_router, prefix=settings.API_PREFIX)
 @app.on_event("startup")
 async def startup():
     """启动时初始化缓存"""
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    FastAPICache.init(
+        response_cache,
+        prefix="fastapi-cache",
+        key_builder=response_cache.key_builder,
+        enable=settings.RESPONSE_CACHE_ENABLED,
+    )
+
+    # 模块目录：内省缓存有效时立即加载，否则先用静态目录并在后台内省
+    catalog_discovery.start()
+
+    # 启动常驻进程池，失败时执行会回退到新进程
+    if settings.WORKER_POOL_ENABLED:
+        ai_toolkit_path = get_ai_toolkit_path()
+        env = build_env(ai_toolkit_path) if ai_toolkit_path else {}
+        await worker_pool.start(ai_toolkit_path, env)
+
+    history_writer.start()
+    job_manager.start()
+    artifact_store.start()
+    retention_manager.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """关闭时中断后台任务，写入缓冲的历史记录，释放常驻进程和数据库连接"""
+    await retention_manager.stop()
+    await catalog_discovery.stop()
+    await job_manager.shutdown()
+    await worker_pool.stop()
+    await artifact_store.stop()
+    await history_writer.stop()
+    async_db.close()
 
 
 @app.get("/")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 
 class ExecuteRequest(BaseModel):
@@ -8,6 +8,17 @@ class ExecuteRequest(BaseModel):
     module: str
     command: str
     params: Dict[str, Any] = {}
+    # 资源限制覆盖（秒/秒/MB），不超过配置的上限
+    timeout: Optional[int] = None
+    cpu_limit: Optional[int] = None
+    memory_limit: Optional[int] = None
+
+
+class BatchExecuteRequest(BaseModel):
+    """批量执行请求"""
+
+    items: List[ExecuteRequest]
+    fan_out: Optional[int] = None  # 并发数，不超过配置上限
 
 
 class ExecuteResponse(BaseModel):
@@ -16,3 +27,60 @@ class ExecuteResponse(BaseModel):
     success: bool
     message: str
     output: str
+    cached: bool = False
+    status: Optional[str] = None  # success / failed / timeout
+    # 输出超过内存上限时被截断，完整内容通过 /api/execute/artifacts/{artifact_id} 读取
+    truncated: bool = False
+    artifact_id: Optional[str] = None
+
+
+class ResourceLimits(BaseModel):
+    """子进程资源限制（内部使用），None表示不限制"""
+
+    timeout: Optional[int] = None  # 墙钟时间（秒）
+    cpu_time: Optional[int] = None  # CPU时间（秒）
+    memory_mb: Optional[int] = None  # 数据段内存（MB，RLIMIT_DATA）
+
+
+class ExecutionResult(BaseModel):
+    """命令执行结果（内部使用）"""
+
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    stdout_artifact: Optional[str] = None  # 输出被截断时完整内容所在的产物ID
+    stderr_artifact: Optional[str] = None
+    # 资源使用（无法获取时为None）
+    queue_ms: Optional[float] = None  # 等待调度名额的时间
+    cpu_ms: Optional[float] = None  # 子进程CPU时间（用户态+内核态）
+    max_rss_kb: Optional[int] = None  # 子进程峰值常驻内存
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    @property
+    def status(self) -> str:
+        """历史记录状态：success / failed / timeout"""
+        if self.timed_out:
+            return "timeout"
+        return "success" if self.success else "failed"
+
+    @property
+    def output(self) -> str:
+        """成功时返回标准输出，失败时优先返回错误输出"""
+        return self.stdout if self._output_is_stdout else self.stderr
+
+    @property
+    def artifact_id(self) -> Optional[str]:
+        """output对应的产物ID"""
+        return self.stdout_artifact if self._output_is_stdout else self.stderr_artifact
+
+    @property
+    def _output_is_stdout(self) -> bool:
+        return self.success or not self.stderr
+
+    def usage(self) -> Dict[str, Any]:
+        """写入历史记录的资源使用字段"""
+        return {"queue_ms": self.queue_ms, "cpu_ms": self.cpu_ms, "max_rss_kb": self.max_rss_kb}
@@ -16,8 +16,16 @@ class HistoryItem(BaseModel):
     command: str
     params: Dict[str, Any] = {}
     success: bool
-    output: str
+    output: str  # 列表中为输出预览，单条查询时为完整输出
     created_at: str
+    status: Optional[str] = None  # success / failed / timeout
+    artifact_id: Optional[str] = None  # 输出被截断时完整内容所在的产物
+    output_size: int = 0  # 完整输出的字符数
+    output_truncated: bool = False  # output是否只是预览
+    duration_ms: Optional[float] = None  # 从收到请求到执行结束的时间
+    queue_ms: Optional[float] = None  # 等待调度名额的时间
+    cpu_ms: Optional[float] = None  # 子进程CPU时间（用户态 + 内核态）
+    max_rss_kb: Optional[int] = None  # 子进程峰值常驻内存
 
 
 class HistoryListResponse(BaseModel):
@@ -26,6 +34,71 @@ class HistoryListResponse(BaseModel):
     total: int
     limit: int
     offset: int
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多记录时为空
+
+
+class HistorySearchItem(BaseModel):
+    """历史记录搜索结果"""
+    id: int
+    timestamp: str
+    module: str
+    command: str
+    params: Dict[str, Any] = {}
+    success: bool
+    created_at: str
+    status: Optional[str] = None
+    artifact_id: Optional[str] = None
+    snippet: str = ""  # 匹配片段，命中词用<mark>标记
+    score: float = 0.0  # 相关度，越大越相关
+
+
+class HistorySearchResponse(BaseModel):
+    """历史记录搜索响应"""
+    items: List[HistorySearchItem]
+    query: str
+    limit: int
+    offset: int
+    has_more: bool = False
+
+
+class RunStats(BaseModel):
+    """执行统计（耗时单位为毫秒，分位数为对数分桶的估算值）"""
+    runs: int = 0
+    successes: int = 0
+    success_rate: Optional[float] = None
+    avg_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    avg_queue_ms: Optional[float] = None
+    avg_cpu_ms: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+    throughput_per_min: float = 0.0
+
+
+class CommandRunStats(RunStats):
+    """单个命令的执行统计"""
+    module: str
+    command: str
+
+
+class RunStatsPoint(BaseModel):
+    """时间序列中的一个点"""
+    bucket: str
+    runs: int
+    success_rate: float
+    avg_ms: float
+    throughput_per_min: float
+
+
+class RunStatsResponse(BaseModel):
+    """执行统计响应"""
+    window: str
+    since: str  # 窗口起点（按小时对齐）
+    interval: str  # 时间序列粒度：hour / day
+    total: RunStats
+    commands: List[CommandRunStats]
+    series: List[RunStatsPoint]
 
 
 class AddFavoriteRequest(BaseModel):
@@ -37,6 +110,27 @@ class AddFavoriteRequest(BaseModel):
     params: Optional[Dict[str, Any]] = {}
 
 
+class BulkDeleteHistoryRequest(BaseModel):
+    """批量删除历史记录请求：按ID列表或按条件（二选一）"""
+    ids: Optional[List[int]] = None
+    module: Optional[str] = None
+    command: Optional[str] = None
+    since: Optional[str] = None  # 起始时间（含），格式同created_at
+    until: Optional[str] = None  # 结束时间（不含）
+    success: Optional[bool] = None
+
+
+class BulkDeleteFavoritesRequest(BaseModel):
+    """批量删除收藏请求"""
+    ids: List[int]
+
+
+class ImportFavoritesRequest(BaseModel):
+    """导入收藏请求，items可以直接使用导出接口返回的列表"""
+    items: List[AddFavoriteRequest]
+    skip_duplicates: bool = True  # 跳过模块、命令、名称和参数都相同的已有收藏
+
+
 class FavoriteItem(BaseModel):
     """收藏项"""
     id: int
@@ -48,9 +142,16 @@ class FavoriteItem(BaseModel):
     created_at: str
 
 
+class FavoriteExportResponse(BaseModel):
+    """收藏导出响应"""
+    items: List[FavoriteItem]
+    total: int
+
+
 class FavoriteListResponse(BaseModel):
     """收藏列表响应"""
     items: List[FavoriteItem]
     total: int
     limit: int
     offset: int
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多记录时为空
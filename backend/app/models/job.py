@@ -0,0 +1,30 @@
+"""
+后台任务模型
+"""
+
+from pydantic import BaseModel
+from typing import Dict, Any, Optional
+
+
+class JobSubmitResponse(BaseModel):
+    """提交任务响应"""
+    job_id: str
+    status: str
+
+
+class JobItem(BaseModel):
+    """后台任务状态"""
+    id: str
+    module: str
+    command: str
+    params: Dict[str, Any] = {}
+    status: str
+    returncode: Optional[int] = None
+    output: str = ""
+    error: str = ""
+    # 输出超过内存上限时完整内容所在的产物ID
+    output_artifact: Optional[str] = None
+    error_artifact: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
@@ -11,6 +11,8 @@ class Param(BaseModel):
     required: bool
     default: Optional[Any] = None
     options: Optional[List[str]] = None
+    positional: bool = False  # 位置参数，按定义顺序放在命令之后传递
+    flag: bool = False  # 无值的开关（argparse nargs=0 / click is_flag），为真时只传 --key
 
 
 class Command(BaseModel):
@@ -21,6 +23,13 @@ class Command(BaseModel):
     description: str
     category: str
     params: List[Param]
+    cache_ttl: Optional[int] = None
+    invalidates: List[str] = []
+    coalesce: bool = False
+    lane: Optional[str] = None
+    timeout: Optional[int] = None
+    cpu_limit: Optional[int] = None
+    memory_limit: Optional[int] = None
 
 
 class Module(BaseModel):
@@ -30,4 +39,25 @@ class Module(BaseModel):
     name: str
     description: str
     category: str
+    max_concurrency: Optional[int] = None
     commands: List[Command]
+
+
+class SearchHit(BaseModel):
+    """目录搜索结果"""
+
+    type: str  # module / command / param
+    module: str
+    command: Optional[str] = None
+    param: Optional[str] = None
+    name: str
+    description: str
+    score: float
+
+
+class ModuleSearchResponse(BaseModel):
+    """目录搜索响应"""
+
+    query: str
+    items: List[SearchHit]
+    total: int  # 命中总数（items最多limit条）
@@ -0,0 +1 @@
+# 创建空的__init__.py文件
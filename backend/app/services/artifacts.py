@@ -0,0 +1,206 @@
+"""
+输出产物 - 有上限的输出收集，超出部分写入产物文件
+
+命令输出在内存中最多保留 OUTPUT_MEMORY_LIMIT 个字符；超过后完整输出写入
+ARTIFACTS_DIR 下的产物文件，响应和历史记录中只保留首尾两段及产物ID，
+完整内容通过产物接口分段读取。
+
+产物与引用它的历史记录、后台任务、幂等记录保存同样久：超过 ARTIFACTS_TTL_HOURS 且不再被
+引用的产物文件才会删除（每小时清理一次，数据保留清理删除记录后也会清理一次），
+历史记录和重放的响应中的 artifact_id 不会指向已删除的文件。
+"""
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import db
+
+ARTIFACT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+logger = logging.getLogger(__name__)
+
+
+def _truncated_text(head: str, tail: str, artifact_id: str) -> str:
+    """拼接截断后的输出"""
+    return f"{head}\n\n... [输出过长，中间部分已省略，完整内容见产物 {artifact_id}] ...\n\n{tail}"
+
+
+class ArtifactStore:
+    """产物文件目录"""
+
+    def __init__(self, directory: str, ttl_hours: int = 24):
+        self.directory = Path(directory)
+        self.ttl_hours = ttl_hours
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    def new_artifact(self) -> Tuple[str, Path]:
+        """分配新的产物ID和文件路径"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        artifact_id = uuid.uuid4().hex
+        return artifact_id, self.directory / f"{artifact_id}.log"
+
+    def path_for(self, artifact_id: str) -> Optional[Path]:
+        """产物文件路径，ID非法或文件不存在时返回None"""
+        if not ARTIFACT_ID_PATTERN.match(artifact_id):
+            return None
+        path = self.directory / f"{artifact_id}.log"
+        return path if path.exists() else None
+
+    def read_range(self, artifact_id: str, start: int, end: int) -> bytes:
+        """读取产物文件 [start, end] 字节（包含end）"""
+        path = self.path_for(artifact_id)
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(max(end - start + 1, 0))
+
+    def capture_file(self, path: str, limit: int) -> Tuple[str, Optional[str]]:
+        """读取子进程输出文件：未超过上限时读入内存并删除，否则转为产物文件
+
+        返回 (文本, 产物ID)。
+        """
+        size = os.path.getsize(path)
+        if size <= limit:
+            try:
+                with open(path, "rb") as f:
+                    return f.read().decode(errors="replace"), None
+            finally:
+                os.unlink(path)
+
+        artifact_id, artifact_path = self.new_artifact()
+        shutil.move(path, artifact_path)
+
+        half = limit // 2
+        with open(artifact_path, "rb") as f:
+            head = f.read(half).decode(errors="ignore")
+            f.seek(size - (limit - half))
+            tail = f.read().decode(errors="ignore")
+        return _truncated_text(head, tail, artifact_id), artifact_id
+
+    def cleanup(self) -> int:
+        """删除超过保留时间且不再被历史记录、后台任务、幂等记录引用的产物文件"""
+        if not self.directory.exists():
+            return 0
+        expires_before = time.time() - self.ttl_hours * 3600
+        expired = {}
+        for path in self.directory.glob("*.log"):
+            try:
+                if path.stat().st_mtime < expires_before:
+                    expired[path.stem] = path
+            except OSError:
+                pass
+        if not expired:
+            return 0
+
+        referenced = db.referenced_artifacts(expired)
+        removed = 0
+        for artifact_id, path in expired.items():
+            if artifact_id in referenced:
+                continue
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    async def _cleanup_loop(self):
+        while True:
+            try:
+                await run_in_threadpool(self.cleanup)
+            except Exception:
+                logger.exception("清理产物文件失败")
+            await asyncio.sleep(3600)
+
+    def start(self):
+        """启动定期清理"""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._cleanup_task:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+
+
+class OutputCapture:
+    """有上限的输出收集器
+
+    未超过上限时完整保存在内存中；超过后把已有内容和后续输出都写入产物文件，
+    内存中只保留开头一半和最近一半。
+    """
+
+    def __init__(self, store: "ArtifactStore", limit: int):
+        self.store = store
+        self.limit = limit
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.size = 0
+        self.artifact_id: Optional[str] = None
+        self._parts = []
+        self._head = ""
+        self._tail: deque = deque()
+        self._tail_size = 0
+        self._file = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.artifact_id is not None
+
+    def write(self, text: str):
+        if not text:
+            return
+        self.size += len(text)
+
+        if self._file is None:
+            self._parts.append(text)
+            if self.size > self.limit:
+                self._spill()
+            return
+
+        self._file.write(text)
+        self._append_tail(text)
+
+    def _spill(self):
+        content = "".join(self._parts)
+        self._parts = []
+        self.artifact_id, path = self.store.new_artifact()
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write(content)
+        self._head = content[:self.head_limit]
+        self._append_tail(content[-self.tail_limit:])
+
+    def _append_tail(self, text: str):
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while self._tail and self._tail_size - len(self._tail[0]) >= self.tail_limit:
+            self._tail_size -= len(self._tail.popleft())
+
+    def getvalue(self) -> str:
+        if self._file is None:
+            return "".join(self._parts)
+        tail = "".join(self._tail)[-self.tail_limit:]
+        return _truncated_text(self._head, tail, self.artifact_id)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+
+# 全局产物目录实例
+artifact_store = ArtifactStore(settings.ARTIFACTS_DIR, ttl_hours=settings.ARTIFACTS_TTL_HOURS)
+
+
+def new_capture() -> OutputCapture:
+    """按配置的内存上限创建输出收集器"""
+    return OutputCapture(artifact_store, settings.OUTPUT_MEMORY_LIMIT)
@@ -0,0 +1,135 @@
+"""
+模块目录 - 启动时建立索引并预编码接口响应
+
+目录加载时用 Module 模型校验一次，之后：
+- 按模块ID、分类、(模块, 命令) 建立字典索引，查找不再遍历列表
+- 列表、单个模块、分类三类接口的JSON提前编码为字节，并计算强ETag，
+  请求带 If-None-Match 且匹配时直接返回304
+- 每个命令的参数定义编译为校验器（见 param_validation）
+- 模块、命令、参数建立搜索索引（见 catalog_search）
+
+静态目录（modules.py中的MODULES）作为兜底，自动发现的目录见 catalog_discovery。
+目录重新加载时整体替换快照，正在处理的请求不受影响。
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.module import Module
+from app.services.catalog_search import CatalogSearchIndex
+from app.services.param_validation import ParamValidator, compile_validators
+
+
+class EncodedBody:
+    """预编码的响应体和ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, data: Any):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 是否命中（按弱比较，忽略W/前缀）"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+
+class _Snapshot:
+    """某一版本目录的索引和预编码响应"""
+
+    def __init__(self, modules: List[Dict[str, Any]]):
+        # 校验一次并补全默认值，接口输出与按模型序列化一致
+        self.modules = [Module.model_validate(module).model_dump() for module in modules]
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_category: Dict[str, List[Dict[str, Any]]] = {}
+        self.commands: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for module in self.modules:
+            self.by_id[module["id"]] = module
+            self.by_category.setdefault(module["category"], []).append(module)
+            for command in module["commands"]:
+                self.commands[(module["id"], command["id"])] = command
+
+        self.validators = compile_validators(self.modules, settings.EXECUTE_ALLOW_UNKNOWN_PARAMS)
+        self.search_index = CatalogSearchIndex(self.modules)
+
+        self.all = EncodedBody(self.modules)
+        self.encoded_modules = {module_id: EncodedBody(module) for module_id, module in self.by_id.items()}
+        self.encoded_categories = {
+            category: EncodedBody(modules) for category, modules in self.by_category.items()
+        }
+        self.empty = EncodedBody([])
+
+
+class CatalogRegistry:
+    """模块目录注册表"""
+
+    def __init__(self):
+        self._snapshot = _Snapshot([])
+        self.source = "empty"
+        self.static_modules: List[Dict[str, Any]] = []
+
+    def load(self, modules: List[Dict[str, Any]], source: str):
+        """加载目录，建立索引并预编码响应"""
+        self._snapshot = _Snapshot(modules)
+        self.source = source
+
+    def set_static(self, modules: List[Dict[str, Any]]):
+        """设置静态目录并加载"""
+        self.static_modules = modules
+        self.load_static()
+
+    def load_static(self):
+        """回退到静态目录"""
+        self.load(self.static_modules, source="static")
+
+    @property
+    def modules(self) -> List[Dict[str, Any]]:
+        return self._snapshot.modules
+
+    def find_module(self, module_id: str) -> Optional[Dict[str, Any]]:
+        return self._snapshot.by_id.get(module_id)
+
+    def find_command(self, module_id: str, command_id: str) -> Optional[Dict[str, Any]]:
+        return self._snapshot.commands.get((module_id, command_id))
+
+    def validator(self, module_id: str, command_id: str) -> Optional[ParamValidator]:
+        """命令的参数校验器，命令不在目录中时返回None"""
+        return self._snapshot.validators.get((module_id, command_id))
+
+    def search(self, query: str, limit: int = 10,
+               doc_type: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """搜索模块、命令和参数，返回 (结果, 命中总数)"""
+        return self._snapshot.search_index.search(query, limit, doc_type)
+
+    def encoded_all(self) -> EncodedBody:
+        return self._snapshot.all
+
+    def encoded_module(self, module_id: str) -> Optional[EncodedBody]:
+        return self._snapshot.encoded_modules.get(module_id)
+
+    def encoded_category(self, category: str) -> EncodedBody:
+        snapshot = self._snapshot
+        if category == "all":
+            return snapshot.all
+        return snapshot.encoded_categories.get(category, snapshot.empty)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "source": self.source,
+            "modules": len(snapshot.modules),
+            "commands": len(snapshot.commands),
+            "categories": sorted(snapshot.by_category),
+            "etag": snapshot.all.etag,
+        }
+
+
+# 全局模块目录实例
+catalog = CatalogRegistry()
@@ -0,0 +1,267 @@
+"""
+模块目录自动发现 - 内省ai_toolkit的命令行定义生成目录
+
+- 在子进程中运行 catalog_introspect.py，读取 argparse / click 定义的模块、命令和选项
+- 结果缓存到 CATALOG_CACHE_PATH，以ai_toolkit源码文件的路径、修改时间和大小计算指纹；
+  启动时指纹一致直接读缓存，不启动子进程
+- 后台每 CATALOG_REFRESH_INTERVAL 秒检查一次指纹，源码变化时重新内省
+- 内省得到的结构以静态目录为底：名称、中文描述、分类和执行元数据（缓存、通道、
+  资源限制等）沿用静态目录，模块/命令/选项以ai_toolkit实际定义为准；
+  内省没有找到的静态模块和命令仍然保留
+- 内省失败或没有找到命令时继续使用静态目录
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.catalog import catalog
+from app.services.executor import build_env, get_ai_toolkit_path
+
+logger = logging.getLogger(__name__)
+
+INTROSPECT_SCRIPT = Path(__file__).with_name("catalog_introspect.py")
+
+# 静态目录中优先于内省结果的参数类型（界面上的细化，内省只能得到string）
+_UI_PARAM_TYPES = {"file", "textarea"}
+
+
+def source_fingerprint(ai_toolkit_path: Path) -> Optional[str]:
+    """ai_toolkit源码指纹：所有.py文件的路径、修改时间和大小，以及内省脚本本身"""
+    source_dir = ai_toolkit_path / "src" / "ai_toolkit"
+    if not source_dir.is_dir():
+        return None
+    digest = hashlib.sha256()
+    files = sorted(source_dir.rglob("*.py")) + [INTROSPECT_SCRIPT]
+    for path in files:
+        stat = path.stat()
+        digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+
+def _merge_params(found: List[Dict[str, Any]], static: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    static_by_name = {param["name"]: param for param in static}
+    params = []
+    for param in found:
+        base = static_by_name.get(param["name"], {})
+        merged = dict(param)
+        if param["type"] == "string" and base.get("type") in _UI_PARAM_TYPES:
+            merged["type"] = base["type"]
+        merged["description"] = base.get("description") or param["description"] or param["name"]
+        params.append(merged)
+    return params
+
+
+def merge_catalog(found: List[Dict[str, Any]], static: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """以内省结果为准、静态目录补充展示信息和执行元数据
+
+    内省没有找到的静态模块和命令保留在目录中（排在发现的条目之后），
+    部分内省（如某个子命令导入失败）不会让原本可用的命令变成404或422。
+    """
+    static_modules = {module["id"]: module for module in static}
+    modules = []
+    for found_module in found:
+        base = static_modules.get(found_module["id"], {})
+        static_commands = {command["id"]: command for command in base.get("commands", [])}
+
+        commands = []
+        for found_command in found_module["commands"]:
+            command_base = static_commands.pop(found_command["id"], {})
+            command = {key: value for key, value in command_base.items() if key != "params"}
+            command.update({
+                "id": found_command["id"],
+                "name": command_base.get("name") or found_command["id"],
+                "description": command_base.get("description") or found_command["description"] or "",
+                "category": found_module["id"],
+                "params": _merge_params(found_command["params"], command_base.get("params", [])),
+            })
+            commands.append(command)
+        commands.extend(static_commands.values())
+
+        if not commands:
+            continue
+        static_modules.pop(found_module["id"], None)
+        module = {key: value for key, value in base.items() if key != "commands"}
+        module.update({
+            "id": found_module["id"],
+            "name": base.get("name") or found_module["id"],
+            "description": base.get("description") or found_module["description"] or "",
+            "category": base.get("category") or "other",
+            "commands": commands,
+        })
+        modules.append(module)
+    modules.extend(static_modules.values())
+    return modules
+
+
+class CatalogDiscovery:
+    """目录自动发现和内省缓存"""
+
+    def __init__(self, cache_path: str, refresh_interval: int = 60, timeout: int = 30,
+                 enabled: bool = True):
+        self.cache_path = Path(cache_path)
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.enabled = enabled
+        self.fingerprint: Optional[str] = None
+        self.framework: Optional[str] = None
+        self.generated_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.introspections = 0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def _read_cache(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached if cached.get("fingerprint") == fingerprint else None
+
+    def _write_cache(self, data: Dict[str, Any]):
+        """先写临时文件再替换，读取方不会看到写了一半的缓存"""
+        directory = self.cache_path.parent
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _apply(self, data: Dict[str, Any]):
+        self.fingerprint = data["fingerprint"]
+        self.framework = data.get("framework")
+        self.generated_at = data.get("generated_at")
+        if any(module["commands"] for module in data["modules"]):
+            catalog.load(merge_catalog(data["modules"], catalog.static_modules), source="discovered")
+        else:
+            catalog.load_static()
+            logger.warning("未从ai_toolkit发现任何命令，使用静态模块目录")
+
+    async def _introspect(self, ai_toolkit_path: Path) -> Dict[str, Any]:
+        """在子进程中内省ai_toolkit命令行定义"""
+        fd, output_path = tempfile.mkstemp(prefix="catalog-", suffix=".json")
+        os.close(fd)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(INTROSPECT_SCRIPT), output_path,
+                cwd=str(ai_toolkit_path),
+                env=build_env(ai_toolkit_path),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise RuntimeError(f"内省超时（{self.timeout}秒）")
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode(errors="replace").strip()[-500:] or f"返回码 {process.returncode}")
+            with open(output_path, encoding="utf-8") as f:
+                return json.load(f)
+        finally:
+            os.unlink(output_path)
+
+    def load_cached(self) -> bool:
+        """启动时调用：源码指纹与缓存一致时直接加载缓存"""
+        if not self.enabled:
+            return False
+        ai_toolkit_path = get_ai_toolkit_path()
+        fingerprint = source_fingerprint(ai_toolkit_path) if ai_toolkit_path else None
+        cached = self._read_cache(fingerprint) if fingerprint else None
+        if cached is None:
+            return False
+        self._apply(cached)
+        return True
+
+    async def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """源码变化（或force）时重新内省并更新目录"""
+        async with self._lock:
+            ai_toolkit_path = get_ai_toolkit_path()
+            if not ai_toolkit_path:
+                return self.stats()
+            fingerprint = await run_in_threadpool(source_fingerprint, ai_toolkit_path)
+            if fingerprint is None or (fingerprint == self.fingerprint and not force):
+                return self.stats()
+
+            cached = None if force else await run_in_threadpool(self._read_cache, fingerprint)
+            if cached is None:
+                self.introspections += 1
+                try:
+                    result = await self._introspect(ai_toolkit_path)
+                except Exception as e:
+                    self.last_error = str(e)
+                    # 同一份源码不再重复尝试，源码变化后再试
+                    self.fingerprint = fingerprint
+                    logger.warning("内省ai_toolkit失败，继续使用当前模块目录: %s", e)
+                    return self.stats()
+                cached = {
+                    "fingerprint": fingerprint,
+                    "generated_at": datetime.utcnow().isoformat(),
+                    **result,
+                }
+                await run_in_threadpool(self._write_cache, cached)
+
+            self.last_error = None
+            self._apply(cached)
+            return self.stats()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("刷新模块目录失败")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """启动：先同步加载缓存，再在后台检查源码变化"""
+        if not self.enabled or self._task is not None:
+            return
+        self.load_cached()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "catalog": catalog.stats(),
+            "fingerprint": self.fingerprint,
+            "framework": self.framework,
+            "generated_at": self.generated_at,
+            "introspections": self.introspections,
+            "last_error": self.last_error,
+            "cache_path": str(self.cache_path),
+        }
+
+
+# 全局目录发现实例
+catalog_discovery = CatalogDiscovery(
+    settings.CATALOG_CACHE_PATH,
+    refresh_interval=settings.CATALOG_REFRESH_INTERVAL,
+    timeout=settings.CATALOG_INTROSPECT_TIMEOUT,
+    enabled=settings.CATALOG_DISCOVERY_ENABLED,
+)
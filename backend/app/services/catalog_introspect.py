@@ -0,0 +1,243 @@
+"""
+ai_toolkit命令行内省脚本 - 在独立子进程中运行，不依赖后端代码
+
+用法: python catalog_introspect.py <输出文件>
+
+记录导入和运行 `ai_toolkit --help` 期间创建的所有 argparse 解析器和 click 命令，
+找到根命令后按 模块 -> 命令 -> 选项 两级子命令结构导出为JSON：
+[{"id", "description", "commands": [{"id", "description", "params": [...]}]}]
+
+导出 --xxx 形式的选项（后端按 --key value 传参）和位置参数（标记 positional，
+后端按定义顺序放在命令之后）；无值的开关导出为 boolean 并标记 flag。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import runpy
+import sys
+from typing import Any, Dict, List, Optional
+
+_parsers: List[argparse.ArgumentParser] = []
+_click_commands: List[Any] = []
+
+
+def _record_argparse():
+    original = argparse.ArgumentParser.__init__
+
+    def __init__(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        _parsers.append(self)
+
+    argparse.ArgumentParser.__init__ = __init__
+
+
+def _record_click():
+    try:
+        import click
+    except ImportError:
+        return
+    original = click.Command.__init__
+
+    def __init__(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        _click_commands.append(self)
+
+    click.Command.__init__ = __init__
+
+
+def _clean(value: Any) -> Any:
+    """默认值只保留可以JSON序列化的简单类型"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return None
+
+
+# argparse
+
+def _subcommands(parser: argparse.ArgumentParser) -> Dict[str, Any]:
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            helps = {choice.dest: choice.help for choice in action._choices_actions}
+            seen = set()
+            result = {}
+            for name, subparser in action.choices.items():
+                if id(subparser) in seen:  # 别名
+                    continue
+                seen.add(id(subparser))
+                result[name] = (helps.get(name) or subparser.description or "", subparser)
+            return result
+    return {}
+
+
+def _argparse_param(action: argparse.Action) -> Optional[Dict[str, Any]]:
+    if isinstance(action, (argparse._HelpAction, argparse._SubParsersAction)) or action.help == argparse.SUPPRESS:
+        return None
+    long_options = [option for option in action.option_strings if option.startswith("--")]
+    positional = not action.option_strings
+    if not long_options and not positional:
+        return None
+
+    param: Dict[str, Any] = {
+        "name": action.dest if positional else max(long_options, key=len)[2:],
+        "description": action.help or "",
+        # 位置参数没有required属性，按nargs判断是否可省略
+        "required": action.nargs not in ("?", "*") if positional else bool(action.required),
+    }
+    if positional:
+        param["positional"] = True
+    if action.nargs == 0:
+        param["type"] = "boolean"
+        param["flag"] = True
+    elif action.choices:
+        param["type"] = "select"
+        param["options"] = [str(choice) for choice in action.choices]
+    elif action.type in (int, float):
+        param["type"] = "number"
+    else:
+        param["type"] = "string"
+    default = _clean(action.default)
+    if default is not None and action.nargs != 0:
+        param["default"] = default
+    return param
+
+
+def _from_argparse(root: argparse.ArgumentParser) -> List[Dict[str, Any]]:
+    modules = []
+    for module_id, (module_help, module_parser) in _subcommands(root).items():
+        commands = []
+        for command_id, (command_help, command_parser) in _subcommands(module_parser).items():
+            params = [_argparse_param(action) for action in command_parser._actions]
+            commands.append({
+                "id": command_id,
+                "description": command_help,
+                "params": [param for param in params if param],
+            })
+        modules.append({"id": module_id, "description": module_help, "commands": commands})
+    return modules
+
+
+def _argparse_root() -> Optional[argparse.ArgumentParser]:
+    children = set()
+    for parser in _parsers:
+        for _, subparser in _subcommands(parser).values():
+            children.add(id(subparser))
+    roots = [parser for parser in _parsers if _subcommands(parser) and id(parser) not in children]
+    return roots[0] if roots else None
+
+
+# click
+
+def _click_param(option: Any) -> Optional[Dict[str, Any]]:
+    import click
+
+    if isinstance(option, click.Argument):
+        return _click_argument(option)
+    if not isinstance(option, click.Option) or option.hidden:
+        return None
+    long_options = [opt for opt in option.opts if opt.startswith("--")]
+    if not long_options:
+        return None
+
+    param: Dict[str, Any] = {
+        "name": max(long_options, key=len)[2:],
+        "description": option.help or "",
+        "required": bool(option.required),
+    }
+    if option.is_flag:
+        param["type"] = "boolean"
+        param["flag"] = True
+    else:
+        param["type"] = _click_type(option.type)
+        if param["type"] == "select":
+            param["options"] = [str(choice) for choice in option.type.choices]
+    default = None if callable(option.default) else _clean(option.default)
+    if default is not None and not option.is_flag:
+        param["default"] = default
+    return param
+
+
+def _click_argument(argument: Any) -> Dict[str, Any]:
+    param: Dict[str, Any] = {
+        "name": argument.name,
+        "description": "",
+        "required": bool(argument.required),
+        "positional": True,
+        "type": _click_type(argument.type),
+    }
+    if param["type"] == "select":
+        param["options"] = [str(choice) for choice in argument.type.choices]
+    default = None if callable(argument.default) else _clean(argument.default)
+    if default is not None:
+        param["default"] = default
+    return param
+
+
+def _click_type(param_type: Any) -> str:
+    import click
+
+    if isinstance(param_type, click.Choice):
+        return "select"
+    if isinstance(param_type, (click.types.IntParamType, click.types.FloatParamType)):
+        return "number"
+    if isinstance(param_type, (click.Path, click.File)):
+        return "file"
+    return "string"
+
+
+def _from_click(root: Any) -> List[Dict[str, Any]]:
+    import click
+
+    modules = []
+    for module_id, group in root.commands.items():
+        if not isinstance(group, click.Group):
+            continue
+        commands = []
+        for command_id, command in group.commands.items():
+            params = [_click_param(option) for option in command.params]
+            commands.append({
+                "id": command_id,
+                "description": command.short_help or command.help or "",
+                "params": [param for param in params if param],
+            })
+        modules.append({"id": module_id, "description": group.short_help or group.help or "", "commands": commands})
+    return modules
+
+
+def _click_root() -> Optional[Any]:
+    try:
+        import click
+    except ImportError:
+        return None
+    groups = [command for command in _click_commands if isinstance(command, click.Group)]
+    children = {id(child) for group in groups for child in group.commands.values()}
+    roots = [group for group in groups if id(group) not in children]
+    return roots[0] if roots else None
+
+
+def main(output_path: str):
+    _record_argparse()
+    _record_click()
+
+    sys.argv = ["ai_toolkit", "--help"]
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        try:
+            runpy.run_module("ai_toolkit", run_name="__main__", alter_sys=True)
+        except SystemExit:
+            pass
+
+    click_root = _click_root()
+    if click_root is not None:
+        modules, framework = _from_click(click_root), "click"
+    else:
+        argparse_root = _argparse_root()
+        modules = _from_argparse(argparse_root) if argparse_root else []
+        framework = "argparse" if argparse_root else None
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"framework": framework, "modules": modules}, f, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,141 @@
+"""
+目录搜索 - 模块、命令、参数的内存搜索索引
+
+目录加载时建立（随目录快照一起替换）：
+- 英文/数字：按非字母数字字符切分为小写词，建立倒排索引（精确匹配）和前缀树
+  （前缀匹配，用于输入中的自动补全；每个节点直接保存该前缀下的全部文档）
+- 中文：连续的中文字符切分为单字和相邻两字（bigram），查询时用bigram匹配，
+  单个汉字的查询用单字匹配
+
+查询中的每个词都必须命中（AND），得分为各词命中字段权重之和，前缀命中打折扣，
+再乘以文档类型权重（模块 > 命令 > 参数）。
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# 字段权重
+ID_WEIGHT = 3.0
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+
+PREFIX_FACTOR = 0.6  # 前缀命中相对精确命中的得分比例
+TYPE_WEIGHTS = {"module": 1.2, "command": 1.0, "param": 0.6}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _cjk_grams(text: str, unigrams: bool) -> List[str]:
+    """中文bigram；unigrams为True时同时产出单字（建索引用）"""
+    grams = []
+    for run in _CJK.findall(text):
+        if unigrams or len(run) == 1:
+            grams.extend(run)
+        grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+class _TrieNode:
+    __slots__ = ("children", "docs")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.docs: Dict[int, float] = {}  # 文档 -> 该前缀下的最高字段权重
+
+
+class CatalogSearchIndex:
+    """目录搜索索引"""
+
+    def __init__(self, modules: List[Dict[str, Any]]):
+        self.docs: List[Dict[str, Any]] = []
+        self._words: Dict[str, Dict[int, float]] = {}
+        self._grams: Dict[str, Dict[int, float]] = {}
+        self._trie = _TrieNode()
+
+        for module in modules:
+            self._add({"type": "module", "module": module["id"], "name": module["name"],
+                       "description": module["description"]}, module["id"])
+            for command in module["commands"]:
+                self._add({"type": "command", "module": module["id"], "command": command["id"],
+                           "name": command["name"], "description": command["description"]},
+                          command["id"])
+                for param in command["params"]:
+                    self._add({"type": "param", "module": module["id"], "command": command["id"],
+                               "param": param["name"], "name": param["name"],
+                               "description": param["description"]}, param["name"])
+
+    def _add(self, doc: Dict[str, Any], doc_id_text: str):
+        index = len(self.docs)
+        self.docs.append(doc)
+        for text, weight in ((doc_id_text, ID_WEIGHT), (doc["name"], NAME_WEIGHT),
+                             (doc["description"], DESCRIPTION_WEIGHT)):
+            for word in _words(text):
+                self._post(self._words, word, index, weight)
+                node = self._trie
+                for char in word:
+                    node = node.children.setdefault(char, _TrieNode())
+                    if node.docs.get(index, 0) < weight:
+                        node.docs[index] = weight
+            for gram in _cjk_grams(text, unigrams=True):
+                self._post(self._grams, gram, index, weight)
+
+    @staticmethod
+    def _post(postings: Dict[str, Dict[int, float]], key: str, index: int, weight: float):
+        docs = postings.setdefault(key, {})
+        if docs.get(index, 0) < weight:
+            docs[index] = weight
+
+    def _prefix(self, word: str) -> Dict[int, float]:
+        node = self._trie
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return {}
+        return node.docs
+
+    def _term_scores(self, query: str) -> List[Dict[int, float]]:
+        """查询中每个词命中的文档及得分"""
+        terms = []
+        for word in _words(query):
+            exact = self._words.get(word, {})
+            scores = {index: weight * PREFIX_FACTOR for index, weight in self._prefix(word).items()}
+            for index, weight in exact.items():
+                scores[index] = max(scores.get(index, 0), weight)
+            terms.append(scores)
+        for gram in _cjk_grams(query, unigrams=False):
+            terms.append(self._grams.get(gram, {}))
+        return terms
+
+    def search(self, query: str, limit: int = 10,
+               doc_type: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """搜索，返回 (按得分排序的前limit条, 命中总数)"""
+        terms = self._term_scores(query)
+        if not terms:
+            return [], 0
+
+        # 从命中文档最少的词开始求交集
+        terms.sort(key=len)
+        scores = dict(terms[0])
+        for term in terms[1:]:
+            scores = {index: score + term[index] for index, score in scores.items() if index in term}
+            if not scores:
+                return [], 0
+
+        ranked = []
+        for index, score in scores.items():
+            doc = self.docs[index]
+            if doc_type and doc["type"] != doc_type:
+                continue
+            ranked.append((-score * TYPE_WEIGHTS[doc["type"]], len(doc["name"]), index))
+        ranked.sort()
+
+        items = [
+            {**self.docs[index], "score": round(-score, 3)}
+            for score, _, index in ranked[:limit]
+        ]
+        return items, len(ranked)
@@ -0,0 +1,312 @@
+"""
+命令执行 - 构建ai_toolkit命令，优先交给常驻进程池执行，不可用时回退到新进程
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.execute import ExecutionResult, ResourceLimits
+from app.services.artifacts import new_capture
+from app.services.catalog import catalog
+from app.services.worker_pool import WorkerUnavailable, worker_pool
+
+logger = logging.getLogger(__name__)
+
+
+def get_ai_toolkit_path() -> Optional[Path]:
+    """获取AI Toolkit项目路径"""
+    # 从backend目录向上找到ai-toolkit
+    backend_dir = Path(__file__).parent.parent.parent  # ai-toolkit-web/backend
+    web_project_dir = backend_dir.parent                 # ai-toolkit-web
+    projects_dir = web_project_dir.parent                # projects
+    ai_toolkit_dir = projects_dir / "ai-toolkit"
+
+    if ai_toolkit_dir.exists():
+        return ai_toolkit_dir
+    return None
+
+
+def build_command_args(module: str, command: str, params: Dict[str, Any]) -> List[str]:
+    """构建ai_toolkit命令行参数（不含解释器部分）
+
+    目录中标记为positional的参数按定义顺序放在命令之后；标记为flag的开关为真时只传
+    --key、为假时不传；其余参数（包括未标记flag的布尔参数）按 --key value 传递。
+    """
+    definition = catalog.find_command(module, command) or {}
+    positionals = [param["name"] for param in definition.get("params", []) if param.get("positional")]
+    flags = {param["name"] for param in definition.get("params", []) if param.get("flag")}
+
+    args = [module, command]
+    args.extend(str(params[name]) for name in positionals if name in params)
+    for key, value in params.items():
+        if key in positionals:
+            continue
+        if key in flags:
+            if value:
+                args.append(f"--{key}")
+            continue
+        args.extend([f"--{key}", str(value)])
+    return args
+
+
+def build_env(ai_toolkit_path: Path) -> Dict[str, str]:
+    """构建子进程环境变量，确保能找到ai_toolkit模块"""
+    python_path = os.environ.get("PYTHONPATH", "")
+    env = os.environ.copy()
+    env["PYTHONPATH"] = f"{ai_toolkit_path}/src:{python_path}"
+    return env
+
+
+def resolve_limits(command_meta: Dict[str, Any],
+                   timeout: Optional[int] = None,
+                   cpu_limit: Optional[int] = None,
+                   memory_limit: Optional[int] = None) -> ResourceLimits:
+    """确定资源限制：请求覆盖 > 目录中的命令默认值 > 全局默认值，且不超过配置上限"""
+
+    def pick(override: Optional[int], catalog_key: str, default: int, cap: int) -> Optional[int]:
+        value = override if override and override > 0 else command_meta.get(catalog_key, default)
+        if not value or value <= 0:
+            return None
+        return min(value, cap) if cap > 0 else value
+
+    return ResourceLimits(
+        timeout=pick(timeout, "timeout",
+                     settings.EXECUTE_DEFAULT_TIMEOUT, settings.EXECUTE_MAX_TIMEOUT),
+        cpu_time=pick(cpu_limit, "cpu_limit",
+                      settings.EXECUTE_DEFAULT_CPU_LIMIT, settings.EXECUTE_MAX_CPU_LIMIT),
+        memory_mb=pick(memory_limit, "memory_limit",
+                       settings.EXECUTE_DEFAULT_MEMORY_LIMIT, settings.EXECUTE_MAX_MEMORY_LIMIT),
+    )
+
+
+def _apply_resource_limits(pid: int, limits: ResourceLimits):
+    """启动后用prlimit设置子进程的CPU时间和数据段内存限制
+
+    不用preexec_fn：服务进程有多个线程（数据库线程池、wait4线程等），fork后在子进程中
+    执行Python代码可能死锁。CPU时间按累计计算，启动后再设置不影响限制效果。
+    内存用RLIMIT_DATA而不是RLIMIT_AS，见worker.py。
+    """
+    try:
+        if limits.cpu_time:
+            # 超过软限制收到SIGXCPU，留几秒宽限后由硬限制强制结束
+            resource.prlimit(pid, resource.RLIMIT_CPU, (limits.cpu_time, limits.cpu_time + 5))
+        if limits.memory_mb:
+            size = limits.memory_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_DATA, (size, size))
+    except ProcessLookupError:
+        pass  # 已经结束
+
+
+def _kill_process_group(pid: int):
+    """结束子进程及其启动的所有进程"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def _wait4(pid: int) -> "asyncio.Future":
+    """在独立线程中用wait4回收子进程，结果为 (退出状态, rusage)
+
+    asyncio的子进程回收拿不到单个子进程的资源使用，所以由这里直接回收。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def wait():
+        _, status, usage = os.wait4(pid, 0)
+        # 事件循环可能已关闭（如服务关闭时进程仍在运行），此时没有人等待结果
+        if loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(set_result, (status, usage))
+        except RuntimeError:
+            pass
+
+    threading.Thread(target=wait, name=f"wait4-{pid}", daemon=True).start()
+    return future
+
+
+def timeout_message(timeout: Optional[int]) -> str:
+    """超时提示，追加到错误输出末尾"""
+    return f"\n命令执行超时（{timeout}秒），已终止\n"
+
+
+async def stream_command(args: List[str], ai_toolkit_path: Path,
+                         limits: Optional[ResourceLimits] = None,
+                         chunk_size: int = 4096,
+                         unbuffered: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+    """启动新进程执行命令并逐块产出输出
+
+    产出 ("stdout", 文本) / ("stderr", 文本)；超时被终止时产出 ("timeout", 秒数)；
+    进程结束后产出 ("usage", {"cpu_ms", "max_rss_kb"}) 和 ("exit", 返回码)。
+    调用方提前停止迭代时会结束子进程。
+    """
+    limits = limits or ResourceLimits()
+    env = build_env(ai_toolkit_path)
+    if unbuffered:
+        env["PYTHONUNBUFFERED"] = "1"  # 让子进程输出及时到达
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "ai_toolkit", *args],
+        cwd=str(ai_toolkit_path),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    # 先设置限制再开始回收，设置期间pid不会被回收复用
+    try:
+        _apply_resource_limits(process.pid, limits)
+    except (OSError, ValueError):
+        _kill_process_group(process.pid)
+        process.wait()
+        raise
+    exited = _wait4(process.pid)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    transports = []
+
+    async def open_reader(pipe) -> asyncio.StreamReader:
+        reader = asyncio.StreamReader(loop=loop)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe
+        )
+        transports.append(transport)
+        return reader
+
+    async def pump(name: str, reader: asyncio.StreamReader):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            chunk = await reader.read(chunk_size)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                await queue.put((name, text))
+            if not chunk:
+                break
+        await queue.put((name, None))
+
+    pumps = []
+    deadline = loop.time() + limits.timeout if limits.timeout else None
+    timed_out = False
+
+    try:
+        pumps = [
+            asyncio.create_task(pump("stdout", await open_reader(process.stdout))),
+            asyncio.create_task(pump("stderr", await open_reader(process.stderr))),
+        ]
+
+        open_streams = len(pumps)
+        while open_streams:
+            try:
+                if deadline is None:
+                    name, text = await queue.get()
+                else:
+                    name, text = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                # 超时：结束整个进程组，继续读完已产生的输出
+                timed_out = True
+                deadline = None
+                _kill_process_group(process.pid)
+                continue
+
+            if text is None:
+                open_streams -= 1
+            else:
+                yield name, text
+
+        status, usage = await exited
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if timed_out:
+            yield "timeout", limits.timeout
+        yield "usage", {
+            "cpu_ms": round((usage.ru_utime + usage.ru_stime) * 1000, 3),
+            "max_rss_kb": usage.ru_maxrss,
+        }
+        yield "exit", process.returncode
+    finally:
+        for task in pumps:
+            task.cancel()
+        for transport in transports:
+            transport.close()
+        if not exited.done():
+            _kill_process_group(process.pid)
+            status, _ = await exited
+            process.returncode = os.waitstatus_to_exitcode(status)
+
+
+async def spawn_command(args: List[str], ai_toolkit_path: Path,
+                        limits: Optional[ResourceLimits] = None) -> ExecutionResult:
+    """启动新的解释器进程执行命令，收集输出（超过内存上限的部分写入产物文件）"""
+    stdout = new_capture()
+    stderr = new_capture()
+    returncode = -1
+    timed_out = False
+    usage: Dict[str, Any] = {}
+
+    try:
+        async for name, data in stream_command(args, ai_toolkit_path, limits, unbuffered=False):
+            if name == "stdout":
+                stdout.write(data)
+            elif name == "stderr":
+                stderr.write(data)
+            elif name == "timeout":
+                timed_out = True
+            elif name == "usage":
+                usage = data
+            else:
+                returncode = data
+    finally:
+        stdout.close()
+        stderr.close()
+
+    return ExecutionResult(
+        returncode=returncode,
+        stdout=stdout.getvalue(),
+        stderr=stderr.getvalue(),
+        timed_out=timed_out,
+        stdout_artifact=stdout.artifact_id,
+        stderr_artifact=stderr.artifact_id,
+        **usage,
+    )
+
+
+async def run_command(module: str, command: str, params: Dict[str, Any],
+                      ai_toolkit_path: Path,
+                      limits: Optional[ResourceLimits] = None) -> ExecutionResult:
+    """执行命令：进程池可用时复用预导入的进程，否则启动新进程
+
+    只有命令尚未交给常驻进程时（WorkerUnavailable）才回退到新进程；已开始执行后出错
+    抛出 WorkerJobFailed，不会重复执行。
+    """
+    args = build_command_args(module, command, params)
+    logger.debug("执行命令: ai_toolkit %s", " ".join(args))
+
+    try:
+        result = await worker_pool.run(args, limits)
+    except WorkerUnavailable as e:
+        if worker_pool.started:
+            logger.warning("进程池不可用，回退到新进程执行: %s", e)
+        result = await spawn_command(args, ai_toolkit_path, limits)
+
+    if result.timed_out:
+        result.stderr += timeout_message(limits.timeout if limits else None)
+    return result
@@ -0,0 +1,82 @@
+"""
+历史记录导出 - 分段读取并逐段编码为NDJSON或CSV，可选gzip压缩
+
+每次只从数据库读取 HISTORY_EXPORT_CHUNK 行（按 created_at, id 游标续读），输出总字符数
+达到 HISTORY_EXPORT_CHUNK_CHARS 时提前结束该段，编码后立即发出。内存占用与导出总行数无关，
+大输出也不会让单段膨胀到 HISTORY_EXPORT_CHUNK 条完整输出。
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.database import async_db
+from app.services.history_writer import history_writer
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+EXPORT_FIELDS = [
+    "id", "created_at", "timestamp", "module", "command", "params", "success", "status",
+    "duration_ms", "queue_ms", "cpu_ms", "max_rss_kb", "artifact_id", "output_size", "output",
+]
+
+
+def _encode_ndjson(rows: List[Dict[str, Any]]) -> str:
+    return "".join(
+        json.dumps({field: row[field] for field in EXPORT_FIELDS}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def _encode_csv(rows: List[Dict[str, Any]], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row[field], ensure_ascii=False) if field == "params" else row[field]
+            for field in EXPORT_FIELDS
+        ])
+    return buffer.getvalue()
+
+
+async def export_history(fmt: str, module: Optional[str] = None, command: Optional[str] = None,
+                         since: Optional[str] = None, until: Optional[str] = None,
+                         include_output: bool = True, gzip: bool = False) -> AsyncIterator[bytes]:
+    """逐段产出导出内容"""
+    await history_writer.flush()
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits=31：gzip格式
+    after = None
+    first = True
+    while True:
+        rows = await async_db.export_history_chunk(
+            settings.HISTORY_EXPORT_CHUNK, after=after, module=module, command=command,
+            since=since, until=until, include_output=include_output,
+            max_chars=settings.HISTORY_EXPORT_CHUNK_CHARS,
+        )
+        if not rows and not first:
+            break
+
+        text = _encode_ndjson(rows) if fmt == "ndjson" else _encode_csv(rows, header=first)
+        first = False
+        data = text.encode()
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+        # 按字符数提前结束的段可能不足HISTORY_EXPORT_CHUNK行，只有取空才说明导出完毕
+        if not rows:
+            break
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+    if compressor:
+        yield compressor.flush()
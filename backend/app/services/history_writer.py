@@ -0,0 +1,221 @@
+"""
+历史记录后写 - 执行结果先进入内存缓冲，由后台任务批量写入数据库
+
+请求路径上只做入队，不等待事务提交：
+- 缓冲区累计 HISTORY_FLUSH_BATCH 条，或第一条入队后超过 HISTORY_FLUSH_INTERVAL 秒，
+  在一个事务中写入
+- add_many 的一组记录作为整体入队，单独在一个事务中写入，不会被拆开，也不会和其他记录混在一起
+- 缓冲区满（HISTORY_BUFFER_SIZE 条，或输出总计 HISTORY_BUFFER_CHARS 个字符）时入队会等待
+  写入腾出空间，并计入 backpressure。每条记录的输出最多 OUTPUT_MEMORY_LIMIT 个字符，
+  只按条数限制时缓冲区可能占用上GB内存
+- flush() 等待此前入队的记录全部写入，读取历史记录前调用以保证能读到刚执行的结果
+- 关闭时写入剩余记录
+- 入队时失效历史记录的响应缓存：缓存未命中的读取会先flush，仍能读到刚执行的结果
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.database import async_db
+from app.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _output_chars(records: List[Dict[str, Any]]) -> int:
+    return sum(len(record.get("output") or "") for record in records)
+
+
+class HistoryWriter:
+    """历史记录写缓冲"""
+
+    def __init__(self, max_buffer: int = 1000, batch_size: int = 100,
+                 flush_interval: float = 0.5, enabled: bool = True,
+                 max_buffer_chars: int = 64 * 1024 * 1024):
+        self.max_buffer = max_buffer
+        self.max_buffer_chars = max_buffer_chars
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._pending = 0  # 已入队但尚未写入的记录数
+        self._pending_chars = 0  # 以及这些记录的输出字符数
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.backpressure = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def add(self, module: str, command: str, params: Dict[str, Any],
+                  success: bool, output: str, status: Optional[str] = None,
+                  artifact_id: Optional[str] = None, **usage: Any):
+        """添加一条历史记录，参数同HistoryDatabase.add_history"""
+        await self.add_many([{
+            "module": module,
+            "command": command,
+            "params": params,
+            "success": success,
+            "output": output,
+            "status": status,
+            "artifact_id": artifact_id,
+            **usage,
+        }])
+
+    async def add_many(self, records: Iterable[Dict[str, Any]]):
+        """批量添加历史记录，记录格式同HistoryDatabase.add_history_batch"""
+        timestamp = datetime.utcnow().isoformat()
+        records = [{"timestamp": timestamp, **record} for record in records]
+        if not records:
+            return
+
+        # 未启用或未启动时直接写入
+        if not (self.enabled and self.running):
+            await async_db.add_history_batch(records)
+            return
+
+        chars = _output_chars(records)
+
+        def has_space() -> bool:
+            # 缓冲区为空时即使一组超过上限也直接入队，否则会一直等待
+            return not self._pending or (
+                self._pending + len(records) <= self.max_buffer
+                and self._pending_chars + chars <= self.max_buffer_chars
+            )
+
+        async with self._space:
+            if not has_space():
+                self.backpressure += 1
+                logger.warning("历史记录缓冲区已满（%d条，%d字符），等待写入",
+                               self._pending, self._pending_chars)
+                # 未满一批的记录也立即写入，不等到HISTORY_FLUSH_INTERVAL
+                self._queue.put_nowait(asyncio.get_running_loop().create_future())
+                await self._space.wait_for(has_space)
+            self._pending += len(records)
+            self._pending_chars += chars
+        self._queue.put_nowait(records)
+        response_cache.invalidate("history")
+
+    async def flush(self):
+        """等待此前入队的记录全部写入"""
+        if not self.running or self._pending == 0:
+            return
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put(done)
+        await done
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            groups: List[List[Dict[str, Any]]] = []
+            size = 0
+            waiters: List[asyncio.Future] = []
+            deadline = loop.time() + self.flush_interval
+
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, asyncio.Future):
+                    waiters.append(item)
+                else:
+                    groups.append(item)
+                    size += len(item)
+
+                if stopping or waiters or size >= self.batch_size:
+                    break
+                # 已在缓冲区的记录直接取出，否则最多等到截止时间
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._write_groups(groups)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _write_groups(self, groups: List[List[Dict[str, Any]]]):
+        """按入队顺序写入：连续的单条记录合并为一个事务，add_many 的一组单独一个事务"""
+        singles: List[Dict[str, Any]] = []
+        for group in groups:
+            if len(group) == 1:
+                singles.extend(group)
+                continue
+            await self._write(singles)
+            singles = []
+            await self._write(group)
+        await self._write(singles)
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            await async_db.add_history_batch(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("批量写入历史记录失败（%d条）", len(batch))
+        finally:
+            self._pending -= len(batch)
+            self._pending_chars -= _output_chars(batch)
+            async with self._space:
+                self._space.notify_all()
+
+    def start(self):
+        """启动后台写入任务"""
+        if self.enabled and not self.running:
+            # 缓冲上限按记录条数和输出字符数计算（见add_many），队列本身不限长度
+            self._queue = asyncio.Queue()
+            self._space = asyncio.Condition()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """写入剩余记录后停止"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "buffered": self._pending,
+            "max_buffer": self.max_buffer,
+            "buffered_chars": self._pending_chars,
+            "max_buffer_chars": self.max_buffer_chars,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+            "backpressure": self.backpressure,
+        }
+
+
+# 全局历史记录写缓冲实例
+history_writer = HistoryWriter(
+    max_buffer=settings.HISTORY_BUFFER_SIZE,
+    batch_size=settings.HISTORY_FLUSH_BATCH,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    enabled=settings.HISTORY_WRITE_BEHIND,
+    max_buffer_chars=settings.HISTORY_BUFFER_CHARS,
+)
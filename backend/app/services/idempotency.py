@@ -0,0 +1,103 @@
+"""
+幂等键 - 客户端重试同一个 Idempotency-Key 时不会重复执行命令
+
+- 原执行仍在进行：重试直接等待原执行的结果
+- 原执行已完成：从 idempotency_keys 表重放保存的响应，不启动新进程
+- 同一个键用于不同的请求内容：拒绝（API返回422）
+
+只保存正常完成的执行（包括命令本身失败或超时）；执行过程中抛出异常时
+不保存，重试会重新执行。记录在 IDEMPOTENCY_TTL_HOURS 后过期，总数不超过
+IDEMPOTENCY_MAX_ENTRIES。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.core.config import settings
+from app.core.database import async_db
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """同一个幂等键对应了不同的请求内容"""
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """请求内容指纹"""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """进行中的执行登记在内存中，已完成的响应保存在数据库中"""
+
+    def __init__(self, ttl_hours: int = 24, max_entries: int = 10000):
+        self.ttl_hours = ttl_hours
+        self.max_entries = max_entries
+        self._in_flight: Dict[str, Tuple[str, asyncio.Task]] = {}
+        self.executions = 0
+        self.joined = 0
+        self.replayed = 0
+
+    async def do(self, key: str, fingerprint: str,
+                 fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """执行fn或复用同一个键的执行，返回 (响应, 是否为重试复用)"""
+        entry = self._in_flight.get(key)
+        if entry is not None:
+            self._check(entry[0], fingerprint)
+            self.joined += 1
+            return await asyncio.shield(entry[1]), True
+
+        record = await async_db.get_idempotency_record(key)
+        if record is not None:
+            self._check(record["fingerprint"], fingerprint)
+            self.replayed += 1
+            return record["response"], True
+
+        # 查库期间可能已有相同的键开始执行
+        entry = self._in_flight.get(key)
+        if entry is not None:
+            self._check(entry[0], fingerprint)
+            self.joined += 1
+            return await asyncio.shield(entry[1]), True
+
+        self.executions += 1
+        task = asyncio.ensure_future(self._run_and_save(key, fingerprint, fn))
+        self._in_flight[key] = (fingerprint, task)
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task), False
+
+    async def _run_and_save(self, key: str, fingerprint: str,
+                            fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        response = await fn()
+        try:
+            await async_db.save_idempotency_record(
+                key, fingerprint, response, self.ttl_hours * 3600, self.max_entries
+            )
+        except Exception:
+            logger.exception("保存幂等记录失败")
+        return response
+
+    @staticmethod
+    def _check(stored: str, fingerprint: str):
+        if stored != fingerprint:
+            raise IdempotencyConflict("该Idempotency-Key已用于不同的请求")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "joined": self.joined,
+            "replayed": self.replayed,
+        }
+
+
+# 全局幂等键实例
+idempotency_store = IdempotencyStore(
+    ttl_hours=settings.IDEMPOTENCY_TTL_HOURS,
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+)
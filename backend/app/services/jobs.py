@@ -0,0 +1,227 @@
+"""
+后台任务 - 提交后立即返回任务ID，由有界执行器在后台运行命令
+
+任务状态持久化在jobs表中：queued -> running -> succeeded / failed / timeout / cancelled，
+进程重启时遗留的未完成任务标记为 interrupted。运行中的任务在内存中保存
+部分输出，查询时直接返回。
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.database import async_db, db
+from app.models.execute import ExecuteRequest
+from app.services.artifacts import new_capture
+from app.services.executor import (
+    build_command_args, resolve_limits, stream_command, timeout_message
+)
+from app.services.history_writer import history_writer
+from app.services.result_cache import result_cache
+from app.services.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {"succeeded", "failed", "timeout", "cancelled", "interrupted"}
+
+
+class JobQueueFull(Exception):
+    """排队任务已满"""
+
+
+def _now() -> str:
+    """当前UTC时间，格式与CURRENT_TIMESTAMP和历史记录的created_at一致"""
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class _Job:
+    """运行中的任务"""
+
+    def __init__(self, job_id: str, request: ExecuteRequest,
+                 command_meta: Dict[str, Any], module_meta: Dict[str, Any]):
+        self.id = job_id
+        self.request = request
+        self.command_meta = command_meta
+        self.module_meta = module_meta
+        self.status = "queued"
+        self.returncode: Optional[int] = None
+        self.stdout = new_capture()
+        self.stderr = new_capture()
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.queued_at = time.monotonic()
+        self.queue_ms: Optional[float] = None
+        self.usage: Dict[str, Any] = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "module": self.request.module,
+            "command": self.request.command,
+            "params": self.request.params,
+            "status": self.status,
+            "returncode": self.returncode,
+            "output": self.stdout.getvalue(),
+            "error": self.stderr.getvalue(),
+            "output_artifact": self.stdout.artifact_id,
+            "error_artifact": self.stderr.artifact_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """后台任务管理器，同时运行的任务数和排队数都有上限"""
+
+    def __init__(self, max_concurrency: int = 4, max_pending: int = 100):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._jobs: Dict[str, _Job] = {}
+        self._shutting_down = False
+
+    async def submit(self, request: ExecuteRequest, ai_toolkit_path: Path,
+               command_meta: Optional[Dict[str, Any]] = None,
+               module_meta: Optional[Dict[str, Any]] = None) -> str:
+        """提交任务，返回任务ID"""
+        if len(self._jobs) >= self.max_concurrency + self.max_pending:
+            raise JobQueueFull("排队任务已满")
+
+        job = _Job(uuid.uuid4().hex, request, command_meta or {}, module_meta or {})
+        await async_db.add_job(
+            job.id, request.module, request.command, request.params, created_at=job.created_at
+        )
+
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, ai_toolkit_path))
+        return job.id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，运行中的任务包含部分输出"""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.snapshot()
+        return await async_db.get_job(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消任务并结束其进程，任务不存在时返回None"""
+        job = self._jobs.get(job_id)
+        if not job:
+            return await async_db.get_job(job_id)
+
+        job.task.cancel()
+        await asyncio.wait([job.task])
+        return job.snapshot()
+
+    async def _run(self, job: _Job, ai_toolkit_path: Path):
+        request = job.request
+        try:
+            # 任务自身已有排队上限，调度器中不受等待队列约束
+            async with self._semaphore, scheduler.slot(
+                request.module,
+                lane=job.command_meta.get("lane"),
+                module_limit=job.module_meta.get("max_concurrency"),
+                bounded=False,
+            ):
+                job.queue_ms = round((time.monotonic() - job.queued_at) * 1000, 3)
+                job.status = "running"
+                job.started_at = _now()
+                await async_db.update_job(job.id, status=job.status, started_at=job.started_at)
+
+                args = build_command_args(request.module, request.command, request.params)
+                limits = resolve_limits(
+                    job.command_meta, request.timeout, request.cpu_limit, request.memory_limit
+                )
+                timed_out = False
+                async for name, data in stream_command(args, ai_toolkit_path, limits):
+                    if name == "exit":
+                        job.returncode = data
+                    elif name == "timeout":
+                        timed_out = True
+                        job.stderr.write(timeout_message(data))
+                    elif name == "usage":
+                        job.usage = data
+                    elif name == "stdout":
+                        job.stdout.write(data)
+                    else:
+                        job.stderr.write(data)
+
+            if timed_out:
+                job.status = "timeout"
+            else:
+                job.status = "succeeded" if job.returncode == 0 else "failed"
+        except asyncio.CancelledError:
+            job.status = "interrupted" if self._shutting_down else "cancelled"
+            raise
+        except Exception as e:
+            logger.exception("任务执行异常: %s", job.id)
+            job.stderr.write(str(e))
+            job.status = "failed"
+        finally:
+            job.finished_at = _now()
+            await self._finish(job)
+
+    async def _finish(self, job: _Job):
+        """持久化最终状态并写入历史记录"""
+        job.stdout.close()
+        job.stderr.close()
+        snapshot = job.snapshot()
+        result_cache.invalidate_targets(job.command_meta.get("invalidates", []))
+        try:
+            await async_db.update_job(
+                job.id,
+                status=job.status,
+                returncode=job.returncode,
+                output=snapshot["output"],
+                error=snapshot["error"],
+                output_artifact=snapshot["output_artifact"],
+                error_artifact=snapshot["error_artifact"],
+                finished_at=job.finished_at,
+            )
+            if job.status in ("succeeded", "failed", "timeout"):
+                success = job.status == "succeeded"
+                use_stdout = success or not snapshot["error"]
+                await history_writer.add(
+                    module=job.request.module,
+                    command=job.request.command,
+                    params=job.request.params,
+                    success=success,
+                    output=snapshot["output"] if use_stdout else snapshot["error"],
+                    status="success" if success else job.status,
+                    artifact_id=snapshot["output_artifact"] if use_stdout else snapshot["error_artifact"],
+                    duration_ms=round((time.monotonic() - job.queued_at) * 1000, 3),
+                    queue_ms=job.queue_ms,
+                    **job.usage,
+                )
+        except Exception:
+            logger.exception("保存任务状态失败: %s", job.id)
+        finally:
+            self._jobs.pop(job.id, None)
+
+    def start(self):
+        """启动时将上次遗留的未完成任务标记为中断"""
+        db.interrupt_unfinished_jobs()
+
+    async def shutdown(self):
+        """关闭时中断所有运行中的任务"""
+        self._shutting_down = True
+        tasks = [job.task for job in self._jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+# 全局任务管理器实例
+job_manager = JobManager(
+    max_concurrency=settings.JOB_MAX_CONCURRENCY,
+    max_pending=settings.JOB_MAX_PENDING,
+)
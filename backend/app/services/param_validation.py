@@ -0,0 +1,150 @@
+"""
+参数预检 - 按命令目录中的参数定义校验并规范化执行参数
+
+每个命令的参数定义在目录加载时编译为 ParamValidator（每个参数一个转换函数），
+执行前检查：未知参数、必填参数、类型（number / boolean）和 select 的可选值，
+不通过时在启动进程之前返回422。校验通过的参数统一了类型（"5" -> 5，"true" -> True），
+缓存、请求合并和幂等键由此得到稳定的键。
+"""
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_TRUE = {"true", "1", "yes", "on"}
+_FALSE = {"false", "0", "no", "off"}
+
+
+class ParamValidationError(Exception):
+    """参数校验失败，errors为 [{"loc", "msg", "type"}]，格式同FastAPI的请求校验错误"""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__("; ".join(error["msg"] for error in errors))
+        self.errors = errors
+
+
+def _to_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).strip()
+    number = float(text)
+    if not math.isfinite(number):
+        raise ValueError
+    return int(number) if number.is_integer() and "." not in text and "e" not in text.lower() else number
+
+
+def _to_boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        raise ValueError
+    return value if isinstance(value, str) else str(value)
+
+
+def _compile(param: Dict[str, Any]) -> Callable[[Any], Any]:
+    """按参数定义生成转换函数，值不合法时抛出ValueError"""
+    param_type = param.get("type")
+    if param_type == "number":
+        return _to_number
+    if param_type == "boolean":
+        return _to_boolean
+    options = param.get("options")
+    if param_type == "select" and options:
+        allowed = {str(option) for option in options}
+
+        def to_option(value: Any) -> str:
+            text = _to_text(value)
+            if text not in allowed:
+                raise ValueError
+            return text
+
+        return to_option
+    return _to_text
+
+
+_TYPE_MESSAGES = {
+    "number": "必须是数字",
+    "boolean": "必须是布尔值",
+    "select": "不是可选值",
+}
+
+
+class ParamValidator:
+    """单个命令的参数校验器"""
+
+    def __init__(self, params: List[Dict[str, Any]], allow_unknown: bool = False):
+        self.allow_unknown = allow_unknown
+        self._converters = {param["name"]: _compile(param) for param in params}
+        self._definitions = {param["name"]: param for param in params}
+        self.required = [param["name"] for param in params if param.get("required")]
+        self.defaults = {
+            param["name"]: param["default"] for param in params if param.get("default") is not None
+        }
+
+    def _error(self, name: str, msg: str, error_type: str) -> Dict[str, Any]:
+        return {"loc": ["body", "params", name], "msg": msg, "type": error_type}
+
+    def validate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并返回规范化的参数（按键排序，值为空的可选参数被去掉）"""
+        errors = []
+        normalized: Dict[str, Any] = {}
+        for name in sorted(params):
+            value = params[name]
+            converter = self._converters.get(name)
+            if converter is None:
+                if self.allow_unknown:
+                    normalized[name] = value
+                else:
+                    errors.append(self._error(name, f"未知参数 {name}", "value_error.unknown"))
+                continue
+            if value is None or value == "":
+                continue
+            try:
+                normalized[name] = converter(value)
+            except (TypeError, ValueError):
+                definition = self._definitions[name]
+                msg = f"参数 {name} {_TYPE_MESSAGES.get(definition.get('type'), '必须是字符串')}"
+                if definition.get("type") == "select" and definition.get("options"):
+                    msg += f"（可选: {', '.join(str(option) for option in definition['options'])}）"
+                errors.append(self._error(name, msg, "value_error.type"))
+
+        invalid = {error["loc"][-1] for error in errors}
+        for name in self.required:
+            # 已报告类型错误的参数不再重复报告缺少
+            if name not in normalized and name not in invalid:
+                errors.append(self._error(name, f"缺少必填参数 {name}", "value_error.missing"))
+
+        if errors:
+            raise ParamValidationError(errors)
+        return normalized
+
+    def with_defaults(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """补全默认值，用于生成缓存键（省略参数与显式传入默认值视为相同请求）"""
+        return {**self.defaults, **params}
+
+
+def compile_validators(modules: List[Dict[str, Any]],
+                       allow_unknown: bool = False) -> Dict[Tuple[str, str], ParamValidator]:
+    """为目录中的每个命令编译校验器"""
+    return {
+        (module["id"], command["id"]): ParamValidator(command["params"], allow_unknown)
+        for module in modules
+        for command in module["commands"]
+    }
+
+
+def validation_errors(errors: List[Dict[str, Any]], prefix: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    """给错误位置加上前缀（批量执行中条目的序号）"""
+    if not prefix:
+        return errors
+    return [{**error, "loc": ["body", *prefix, *error["loc"][1:]]} for error in errors]
@@ -0,0 +1,203 @@
+"""
+响应缓存 - fastapi-cache 的有界内存后端，数据库写入后按命名空间失效
+
+- 按LRU淘汰，同时限制条数（RESPONSE_CACHE_MAX_ENTRIES）和占用内存
+  （RESPONSE_CACHE_MAX_BYTES）；每条按路由的TTL过期
+- 缓存键为 前缀:命名空间:版本:摘要，摘要包含接口函数和全部路径参数、查询参数
+- history / favorites 表提交改动后，对应命名空间的版本加一并清除其缓存。
+  失效前开始查询、失效后才写入缓存的旧结果用的是旧版本的键，不会再被读到
+- 统计命中率、条数、内存占用和淘汰次数
+- 接口用 @cached 而不是 fastapi-cache 的 @cache：响应头为 Cache-Control: no-cache，
+  浏览器每次向服务端验证（ETag一致时返回304），写入后不会继续显示旧数据
+
+命名空间与数据库表同名：history（历史记录列表、搜索、详情、执行统计）、favorites。
+"""
+
+import functools
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from fastapi_cache.backends import Backend
+from fastapi_cache.decorator import cache
+
+from app.core.config import settings
+from app.core.database import db
+
+
+class BoundedMemoryBackend(Backend):
+    """有界LRU内存缓存后端
+
+    失效由数据库线程调用，所有操作在同一把线程锁内完成（只有字典操作，持锁时间很短）。
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 键 -> (过期时间, 值, 占用字节数, 命名空间)
+        self._entries: "OrderedDict[str, Tuple[float, str, int, str]]" = OrderedDict()
+        self._namespaces: Dict[str, Set[str]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.too_large = 0
+
+    def key_builder(self, func: Callable[..., Any], namespace: str = "",
+                    request: Any = None, response: Any = None,
+                    args: Optional[tuple] = None, kwargs: Optional[dict] = None) -> str:
+        """缓存键：命名空间、命名空间当前版本和接口函数及其参数的摘要"""
+        from fastapi_cache import FastAPICache
+
+        arguments = sorted((kwargs or {}).items())
+        digest = hashlib.sha256(
+            f"{func.__module__}:{func.__name__}:{args}:{arguments}".encode()
+        ).hexdigest()[:32]
+        return f"{FastAPICache.get_prefix()}:{namespace}:{self._versions.get(namespace, 0)}:{digest}"
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[2]
+        keys = self._namespaces.get(entry[3])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._namespaces[entry[3]]
+        return True
+
+    def _get(self, key: str) -> Optional[Tuple[float, str, int, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[str]]:
+        entry = self._get(key)
+        if entry is None:
+            return 0, None
+        return max(int(entry[0] - time.monotonic()), 0), entry[1]
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._get(key)
+        return entry[1] if entry else None
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        if not expire or self.max_entries <= 0:
+            return
+        _, namespace, version, _ = key.rsplit(":", 3)
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        with self._lock:
+            if size > self.max_bytes:
+                self.too_large += 1
+                return
+            # 计算期间命名空间已失效，结果可能是旧的
+            if int(version) != self._versions.get(namespace, 0):
+                return
+
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + expire, value, size, namespace)
+            self._namespaces.setdefault(namespace, set()).add(key)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _clear_namespace(self, namespace: str) -> int:
+        keys = list(self._namespaces.get(namespace, ()))
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        """fastapi-cache接口：namespace为 "前缀:命名空间"，只有前缀时清除全部"""
+        if key:
+            with self._lock:
+                return int(self._remove(key))
+        _, _, name = (namespace or "").partition(":")
+        return self.invalidate(name) if name else self.clear_all()
+
+    def invalidate(self, namespace: str) -> int:
+        """命名空间版本加一并清除其缓存，返回清除条数"""
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            removed = self._clear_namespace(namespace)
+            self.invalidations += removed
+            return removed
+
+    def clear_all(self) -> int:
+        with self._lock:
+            for namespace in set(self._versions) | set(self._namespaces):
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            removed = len(self._entries)
+            self._entries.clear()
+            self._namespaces.clear()
+            self.bytes = 0
+            self.invalidations += removed
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": settings.RESPONSE_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "namespaces": {namespace: len(keys) for namespace, keys in self._namespaces.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "too_large": self.too_large,
+            }
+
+
+def cached(expire: int, namespace: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """fastapi-cache 的 @cache，但不让浏览器按TTL缓存
+
+    fastapi-cache 会设置 Cache-Control: max-age=<expire>，浏览器在此期间不再请求，
+    服务端失效也看不到；这里改为 no-cache，保留ETag，由服务端缓存负责失效。
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        cached_func = cache(expire=expire, namespace=namespace)(func)
+
+        @functools.wraps(cached_func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            result = await cached_func(*args, **kwargs)
+            response = kwargs.get("response")
+            if response is not None:
+                response.headers["Cache-Control"] = "no-cache"
+            return result
+
+        return wrapper
+    return decorator
+
+
+# 全局响应缓存实例
+response_cache = BoundedMemoryBackend(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+)
+
+# 历史记录、收藏写入提交后失效对应命名空间
+db.add_write_listener(response_cache.invalidate)
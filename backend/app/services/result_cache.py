@@ -0,0 +1,150 @@
+"""
+结果缓存 - 缓存只读命令的执行结果，避免重复启动进程
+
+只有在模块目录中声明了 cache_ttl 的命令才会缓存，键为
+(模块, 命令, 规范化参数, 资源限制)。资源限制不同的请求结果可能不同（如超时），不共用缓存。写操作命令通过 invalidates 声明需要失效的缓存。
+
+每个模块有一个代数，失效时递增。执行前取得代数，写入缓存时代数已变化（执行期间有写操作
+完成并失效了该模块）则不写入，避免把写操作之前读到的结果缓存一整个TTL。
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.models.execute import ExecutionResult, ResourceLimits
+from app.services.catalog import catalog
+
+
+def canonical_params(module: str, command: str, params: Dict[str, Any]) -> str:
+    """规范化参数：补全目录中的默认值后按键排序，值按命令行传参方式转为字符串"""
+    validator = catalog.validator(module, command)
+    if validator:
+        params = validator.with_defaults(params)
+    return json.dumps(
+        {key: str(value) for key, value in sorted(params.items())},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+# (模块, 命令, 规范化参数, (超时, CPU时间, 内存))
+CacheKey = Tuple[str, str, str, Tuple[Optional[int], Optional[int], Optional[int]]]
+
+
+class ResultCache:
+    """带TTL的LRU结果缓存"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, Tuple[float, ExecutionResult]]" = OrderedDict()
+        self._by_command: Dict[Tuple[str, str], Set[CacheKey]] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0  # clear() 时递增，相当于所有模块的代数都变化
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_discards = 0
+
+    @staticmethod
+    def make_key(module: str, command: str, params: Dict[str, Any],
+                 limits: ResourceLimits) -> CacheKey:
+        return (
+            module, command, canonical_params(module, command, params),
+            (limits.timeout, limits.cpu_time, limits.memory_mb),
+        )
+
+    def get(self, key: CacheKey) -> Optional[ExecutionResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def generation(self, module: str) -> Tuple[int, int]:
+        """模块的当前代数，执行前取得，写入缓存时传给set"""
+        return self._epoch, self._generations.get(module, 0)
+
+    def set(self, key: CacheKey, result: ExecutionResult, ttl: int,
+            generation: Optional[Tuple[int, int]] = None):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        if generation is not None and generation != self.generation(key[0]):
+            # 执行期间模块已被失效，结果可能是写操作之前的状态
+            self.stale_discards += 1
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        self._by_command.setdefault(key[:2], set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key, None)
+        keys = self._by_command.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_command[key[:2]]
+
+    def invalidate(self, module: str, command: Optional[str] = None) -> int:
+        """失效某个命令（或整个模块）的全部缓存"""
+        self._generations[module] = self._generations.get(module, 0) + 1
+        targets = [
+            pair for pair in self._by_command
+            if pair[0] == module and (command is None or pair[1] == command)
+        ]
+        removed = 0
+        for pair in targets:
+            for key in list(self._by_command.get(pair, ())):
+                self._remove(key)
+                removed += 1
+        self.invalidations += removed
+        return removed
+
+    def invalidate_targets(self, targets: Iterable[str]) -> int:
+        """按 "模块:命令" 列表失效缓存"""
+        removed = 0
+        for target in targets:
+            module, _, command = target.partition(":")
+            removed += self.invalidate(module, command or None)
+        return removed
+
+    def clear(self) -> int:
+        removed = len(self._entries)
+        self._epoch += 1
+        self.invalidations += removed
+        self._entries.clear()
+        self._by_command.clear()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.RESULT_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_discards": self.stale_discards,
+        }
+
+
+# 全局结果缓存实例
+result_cache = ResultCache(max_entries=settings.RESULT_CACHE_MAX_ENTRIES)
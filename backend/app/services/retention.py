@@ -0,0 +1,263 @@
+"""
+数据保留 - 后台分批清理历史记录并回收数据库空间
+
+保留规则（0表示不限制；历史记录的三项默认都为0，不会删除用户数据，需要时在配置中开启）：
+- 按时间：早于 HISTORY_RETENTION_DAYS 天的历史记录
+- 按条数：超过 HISTORY_RETENTION_MAX_ROWS 条时删除最早的记录
+- 按空间：数据库已用空间超过 HISTORY_RETENTION_MAX_BYTES 时删除最早的记录
+- HISTORY_RETENTION_MODULES 可以为单个模块设置 days / max_rows
+- 已结束的后台任务保留 JOB_RETENTION_DAYS 天
+- 执行统计汇总保留 RUN_STATS_RETENTION_DAYS 天
+- 删除了历史记录或后台任务时，随后清理不再被引用的过期产物文件
+
+每批最多删除 RETENTION_BATCH_SIZE 行并单独提交，批次之间短暂让出写锁，
+删除后合并全文索引段（清除已删除记录的索引数据），再用 incremental_vacuum
+把空闲页归还给文件系统。
+
+启动后先在后台完成升级旧数据库登记的迁移（不阻塞启动）：按id分批补建全文索引、
+重建计数表，再按id分批把旧版本保存在history.output中的输出迁移到压缩表
+（每批单独提交），之后开始定期清理。
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import async_db
+from app.services.artifacts import artifact_store
+from app.services.history_writer import history_writer
+
+logger = logging.getLogger(__name__)
+
+
+def _cutoff(days: int) -> str:
+    """days天前的时间，格式与CURRENT_TIMESTAMP一致"""
+    return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class RetentionManager:
+    """定期执行保留规则"""
+
+    def __init__(self, interval: int = 600, batch_size: int = 500,
+                 batch_pause: float = 0.05, vacuum_pages: int = 1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum_pages = vacuum_pages
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.indexed_rows = 0
+        self.migrated_outputs = 0
+        self.migration_done = False
+
+    @staticmethod
+    def policy() -> Dict[str, Any]:
+        return {
+            "days": settings.HISTORY_RETENTION_DAYS,
+            "max_rows": settings.HISTORY_RETENTION_MAX_ROWS,
+            "max_bytes": settings.HISTORY_RETENTION_MAX_BYTES,
+            "modules": settings.HISTORY_RETENTION_MODULES,
+            "job_days": settings.JOB_RETENTION_DAYS,
+            "run_stats_days": settings.RUN_STATS_RETENTION_DAYS,
+        }
+
+    async def _drain(self, delete_batch: Callable[[], Awaitable[int]]) -> int:
+        """分批执行删除直到没有可删的行，返回删除总数"""
+        deleted = 0
+        while True:
+            count = await delete_batch()
+            deleted += count
+            if count == 0:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return deleted
+
+    async def _delete_oldest(self, excess: int, module: Optional[str] = None) -> int:
+        deleted = 0
+        while deleted < excess:
+            count = await async_db.delete_oldest_history(min(self.batch_size, excess - deleted), module)
+            if count == 0:
+                break
+            deleted += count
+            await asyncio.sleep(self.batch_pause)
+        return deleted
+
+    async def _vacuum(self) -> int:
+        """合并全文索引中已删除的数据，再分批归还空闲页"""
+        while await async_db.merge_fts(self.vacuum_pages) >= 2:
+            await asyncio.sleep(self.batch_pause)
+
+        freed = 0
+        while True:
+            pages = await async_db.incremental_vacuum(self.vacuum_pages)
+            freed += pages
+            if pages < self.vacuum_pages:
+                return freed
+            await asyncio.sleep(self.batch_pause)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """执行一次全部保留规则，返回本次结果"""
+        async with self._lock:
+            started = time.monotonic()
+            policy = self.policy()
+            deleted = {"age": 0, "rows": 0, "bytes": 0, "jobs": 0, "run_stats": 0, "artifacts": 0}
+            modules: Dict[str, Dict[str, int]] = policy["modules"]
+
+            # 先写入缓冲中的记录，条数计算才准确
+            await history_writer.flush()
+
+            # 按模块覆盖的规则
+            for module, rules in modules.items():
+                if rules.get("days"):
+                    cutoff = _cutoff(rules["days"])
+                    deleted["age"] += await self._drain(
+                        lambda: async_db.delete_history_before(cutoff, self.batch_size, module=module)
+                    )
+                if rules.get("max_rows"):
+                    excess = await async_db.count_history(module=module) - rules["max_rows"]
+                    if excess > 0:
+                        deleted["rows"] += await self._delete_oldest(excess, module)
+
+            # 全局规则（按时间的规则不作用于已单独设置days的模块）
+            if policy["days"]:
+                cutoff = _cutoff(policy["days"])
+                overridden = [module for module, rules in modules.items() if rules.get("days")]
+                deleted["age"] += await self._drain(
+                    lambda: async_db.delete_history_before(
+                        cutoff, self.batch_size, exclude_modules=overridden
+                    )
+                )
+            if policy["max_rows"]:
+                excess = await async_db.count_history() - policy["max_rows"]
+                if excess > 0:
+                    deleted["rows"] += await self._delete_oldest(excess)
+
+            if policy["job_days"]:
+                cutoff = _cutoff(policy["job_days"])
+                deleted["jobs"] += await self._drain(
+                    lambda: async_db.delete_finished_jobs_before(cutoff, self.batch_size)
+                )
+
+            if policy["run_stats_days"]:
+                cutoff = _cutoff(policy["run_stats_days"])
+                # 每批按小时桶删除，bucket与cutoff同为 'YYYY-MM-DD HH:MM:SS' 格式
+                deleted["run_stats"] += await self._drain(
+                    lambda: async_db.delete_run_stats_before(cutoff, 24)
+                )
+
+            freed_pages = await self._vacuum()
+
+            # 按空间：每删除一批就回收一次，直到已用空间低于上限
+            if policy["max_bytes"]:
+                while (await async_db.get_storage_stats())["used_bytes"] > policy["max_bytes"]:
+                    count = await async_db.delete_oldest_history(self.batch_size)
+                    if count == 0:
+                        break
+                    deleted["bytes"] += count
+                    freed_pages += await self._vacuum()
+
+            await async_db.checkpoint()
+
+            # 产物文件随引用它的记录一起删除
+            if deleted["age"] or deleted["rows"] or deleted["bytes"] or deleted["jobs"]:
+                deleted["artifacts"] = await run_in_threadpool(artifact_store.cleanup)
+
+            self.runs += 1
+            self.last_run = {
+                "finished_at": datetime.utcnow().isoformat(),
+                "duration_ms": round((time.monotonic() - started) * 1000, 2),
+                "deleted": deleted,
+                "freed_pages": freed_pages,
+            }
+            return self.last_run
+
+    async def backfill_fts(self) -> int:
+        """分批为升级前已有的历史记录建立全文索引，返回建立索引的条数"""
+        indexed = 0
+        while True:
+            count = await async_db.backfill_history_fts_batch(self.batch_size)
+            if count == 0:
+                break
+            indexed += count
+            self.indexed_rows += count
+            await asyncio.sleep(self.batch_pause)
+        return indexed
+
+    async def run_migrations(self):
+        """执行升级旧数据库登记的迁移
+
+        输出迁移会先从全文索引中删除旧内容，必须在补建索引完成后进行。
+        """
+        await self.backfill_fts()
+        await async_db.rebuild_counts()
+        await self.migrate_outputs()
+
+    async def migrate_outputs(self) -> int:
+        """分批迁移旧格式的输出，返回迁移条数"""
+        last_id = 0
+        migrated = 0
+        while True:
+            batch_last, count = await async_db.migrate_history_output_batch(last_id, self.batch_size)
+            if batch_last is None:
+                break
+            migrated += count
+            last_id = batch_last
+            await asyncio.sleep(self.batch_pause)
+        self.migrated_outputs += migrated
+        self.migration_done = True
+        return migrated
+
+    async def _loop(self):
+        try:
+            await self.run_migrations()
+        except Exception:
+            logger.exception("迁移历史记录失败")
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("清理历史记录失败")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """启动定期清理"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy(),
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+            "running": self._lock.locked(),
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "indexed_rows": self.indexed_rows,
+            "migrated_outputs": self.migrated_outputs,
+            "migration_done": self.migration_done,
+        }
+
+
+# 全局数据保留实例
+retention_manager = RetentionManager(
+    interval=settings.RETENTION_INTERVAL,
+    batch_size=settings.RETENTION_BATCH_SIZE,
+    batch_pause=settings.RETENTION_BATCH_PAUSE,
+    vacuum_pages=settings.RETENTION_VACUUM_PAGES,
+)
@@ -0,0 +1,108 @@
+"""
+执行统计 - 由按小时预聚合的汇总表计算延迟分位数、成功率和吞吐量
+
+写入历史记录时同步累加 run_rollups / run_latency_bins（见 HistoryDatabase._add_rollup），
+查询只读取窗口内的小时桶，不扫描历史记录表。窗口按小时对齐，包含当前未结束的小时。
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.database import async_db, percentiles
+from app.services.history_writer import history_writer
+
+# 统计窗口 -> 小时数
+WINDOWS = {"1h": 1, "24h": 24, "7d": 24 * 7, "30d": 24 * 30}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _merge_bins(target: Dict[int, int], source: Dict[int, int]):
+    for bin_index, count in source.items():
+        target[bin_index] = target.get(bin_index, 0) + count
+
+
+def _summary(rows: List[Dict[str, Any]], bins: Dict[int, int], minutes: float) -> Dict[str, Any]:
+    """汇总若干小时桶的统计"""
+    runs = sum(row["runs"] for row in rows)
+    successes = sum(row["successes"] for row in rows)
+    queue_runs = sum(row["queue_runs"] for row in rows)
+    cpu_runs = sum(row["cpu_runs"] for row in rows)
+    rss = [row["max_rss_kb"] for row in rows if row["max_rss_kb"]]
+    p = percentiles(bins, QUANTILES)
+    return {
+        "runs": runs,
+        "successes": successes,
+        "success_rate": round(successes / runs, 4) if runs else None,
+        "avg_ms": round(sum(row["total_ms"] for row in rows) / runs, 2) if runs else None,
+        "p50_ms": p[0.5],
+        "p95_ms": p[0.95],
+        "p99_ms": p[0.99],
+        "avg_queue_ms": round(sum(row["total_queue_ms"] for row in rows) / queue_runs, 2) if queue_runs else None,
+        "avg_cpu_ms": round(sum(row["total_cpu_ms"] for row in rows) / cpu_runs, 2) if cpu_runs else None,
+        "max_rss_kb": max(rss) if rss else None,
+        "throughput_per_min": round(runs / minutes, 4),
+    }
+
+
+def _series(rows: List[Dict[str, Any]], interval: str) -> List[Dict[str, Any]]:
+    """按小时或天汇总的执行次数序列"""
+    width = 10 if interval == "day" else 13  # 'YYYY-MM-DD' / 'YYYY-MM-DD HH'
+    minutes = 1440 if interval == "day" else 60
+    grouped: Dict[str, Dict[str, float]] = {}
+    for row in rows:
+        point = grouped.setdefault(row["bucket"][:width], {"runs": 0, "successes": 0, "total_ms": 0.0})
+        point["runs"] += row["runs"]
+        point["successes"] += row["successes"]
+        point["total_ms"] += row["total_ms"]
+
+    series = []
+    for key in sorted(grouped):
+        point = grouped[key]
+        series.append({
+            "bucket": f"{key} 00:00:00" if interval == "day" else f"{key}:00:00",
+            "runs": point["runs"],
+            "success_rate": round(point["successes"] / point["runs"], 4),
+            "avg_ms": round(point["total_ms"] / point["runs"], 2),
+            "throughput_per_min": round(point["runs"] / minutes, 4),
+        })
+    return series
+
+
+async def get_run_stats(window: str, module: Optional[str] = None, command: Optional[str] = None,
+                        interval: Optional[str] = None) -> Dict[str, Any]:
+    """统计窗口内的执行情况：总体、按 (module, command) 分组和时间序列"""
+    hours = WINDOWS[window]
+    interval = interval or ("hour" if hours <= 24 else "day")
+    now = datetime.utcnow()
+    since = (now - timedelta(hours=hours - 1)).strftime("%Y-%m-%d %H:00:00")
+    minutes = (now - datetime.strptime(since, "%Y-%m-%d %H:%M:%S")).total_seconds() / 60
+
+    # 缓冲中的执行记录写入后汇总才完整
+    await history_writer.flush()
+    data = await async_db.get_run_stats(since, module=module, command=command)
+    rollups: List[Dict[str, Any]] = data["rollups"]
+    bins: Dict[Tuple[str, str], Dict[int, int]] = data["bins"]
+
+    grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in rollups:
+        grouped.setdefault((row["module"], row["command"]), []).append(row)
+
+    total_bins: Dict[int, int] = {}
+    for command_bins in bins.values():
+        _merge_bins(total_bins, command_bins)
+
+    commands = [
+        {"module": key[0], "command": key[1], **_summary(rows, bins.get(key, {}), minutes)}
+        for key, rows in grouped.items()
+    ]
+    commands.sort(key=lambda item: item["runs"], reverse=True)
+
+    return {
+        "window": window,
+        "since": since,
+        "interval": interval,
+        "total": _summary(rollups, total_bins, minutes),
+        "commands": commands,
+        "series": _series(rollups, interval),
+    }
@@ -0,0 +1,178 @@
+"""
+执行调度 - 在启动进程前做准入控制
+
+每次执行需要依次获得：所在模块的名额 -> 所在通道的名额 -> 全局名额。
+先取模块名额：某个模块排满时，其后续请求只在自己的模块上等待，不占用通道名额，
+其他模块的请求不会被挡住。全局名额放在通道之后，heavy 通道排队的请求不会占住
+interactive 通道可用的全局名额。
+- 通道：interactive（默认）和 heavy，由命令目录中的 lane 声明；heavy 通道
+  并发较小，保证快速命令不会排在长时间命令后面
+- 模块：目录中模块的 max_concurrency，未声明时使用默认值
+- 每个通道的等待队列有上限，满了直接拒绝（API返回429和Retry-After）
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+
+DEFAULT_LANE = "interactive"
+
+
+class SchedulerBusy(Exception):
+    """等待队列已满"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """优先级通道"""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.avg_run: Optional[float] = None  # 运行时长的指数滑动平均（秒），用于估算Retry-After
+
+    def record_run(self, seconds: float):
+        self.avg_run = seconds if self.avg_run is None else 0.8 * self.avg_run + 0.2 * seconds
+
+    def retry_after(self) -> int:
+        batches = (self.waiting + self.running) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(batches * (self.avg_run or 1.0)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "avg_run_ms": round((self.avg_run or 0.0) * 1000, 2),
+        }
+
+
+class AdmissionScheduler:
+    """全局 + 模块 + 通道三级并发控制"""
+
+    def __init__(self, max_concurrency: int, lanes: Dict[str, Dict[str, int]],
+                 module_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.module_concurrency = module_concurrency
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._lanes = {
+            name: _Lane(name, config["max_concurrency"], config["max_queue"])
+            for name, config in lanes.items()
+        }
+        self._modules: Dict[str, asyncio.Semaphore] = {}
+        self._module_waiting: Dict[str, int] = {}
+        self._module_running: Dict[str, int] = {}
+
+    def _lane(self, lane: Optional[str]) -> _Lane:
+        return self._lanes.get(lane or DEFAULT_LANE) or self._lanes[DEFAULT_LANE]
+
+    def _module_semaphore(self, module: str, limit: Optional[int]) -> asyncio.Semaphore:
+        semaphore = self._modules.get(module)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(limit or self.module_concurrency)
+            self._modules[module] = semaphore
+        return semaphore
+
+    def ensure_capacity(self, lane: Optional[str] = None):
+        """检查通道等待队列是否已满，满了抛出SchedulerBusy"""
+        target = self._lane(lane)
+        if target.semaphore.locked() and target.waiting >= target.max_queue:
+            target.rejected += 1
+            raise SchedulerBusy(f"{target.name} 通道排队已满", target.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, module: str, lane: Optional[str] = None,
+                   module_limit: Optional[int] = None,
+                   bounded: bool = True) -> AsyncIterator[float]:
+        """获得执行名额，产出排队等待秒数
+
+        bounded 为 False 时不受等待队列上限约束（后台任务自身已有排队上限）。
+        """
+        target = self._lane(lane)
+        if bounded:
+            self.ensure_capacity(target.name)
+
+        module_semaphore = self._module_semaphore(module, module_limit)
+        acquired = []
+        queued_at = time.monotonic()
+        target.waiting += 1
+        self._module_waiting[module] = self._module_waiting.get(module, 0) + 1
+        try:
+            for semaphore in (module_semaphore, target.semaphore, self._global):
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+        finally:
+            target.waiting -= 1
+            self._module_waiting[module] -= 1
+
+        wait = time.monotonic() - queued_at
+        target.admitted += 1
+        target.total_wait += wait
+        target.max_wait = max(target.max_wait, wait)
+        target.running += 1
+        self._module_running[module] = self._module_running.get(module, 0) + 1
+
+        started_at = time.monotonic()
+        try:
+            yield wait
+        finally:
+            target.record_run(time.monotonic() - started_at)
+            target.running -= 1
+            self._module_running[module] -= 1
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "module_concurrency": self.module_concurrency,
+            "lanes": {name: lane.stats() for name, lane in self._lanes.items()},
+            "modules": {
+                module: {
+                    "running": self._module_running.get(module, 0),
+                    "queue_depth": self._module_waiting.get(module, 0),
+                }
+                for module in self._modules
+            },
+        }
+
+
+# 全局调度器实例
+scheduler = AdmissionScheduler(
+    max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY,
+    lanes={
+        "interactive": {
+            "max_concurrency": settings.SCHEDULER_INTERACTIVE_CONCURRENCY,
+            "max_queue": settings.SCHEDULER_INTERACTIVE_QUEUE,
+        },
+        "heavy": {
+            "max_concurrency": settings.SCHEDULER_HEAVY_CONCURRENCY,
+            "max_queue": settings.SCHEDULER_HEAVY_QUEUE,
+        },
+    },
+    module_concurrency=settings.SCHEDULER_MODULE_CONCURRENCY,
+)
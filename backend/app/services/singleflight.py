@@ -0,0 +1,47 @@
+"""
+请求合并 - 相同的并发请求共享同一次执行
+
+只对目录中声明了 coalesce 的只读命令生效，键为 (模块, 命令, 规范化参数)。
+第一个请求发起执行，执行期间到达的相同请求直接等待它的结果；
+发起者断开连接不会取消执行，其他等待者照常拿到结果。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """进行中执行的登记表"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """执行fn或加入相同键的进行中执行，返回 (结果, 是否为合并请求)"""
+        task = self._in_flight.get(key)
+        shared = task is not None
+
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / requests if requests else 0.0,
+        }
+
+
+# 全局请求合并实例
+single_flight = SingleFlight()
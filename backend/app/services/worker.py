@@ -0,0 +1,135 @@
+"""
+常驻执行进程 - 预先导入ai_toolkit，通过管道接收命令
+
+作为独立脚本运行（只依赖标准库）：
+
+    python worker.py
+
+协议为逐行JSON：
+- 启动后输出 {"event": "ready", "ok": true}，导入失败时 ok 为 false 并退出
+- 从stdin读取 {"args": [...], "cpu_time": 秒, "memory_mb": MB}，每个任务fork一个子进程执行，
+  子进程成为新的进程组组长，调用方可以结束整个进程组
+- 子进程启动后输出 {"event": "started", "pid": ...}
+- 子进程结束后输出 {"event": "done", "returncode": ..., "stdout_path": ..., "stderr_path": ...,
+  "cpu_ms": 子进程CPU时间（毫秒）, "max_rss_kb": 峰值常驻内存（KB）}
+
+子进程的stdout/stderr写入临时文件，由调用方读取后删除。
+"""
+
+import json
+import os
+import resource
+import runpy
+import sys
+import tempfile
+import traceback
+
+
+def _send(channel, message):
+    """向父进程发送一条消息"""
+    channel.write(json.dumps(message, ensure_ascii=False) + "\n")
+    channel.flush()
+
+
+def _apply_resource_limits(cpu_time, memory_mb):
+    """设置CPU时间和数据段内存限制
+
+    内存用RLIMIT_DATA而不是RLIMIT_AS：torch/BLAS等会预留远大于实际使用的虚拟地址空间，
+    限制地址空间会让它们无法启动。
+    """
+    if cpu_time:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 5))
+    if memory_mb:
+        size = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (size, size))
+
+
+def _run_child(job, stdout_path, stderr_path):
+    """在fork出的子进程中执行ai_toolkit命令，不会返回"""
+    code = 1
+    try:
+        os.setsid()
+        _apply_resource_limits(job.get("cpu_time"), job.get("memory_mb"))
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        out_fd = os.open(stdout_path, os.O_WRONLY | os.O_TRUNC)
+        err_fd = os.open(stderr_path, os.O_WRONLY | os.O_TRUNC)
+        os.dup2(devnull, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        sys.stdin = open(os.devnull, "r")
+
+        sys.argv = ["ai_toolkit", *job.get("args", [])]
+        try:
+            runpy.run_module("ai_toolkit", run_name="__main__", alter_sys=True)
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _handle_job(channel, job):
+    """执行单个任务"""
+    out_fd, stdout_path = tempfile.mkstemp(prefix="ai-toolkit-out-")
+    err_fd, stderr_path = tempfile.mkstemp(prefix="ai-toolkit-err-")
+    os.close(out_fd)
+    os.close(err_fd)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        _run_child(job, stdout_path, stderr_path)
+
+    _send(channel, {"event": "started", "pid": pid})
+
+    _, status, usage = os.wait4(pid, 0)
+    _send(channel, {
+        "event": "done",
+        "returncode": os.waitstatus_to_exitcode(status),
+        "stdout_path": stdout_path,
+        "stderr_path": stderr_path,
+        "cpu_ms": round((usage.ru_utime + usage.ru_stime) * 1000, 3),
+        "max_rss_kb": usage.ru_maxrss,
+    })
+
+
+def main():
+    # 协议使用原始stdout，之后把fd 1重定向到/dev/null，避免导入时的输出混入协议
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    try:
+        import ai_toolkit  # noqa: F401  预先导入，fork出的子进程直接复用
+    except BaseException as e:
+        _send(channel, {"event": "ready", "ok": False, "error": str(e)})
+        return 1
+
+    _send(channel, {"event": "ready", "ok": True})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        _handle_job(channel, json.loads(line))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
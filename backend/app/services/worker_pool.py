@@ -0,0 +1,265 @@
+"""
+常驻进程池 - 复用预先导入ai_toolkit的进程，省去每次请求的解释器启动和导入开销
+
+每个常驻进程运行 worker.py，收到命令后从已导入的父进程fork子进程执行，
+执行满 max_jobs 次后回收并替换，避免长期运行导致的内存增长。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.execute import ExecutionResult, ResourceLimits
+from app.services.artifacts import artifact_store
+
+WORKER_SCRIPT = Path(__file__).parent / "worker.py"
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerUnavailable(Exception):
+    """进程池不可用，调用方应回退到新进程执行（命令尚未开始执行）"""
+
+
+class WorkerJobFailed(Exception):
+    """命令已在常驻进程中开始执行后出错（进程崩溃、协议错误、读取输出失败等）
+
+    命令可能已经产生了副作用，调用方不能回退到新进程重新执行。
+    """
+
+
+class _Worker:
+    """单个常驻进程"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.jobs = 0
+        self.child_pid: Optional[int] = None
+        self.handed_off = False  # 当前任务是否已收到started（子进程已开始执行）
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def _receive(self, event: str) -> dict:
+        line = await self.process.stdout.readline()
+        if not line:
+            raise WorkerUnavailable("常驻进程已退出")
+        message = json.loads(line)
+        if message.get("event") != event:
+            raise WorkerUnavailable(f"常驻进程协议错误: {message}")
+        return message
+
+    async def wait_ready(self):
+        message = await self._receive("ready")
+        if not message.get("ok"):
+            raise WorkerUnavailable(message.get("error", "ai_toolkit导入失败"))
+
+    async def run(self, args: List[str], limits: ResourceLimits) -> ExecutionResult:
+        self.jobs += 1
+        self.handed_off = False
+        job = {"args": args, "cpu_time": limits.cpu_time, "memory_mb": limits.memory_mb}
+        self.process.stdin.write((json.dumps(job) + "\n").encode())
+        await self.process.stdin.drain()
+
+        started = await self._receive("started")
+        self.child_pid = started["pid"]
+        self.handed_off = True
+
+        timed_out = False
+        done_task = asyncio.ensure_future(self._receive("done"))
+        try:
+            # 超时只结束子进程组，常驻进程回收后照常返回done，可以继续使用
+            done = await asyncio.wait_for(asyncio.shield(done_task), timeout=limits.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.kill_child()
+            done = await done_task
+        except BaseException:
+            done_task.cancel()
+            raise
+        self.child_pid = None
+
+        # 超过内存上限的输出文件直接转为产物文件
+        limit = settings.OUTPUT_MEMORY_LIMIT
+        stdout, stdout_artifact = await run_in_threadpool(
+            artifact_store.capture_file, done["stdout_path"], limit
+        )
+        stderr, stderr_artifact = await run_in_threadpool(
+            artifact_store.capture_file, done["stderr_path"], limit
+        )
+
+        return ExecutionResult(
+            returncode=done["returncode"],
+            stdout=stdout,
+            stderr=stderr,
+            timed_out=timed_out,
+            stdout_artifact=stdout_artifact,
+            stderr_artifact=stderr_artifact,
+            cpu_ms=done.get("cpu_ms"),
+            max_rss_kb=done.get("max_rss_kb"),
+        )
+
+    def kill_child(self):
+        """结束正在执行的子进程组"""
+        if self.child_pid:
+            try:
+                os.killpg(self.child_pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def kill(self):
+        """强制结束常驻进程及其正在执行的子进程"""
+        self.kill_child()
+        self.child_pid = None
+        if self.alive:
+            self.process.kill()
+
+    async def close(self):
+        """关闭stdin让进程正常退出，超时则强制结束"""
+        if not self.alive:
+            return
+        try:
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), timeout=5)
+        except (asyncio.TimeoutError, OSError):
+            self.kill()
+
+
+class WorkerPool:
+    """常驻进程池"""
+
+    def __init__(self, size: int = 4, max_jobs: int = 100):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.started = False
+        self.available = False
+        self._ai_toolkit_path: Optional[Path] = None
+        self._env: Optional[Dict[str, str]] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._waiting = 0  # 正在等待空闲进程的调用数
+        self._tasks: set = set()
+
+    async def _spawn_worker(self) -> _Worker:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            str(WORKER_SCRIPT),
+            cwd=str(self._ai_toolkit_path),
+            env=self._env,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        worker = _Worker(process)
+        try:
+            await worker.wait_ready()
+        except BaseException:
+            worker.kill()
+            raise
+        return worker
+
+    async def _replace(self, worker: _Worker):
+        """回收进程并启动替换进程，放回空闲队列"""
+        await worker.close()
+        try:
+            self._idle.put_nowait(await self._spawn_worker())
+        except Exception:
+            logger.exception("常驻进程启动失败")
+            self.size -= 1
+            if self.size <= 0:
+                self.available = False
+                self._release_waiters()
+
+    def _release_waiters(self):
+        """进程池不再可用时唤醒等待空闲进程的调用，让它们回退到新进程执行"""
+        for _ in range(self._waiting):
+            self._idle.put_nowait(None)
+
+    def _replace_in_background(self, worker: _Worker):
+        task = asyncio.create_task(self._replace(worker))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self, ai_toolkit_path: Optional[Path], env: Dict[str, str]):
+        """启动进程池，失败时保持不可用状态，执行会回退到新进程"""
+        self.started = True
+        if not ai_toolkit_path or not hasattr(os, "fork") or self.size <= 0:
+            return
+
+        self._ai_toolkit_path = ai_toolkit_path
+        self._env = env
+        self._idle = asyncio.Queue()
+
+        results = await asyncio.gather(
+            *(self._spawn_worker() for _ in range(self.size)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error("常驻进程启动失败: %s", result, exc_info=result)
+            else:
+                self._idle.put_nowait(result)
+
+        self.size = self._idle.qsize()
+        self.available = self.size > 0
+
+    async def run(self, args: List[str], limits: Optional[ResourceLimits] = None) -> ExecutionResult:
+        """在常驻进程中执行命令"""
+        if not self.available:
+            raise WorkerUnavailable("进程池未启动")
+
+        self._waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self._waiting -= 1
+        if worker is None:
+            raise WorkerUnavailable("进程池已不可用")
+        if not worker.alive:
+            self._replace_in_background(worker)
+            raise WorkerUnavailable("常驻进程已退出")
+
+        try:
+            result = await worker.run(args, limits or ResourceLimits())
+        except BaseException as e:
+            # 协议状态未知（异常或请求取消），直接丢弃该进程
+            worker.kill()
+            self._replace_in_background(worker)
+            if not isinstance(e, Exception):
+                raise
+            # 收到started之后子进程已开始执行，回退会让命令执行两次
+            if worker.handed_off:
+                raise WorkerJobFailed(f"常驻进程执行中断: {e}") from e
+            if isinstance(e, WorkerUnavailable):
+                raise
+            raise WorkerUnavailable(f"常驻进程执行异常: {e}") from e
+
+        if worker.jobs >= self.max_jobs:
+            self._replace_in_background(worker)
+        else:
+            self._idle.put_nowait(worker)
+        return result
+
+    async def stop(self):
+        """关闭所有常驻进程"""
+        self.available = False
+        for task in list(self._tasks):
+            task.cancel()
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            if worker is not None:
+                await worker.close()
+        self._release_waiters()
+
+
+# 全局进程池实例
+worker_pool = WorkerPool(size=settings.WORKER_POOL_SIZE, max_jobs=settings.WORKER_MAX_JOBS)
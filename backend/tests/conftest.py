@@ -0,0 +1,39 @@
+"""
+测试配置 - 使用临时目录中的数据库和产物目录，关闭自动发现和常驻进程池
+"""
+
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="ai-toolkit-web-test-")
+os.environ.setdefault("DB_PATH", os.path.join(_TMP_DIR, "history.db"))
+os.environ.setdefault("ARTIFACTS_DIR", os.path.join(_TMP_DIR, "artifacts"))
+os.environ.setdefault("CATALOG_CACHE_PATH", os.path.join(_TMP_DIR, "catalog_cache.json"))
+os.environ.setdefault("CATALOG_DISCOVERY_ENABLED", "false")
+os.environ.setdefault("WORKER_POOL_ENABLED", "false")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.database import db
+from app.main import app
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """每个测试前清空历史记录和收藏"""
+    db.clear_history()
+    db.delete_favorites_batch([item["id"] for item in db.export_favorites()])
+    yield
+
+
+@pytest.fixture(scope="session")
+def client():
+    """整个测试会话共用一个应用实例（关闭时会释放数据库线程池，不能再次启动）"""
+    with TestClient(app) as test_client:
+        yield test_client
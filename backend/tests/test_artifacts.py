@@ -0,0 +1,57 @@
+"""
+产物清理：仍被历史记录、未过期的幂等记录引用的产物不删除，记录删除后才清理
+"""
+
+import os
+import time
+import uuid
+
+from app.core.database import db
+from app.services.artifacts import artifact_store
+
+
+def _write_artifact(artifact_id: str, age_hours: float) -> None:
+    artifact_store.directory.mkdir(parents=True, exist_ok=True)
+    path = artifact_store.directory / f"{artifact_id}.log"
+    path.write_text("full output")
+    mtime = time.time() - age_hours * 3600
+    os.utime(path, (mtime, mtime))
+
+
+def test_cleanup_keeps_referenced_artifacts(client):
+    referenced, orphan, fresh = (uuid.uuid4().hex for _ in range(3))
+    # 先写历史记录再创建文件：应用启动时的清理任务可能同时在运行
+    history_id = db.add_history("docker", "logs", {}, True, "head ... tail", artifact_id=referenced)
+    expired_age = artifact_store.ttl_hours + 1
+    _write_artifact(referenced, expired_age)
+    _write_artifact(orphan, expired_age)
+    _write_artifact(fresh, 0)
+
+    artifact_store.cleanup()
+    assert artifact_store.path_for(orphan) is None
+    assert artifact_store.path_for(fresh) is not None
+    assert artifact_store.path_for(referenced) is not None
+    response = client.get(f"/api/execute/artifacts/{referenced}")
+    assert response.status_code == 200 and response.text == "full output"
+
+    db.delete_history(history_id)
+    artifact_store.cleanup()
+    assert artifact_store.path_for(referenced) is None
+
+
+def test_cleanup_keeps_artifacts_of_idempotent_responses():
+    replayed, expired_key = uuid.uuid4().hex, uuid.uuid4().hex
+    key = f"key-{replayed}"
+    response = {"success": True, "message": "ok", "output": "head ... tail", "artifact_id": replayed}
+    db.save_idempotency_record(key, "fingerprint", response, ttl_seconds=3600, max_entries=10000)
+    # 已过期的幂等记录不再保留产物
+    db.save_idempotency_record(f"key-{expired_key}", "fingerprint",
+                               {**response, "artifact_id": expired_key}, ttl_seconds=-1, max_entries=10000)
+    expired_age = artifact_store.ttl_hours + 1
+    _write_artifact(replayed, expired_age)
+    _write_artifact(expired_key, expired_age)
+
+    artifact_store.cleanup()
+    assert artifact_store.path_for(replayed) is not None
+    assert artifact_store.path_for(expired_key) is None
+    assert db.get_idempotency_record(key)["response"]["artifact_id"] == replayed
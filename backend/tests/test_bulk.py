@@ -0,0 +1,97 @@
+"""
+批量操作：批量删除历史记录和收藏、导入导出收藏，条目数上限
+"""
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import db
+
+
+@pytest.fixture
+def small_bulk_limit(monkeypatch):
+    monkeypatch.setattr(settings, "BULK_MAX_ITEMS", 3)
+
+
+def test_bulk_delete_history_by_ids(client):
+    ids = [db.add_history("docker", "ps", {}, True, "x") for _ in range(4)]
+    response = client.post("/api/history/bulk-delete", json={"ids": ids[:2] + [999999]})
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 2
+
+    data = client.get("/api/history").json()
+    assert [item["id"] for item in data["items"]] == sorted(ids[2:], reverse=True)
+    assert data["total"] == 2
+
+
+def test_bulk_delete_history_by_filters(client):
+    db.add_history("docker", "ps", {}, True, "x")
+    db.add_history("docker", "ps", {}, False, "x")
+    db.add_history("git", "status", {}, False, "x")
+
+    response = client.post("/api/history/bulk-delete", json={"module": "docker", "success": False})
+    assert response.json()["deleted"] == 1
+    assert client.get("/api/history").json()["total"] == 2
+    assert client.get("/api/history", params={"module": "docker"}).json()["total"] == 1
+
+
+def test_bulk_delete_history_requires_ids_or_filters(client):
+    assert client.post("/api/history/bulk-delete", json={}).status_code == 400
+    assert client.post("/api/history/bulk-delete", json={"ids": [1], "module": "docker"}).status_code == 400
+
+
+def test_bulk_requests_over_limit_rejected(client, small_bulk_limit):
+    ids = [db.add_history("docker", "ps", {}, True, "x") for _ in range(4)]
+    assert client.post("/api/history/bulk-delete", json={"ids": ids}).status_code == 400
+    assert db.count_history() == 4
+
+    items = [{"module": "docker", "command": "ps", "name": f"f{i}"} for i in range(4)]
+    assert client.post("/api/history/favorites/import", json={"items": items}).status_code == 400
+    assert db.count_favorites() == 0
+
+    assert client.post("/api/history/favorites/bulk-delete", json={"ids": [1, 2, 3, 4]}).status_code == 400
+
+    # 上限以内正常执行
+    assert client.post("/api/history/bulk-delete", json={"ids": ids[:3]}).json()["deleted"] == 3
+
+
+def test_import_skips_duplicates(client):
+    db.add_favorite("docker", "ps", name="list", params={"all": True})
+    items = [
+        {"module": "docker", "command": "ps", "name": "list", "params": {"all": True}},
+        {"module": "docker", "command": "ps", "name": "list", "params": {"all": False}},
+        {"module": "git", "command": "status"},
+        {"module": "git", "command": "status"},
+    ]
+
+    response = client.post("/api/history/favorites/import", json={"items": items})
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert response.json()["skipped"] == 2
+    assert db.count_favorites() == 3
+
+    response = client.post("/api/history/favorites/import", json={"items": items, "skip_duplicates": False})
+    assert response.json()["imported"] == 4
+    assert db.count_favorites() == 7
+
+
+def test_export_import_round_trip(client):
+    db.add_favorite("docker", "ps", name="list", description="d", params={"all": True})
+    db.add_favorite("git", "status")
+    exported = client.get("/api/history/favorites/export").json()
+    assert exported["total"] == 2
+
+    # 重新导入导出结果时全部视为重复
+    response = client.post("/api/history/favorites/import", json={"items": exported["items"]})
+    assert response.json()["imported"] == 0
+
+    ids = [item["id"] for item in exported["items"]]
+    response = client.post("/api/history/favorites/bulk-delete", json={"ids": ids})
+    assert response.json()["deleted"] == 2
+
+    response = client.post("/api/history/favorites/import", json={"items": exported["items"]})
+    assert response.json()["imported"] == 2
+    restored = client.get("/api/history/favorites/export").json()["items"]
+    assert [(item["module"], item["name"], item["params"]) for item in restored] == [
+        (item["module"], item["name"], item["params"]) for item in exported["items"]
+    ]
@@ -0,0 +1,59 @@
+"""
+模块目录：预编码响应的强ETag，If-None-Match命中时返回304
+"""
+
+import json
+
+from app.services.catalog import EncodedBody, catalog
+
+
+def test_modules_response_has_strong_etag(client):
+    response = client.get("/api/modules")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.json() == catalog.modules
+
+    # 内容不变时ETag不变
+    assert client.get("/api/modules").headers["etag"] == etag
+
+
+def test_if_none_match_returns_304(client):
+    etag = client.get("/api/modules").headers["etag"]
+
+    response = client.get("/api/modules", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # 弱比较、多个ETag和*都视为命中
+    for header in (f"W/{etag}", f'"other", {etag}', "*"):
+        assert client.get("/api/modules", headers={"If-None-Match": header}).status_code == 304
+
+    assert client.get("/api/modules", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_module_and_category_etags(client):
+    module = catalog.modules[0]
+    response = client.get(f"/api/modules/{module['id']}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag != client.get("/api/modules").headers["etag"]
+    assert client.get(
+        f"/api/modules/{module['id']}", headers={"If-None-Match": etag}
+    ).status_code == 304
+
+    category = client.get(f"/api/modules/category/{module['category']}")
+    assert module in category.json()
+    assert client.get(
+        f"/api/modules/category/{module['category']}",
+        headers={"If-None-Match": category.headers["etag"]},
+    ).status_code == 304
+
+
+def test_etag_changes_with_content():
+    body = EncodedBody([{"id": "a"}])
+    assert json.loads(body.body) == [{"id": "a"}]
+    assert EncodedBody([{"id": "a"}]).etag == body.etag
+    assert EncodedBody([{"id": "b"}]).etag != body.etag
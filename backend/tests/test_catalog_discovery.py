@@ -0,0 +1,215 @@
+"""
+目录自动发现：指纹不变时读缓存、源码变化后重新内省、内省失败回退到静态目录，
+以及argparse / click定义的内省和与静态目录的合并
+"""
+
+import json
+import os
+import textwrap
+
+import pytest
+
+from app.services import catalog_discovery as discovery_module
+from app.services.catalog import catalog
+from app.services.catalog_discovery import CatalogDiscovery, merge_catalog, source_fingerprint
+from app.services.executor import build_command_args
+
+ARGPARSE_MAIN = """
+import argparse
+
+parser = argparse.ArgumentParser(prog="ai_toolkit")
+modules = parser.add_subparsers(dest="module")
+docker = modules.add_parser("docker", help="Docker tools")
+commands = docker.add_subparsers(dest="command")
+commands.add_parser("ps", help="list containers")
+build = commands.add_parser("build", help="build image")
+build.add_argument("path", help="build context")
+build.add_argument("--tag", help="image tag")
+build.add_argument("--no-cache", action="store_true", help="no cache")
+build.add_argument("--workers", type=int, default=2)
+{extra}
+parser.parse_args()
+"""
+
+CLICK_MAIN = """
+import click
+
+@click.group()
+def cli():
+    pass
+
+@cli.group(help="Docker tools")
+def docker():
+    pass
+
+@docker.command(help="build image")
+@click.argument("path")
+@click.option("--tag", help="image tag")
+@click.option("--no-cache", is_flag=True, help="no cache")
+@click.option("--platform", type=click.Choice(["amd64", "arm64"]), default="amd64")
+def build(path, tag, no_cache, platform):
+    pass
+
+cli()
+"""
+
+
+def _write_main(toolkit, source: str):
+    (toolkit / "src" / "ai_toolkit" / "__main__.py").write_text(textwrap.dedent(source))
+
+
+@pytest.fixture
+def toolkit(tmp_path, monkeypatch):
+    """假ai_toolkit，默认用argparse定义 docker ps / docker build"""
+    package = tmp_path / "toolkit" / "src" / "ai_toolkit"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    _write_main(tmp_path / "toolkit", ARGPARSE_MAIN.format(extra=""))
+    monkeypatch.setattr(discovery_module, "get_ai_toolkit_path", lambda: tmp_path / "toolkit")
+    yield tmp_path / "toolkit"
+    catalog.load_static()
+
+
+def _discovery(tmp_path) -> CatalogDiscovery:
+    return CatalogDiscovery(str(tmp_path / "cache" / "catalog.json"), timeout=30)
+
+
+def _params(module_id: str, command_id: str) -> dict:
+    return {param["name"]: param for param in catalog.find_command(module_id, command_id)["params"]}
+
+
+@pytest.mark.anyio
+async def test_cache_hit_when_fingerprint_unchanged(toolkit, tmp_path):
+    discovery = _discovery(tmp_path)
+    stats = await discovery.refresh()
+    assert stats["introspections"] == 1 and stats["last_error"] is None
+    assert catalog.source == "discovered"
+    cached = json.loads(discovery.cache_path.read_text())
+    assert cached["fingerprint"] == source_fingerprint(toolkit)
+
+    # 同一实例：指纹未变，不再内省
+    assert (await discovery.refresh())["introspections"] == 1
+
+    # 新实例（重启）：直接读缓存，不启动子进程
+    catalog.load_static()
+    restarted = _discovery(tmp_path)
+    assert restarted.load_cached()
+    assert restarted.introspections == 0
+    assert catalog.source == "discovered"
+    assert "tag" in _params("docker", "build")
+
+
+@pytest.mark.anyio
+async def test_rebuild_after_source_change(toolkit, tmp_path):
+    discovery = _discovery(tmp_path)
+    await discovery.refresh()
+    fingerprint = discovery.fingerprint
+
+    _write_main(toolkit, ARGPARSE_MAIN.format(extra='commands.add_parser("prune", help="remove unused")'))
+    main = toolkit / "src" / "ai_toolkit" / "__main__.py"
+    stat = main.stat()
+    os.utime(main, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    stats = await discovery.refresh()
+    assert stats["introspections"] == 2
+    assert discovery.fingerprint != fingerprint
+    assert catalog.find_command("docker", "prune") is not None
+
+    # 旧缓存不再匹配
+    assert not _discovery(tmp_path)._read_cache(fingerprint)
+
+
+@pytest.mark.anyio
+async def test_falls_back_to_static_when_introspection_fails(toolkit, tmp_path):
+    _write_main(toolkit, "raise RuntimeError('broken toolkit')")
+    discovery = _discovery(tmp_path)
+    stats = await discovery.refresh()
+    assert "broken toolkit" in stats["last_error"]
+    assert catalog.source == "static"
+    assert not discovery.cache_path.exists()
+
+    # 同一份源码不重复尝试
+    assert (await discovery.refresh())["introspections"] == 1
+
+
+@pytest.mark.anyio
+async def test_falls_back_to_static_when_nothing_found(toolkit, tmp_path):
+    _write_main(toolkit, "print('no cli here')")
+    await _discovery(tmp_path).refresh()
+    assert catalog.source == "static"
+
+
+@pytest.mark.anyio
+async def test_argparse_introspection(toolkit, tmp_path):
+    discovery = _discovery(tmp_path)
+    await discovery.refresh()
+    assert discovery.framework == "argparse"
+
+    params = _params("docker", "build")
+    assert params["path"]["positional"] and params["path"]["required"]
+    assert params["no-cache"]["type"] == "boolean" and params["no-cache"]["flag"]
+    assert params["workers"]["type"] == "number" and params["workers"]["default"] == 2
+    # 静态目录的中文描述优先
+    assert params["path"]["description"] == "Dockerfile路径"
+
+    args = build_command_args("docker", "build", {"path": ".", "tag": "x", "no-cache": True})
+    assert args == ["docker", "build", ".", "--tag", "x", "--no-cache"]
+    assert build_command_args("docker", "build", {"path": ".", "no-cache": False}) == ["docker", "build", "."]
+
+
+@pytest.mark.anyio
+async def test_click_introspection(toolkit, tmp_path):
+    _write_main(toolkit, CLICK_MAIN)
+    discovery = _discovery(tmp_path)
+    await discovery.refresh()
+    assert discovery.framework == "click"
+
+    params = _params("docker", "build")
+    assert params["path"]["positional"] and params["path"]["required"]
+    assert params["no-cache"]["flag"]
+    assert params["platform"]["type"] == "select"
+    assert params["platform"]["options"] == ["amd64", "arm64"]
+
+
+def test_merge_overlays_static_metadata():
+    static = [
+        {
+            "id": "docker", "name": "Docker", "description": "容器", "category": "cloud",
+            "max_concurrency": 2,
+            "commands": [
+                {"id": "ps", "name": "容器列表", "description": "列出容器", "category": "docker",
+                 "cache_ttl": 5, "params": []},
+                {"id": "build", "name": "构建", "description": "构建镜像", "category": "docker",
+                 "params": [{"name": "file", "type": "file", "description": "Dockerfile", "required": False}]},
+            ],
+        },
+        {"id": "cloud", "name": "云", "description": "云部署", "category": "cloud",
+         "commands": [{"id": "cost", "name": "成本", "description": "", "category": "cloud", "params": []}]},
+    ]
+    found = [
+        {"id": "docker", "description": "Docker tools", "commands": [
+            {"id": "ps", "description": "list", "params": [
+                {"name": "all", "type": "boolean", "description": "show all", "required": False, "flag": True},
+            ]},
+            {"id": "prune", "description": "remove unused", "params": []},
+        ]},
+        {"id": "new", "description": "new module", "commands": []},
+    ]
+
+    modules = merge_catalog(found, static)
+    assert [module["id"] for module in modules] == ["docker", "cloud"]
+
+    docker = modules[0]
+    assert docker["name"] == "Docker" and docker["max_concurrency"] == 2
+    # 发现的命令在前，未发现的静态命令保留在后
+    assert [command["id"] for command in docker["commands"]] == ["ps", "prune", "build"]
+    ps, prune, build = docker["commands"]
+    assert ps["name"] == "容器列表" and ps["cache_ttl"] == 5
+    assert ps["params"] == [
+        {"name": "all", "type": "boolean", "description": "show all", "required": False, "flag": True},
+    ]
+    assert prune["name"] == "prune" and prune["description"] == "remove unused"
+    assert build == static[0]["commands"][1]
+
+    # 未发现的静态模块原样保留，没有命令的发现模块不加入
+    assert modules[1] == static[1]
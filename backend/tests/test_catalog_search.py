@@ -0,0 +1,114 @@
+"""
+目录搜索：前缀匹配、中文匹配、按相关度排序
+"""
+
+from app.services.catalog_search import CatalogSearchIndex
+
+MODULES = [
+    {
+        "id": "docker", "name": "Docker管理", "description": "管理容器和镜像",
+        "commands": [
+            {"id": "ps", "name": "列出容器", "description": "列出正在运行的容器", "params": [
+                {"name": "all", "description": "包括已停止的容器"},
+            ]},
+            {"id": "run", "name": "运行镜像", "description": "从镜像启动容器", "params": [
+                {"name": "image", "description": "镜像名称"},
+            ]},
+        ],
+    },
+    {
+        "id": "rag", "name": "知识库", "description": "检索增强生成，支持docker部署",
+        "commands": [
+            {"id": "search", "name": "搜索知识库", "description": "按语义搜索文档", "params": [
+                {"name": "query", "description": "搜索内容"},
+                {"name": "top", "description": "返回条数"},
+            ]},
+        ],
+    },
+]
+
+
+def _keys(items):
+    return [(item["type"], item["module"], item.get("command"), item.get("param")) for item in items]
+
+
+def test_prefix_match():
+    index = CatalogSearchIndex(MODULES)
+    items, total = index.search("dock")
+    assert ("module", "docker", None, None) in _keys(items)
+    assert total == len(items)
+
+    items, _ = index.search("ima")
+    assert ("param", "docker", "run", "image") in _keys(items)
+
+    assert index.search("dockerx") == ([], 0)
+
+
+def test_exact_match_scores_above_prefix():
+    index = CatalogSearchIndex(MODULES)
+    exact = {item["module"]: item["score"] for item in index.search("docker", doc_type="module")[0]}
+    prefix = {item["module"]: item["score"] for item in index.search("dock", doc_type="module")[0]}
+    assert prefix["docker"] < exact["docker"]
+
+
+def test_cjk_match():
+    index = CatalogSearchIndex(MODULES)
+    items, _ = index.search("知识库")
+    assert _keys(items)[:2] == [
+        ("module", "rag", None, None),
+        ("command", "rag", "search", None),
+    ]
+
+    # 单个汉字用单字匹配
+    items, _ = index.search("镜")
+    assert ("command", "docker", "run", None) in _keys(items)
+
+    # 中英混合时每个词都必须命中
+    items, _ = index.search("docker 容器")
+    assert {item["module"] for item in items} == {"docker"}
+
+    assert index.search("天气") == ([], 0)
+
+
+def test_ranking_order():
+    index = CatalogSearchIndex(MODULES)
+    items, total = index.search("docker")
+    # ID/名称命中高于描述命中
+    assert _keys(items) == [
+        ("module", "docker", None, None),
+        ("module", "rag", None, None),
+    ]
+    assert items[0]["score"] > items[1]["score"]
+    assert total == 2
+
+    # 名称命中 > 描述命中；同样命中描述时模块 > 命令 > 参数
+    items, _ = index.search("容器")
+    assert _keys(items) == [
+        ("command", "docker", "ps", None),
+        ("module", "docker", None, None),
+        ("command", "docker", "run", None),
+        ("param", "docker", "ps", "all"),
+    ]
+    scores = [item["score"] for item in items]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_limit_and_type_filter():
+    index = CatalogSearchIndex(MODULES)
+    items, total = index.search("容器", limit=1)
+    assert len(items) == 1
+    assert total > 1
+
+    items, _ = index.search("容器", doc_type="param")
+    assert _keys(items) == [("param", "docker", "ps", "all")]
+
+
+def test_search_endpoint(client):
+    response = client.get("/api/modules/search", params={"q": "dock"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["query"] == "dock"
+    assert data["items"][0]["module"] == "docker"
+    assert data["total"] >= len(data["items"])
+
+    assert client.get("/api/modules/search", params={"q": "x", "type": "bad"}).status_code == 422
@@ -0,0 +1,109 @@
+"""
+数据库连接池：连接复用（后进先出）、用尽时等待归还，WAL模式下读写并发
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import HistoryDatabase
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = HistoryDatabase(str(tmp_path / "pool.db"), pool_size=3)
+    yield database
+    database.close()
+
+
+def test_connection_pragmas(database):
+    with database._connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -settings.DB_CACHE_SIZE_KB
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # INCREMENTAL
+
+
+def test_connections_reused_last_in_first_out(database):
+    with database._connection() as first:
+        with database._connection() as second:
+            assert first is not second
+    assert database._created == 2
+
+    # 最后归还的连接最先被取出，不再新建连接
+    with database._connection() as conn:
+        assert conn is first
+    for _ in range(10):
+        database.count_history()
+    assert database._created == 2
+
+
+def test_exhausted_pool_waits_for_return(tmp_path):
+    database = HistoryDatabase(str(tmp_path / "single.db"), pool_size=1)
+    try:
+        result = []
+        with database._connection():
+            reader = threading.Thread(target=lambda: result.append(database.count_history()))
+            reader.start()
+            reader.join(timeout=0.2)
+            # 唯一的连接被占用，等待归还
+            assert reader.is_alive()
+        reader.join(timeout=5)
+        assert result == [0]
+        assert database._created == 1
+    finally:
+        database.close()
+
+
+def test_readers_not_blocked_by_open_write(database):
+    database.add_history("docker", "ps", {}, True, "committed")
+    with database._connection() as conn:
+        conn.execute(
+            "INSERT INTO history (module, command, params, success, output, timestamp) "
+            "VALUES ('docker', 'ps', '{}', 1, 'pending', '2026-01-01T00:00:00')"
+        )
+        # 写事务未提交：WAL模式下其他连接照常读取已提交的数据，不等待写锁
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            items = executor.submit(database.get_history).result(timeout=2)
+        assert [item["output"] for item in items] == ["committed"]
+    assert database.count_history() == 2
+
+
+def test_concurrent_readers_and_writer(database):
+    writes = 50
+    errors = []
+    done = threading.Event()
+
+    def write():
+        try:
+            for i in range(writes):
+                database.add_history("docker", "ps", {"i": i}, True, f"run {i}")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    def read():
+        last = 0
+        try:
+            while not done.is_set():
+                count = database.count_history()
+                assert count >= last  # 读到的总是某个已提交的状态
+                last = count
+                database.get_history(limit=10)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert errors == []
+    assert database.count_history() == writes
+    # 5个线程共用连接池，连接数不超过上限
+    assert database._created <= database.pool_size
@@ -0,0 +1,129 @@
+"""
+批量执行：并发不超过fan_out，按完成顺序输出NDJSON和汇总行，历史记录一次写入；
+客户端断开后已开始的条目仍会执行完并记录
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from app.api import execute
+from app.core.database import async_db
+from app.models.execute import BatchExecuteRequest, ExecutionResult
+from app.services.history_writer import HistoryWriter
+from app.services.result_cache import ResultCache
+
+
+class _Runs:
+    """假run_command：按参数model中的秒数等待，记录并发数和执行过的条目"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.finished: List[str] = []
+
+    async def run_command(self, module, command, params, ai_toolkit_path, limits):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(float(params["model"]))
+        finally:
+            self.running -= 1
+        self.finished.append(params["model"])
+        return ExecutionResult(returncode=0, stdout=f"ran {params['model']}", stderr="")
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    runs = _Runs()
+
+    @asynccontextmanager
+    async def slot(*args: Any, **kwargs: Any):
+        yield 0.0
+
+    monkeypatch.setattr(execute, "run_command", runs.run_command)
+    monkeypatch.setattr(execute, "_scheduler_slot", slot)
+    monkeypatch.setattr(execute, "result_cache", ResultCache())
+    monkeypatch.setattr(execute, "get_ai_toolkit_path", lambda: Path("."))
+    return runs
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """不经过写缓冲直接写入，记录每次add_history_batch的条数"""
+    calls: List[int] = []
+    add_history_batch = async_db.add_history_batch
+
+    async def spy(records):
+        calls.append(len(records))
+        return await add_history_batch(records)
+
+    monkeypatch.setattr(async_db, "add_history_batch", spy)
+    monkeypatch.setattr(execute, "history_writer", HistoryWriter(enabled=False))
+    return calls
+
+
+def _items(*delays: float) -> List[Dict[str, Any]]:
+    # models info 需要必填参数model，这里用它传递等待秒数（各条目不同，不会被缓存或合并）
+    return [{"module": "models", "command": "info", "params": {"model": str(delay)}} for delay in delays]
+
+
+def _lines(response) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_results_in_completion_order_with_summary(client, runs, batches):
+    response = client.post("/api/execute/batch", json={"items": _items(0.3, 0.2, 0.1, 0), "fan_out": 4})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = _lines(response)
+    assert [line["index"] for line in lines[:-1]] == [3, 2, 1, 0]
+    assert [line["output"] for line in lines[:-1]] == ["ran 0", "ran 0.1", "ran 0.2", "ran 0.3"]
+    assert lines[-1] == {"done": True, "total": 4, "succeeded": 4}
+
+    # 全部记录在一次add_history_batch中写入
+    assert batches == [4]
+
+
+def test_concurrency_limited_by_fan_out(client, runs, batches):
+    items = _items(*[0.05 + i / 1000 for i in range(6)])
+    response = client.post("/api/execute/batch", json={"items": items, "fan_out": 2})
+    assert _lines(response)[-1] == {"done": True, "total": 6, "succeeded": 6}
+    assert runs.max_running == 2
+    assert batches == [6]
+
+
+class _Recorder:
+    """代替history_writer，记录add_many调用"""
+
+    def __init__(self):
+        self.calls: List[List[Dict[str, Any]]] = []
+
+    async def add_many(self, records):
+        self.calls.append(list(records))
+
+
+@pytest.mark.anyio
+async def test_disconnect_records_started_items(runs, monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr(execute, "history_writer", recorder)
+
+    request = BatchExecuteRequest(items=_items(0, 0.2, 0.21, 0.22), fan_out=2)
+    response = await execute.execute_batch(request)
+    stream = response.body_iterator
+    first = json.loads(await stream.__anext__())
+    assert first["index"] == 0
+    # 客户端断开
+    await stream.aclose()
+
+    await asyncio.wait(set(execute._background_tasks))
+    # 断开时正在运行的条目执行完并和已完成的条目一起记录，尚未开始的条目不执行
+    assert len(recorder.calls) == 1
+    recorded = sorted(record["params"]["model"] for record in recorder.calls[0])
+    assert recorded == sorted(runs.finished)
+    assert "0.2" in recorded and "0.22" not in recorded
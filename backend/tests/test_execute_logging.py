@@ -0,0 +1,32 @@
+"""
+执行日志：使用logging记录，不输出命令的完整输出
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from app.api import execute
+from app.models.execute import ExecuteRequest, ExecutionResult
+
+
+@pytest.mark.anyio
+async def test_execution_logs_summary_only(monkeypatch, caplog, capsys):
+    records = []
+
+    async def fake_execute(request, ai_toolkit_path, bounded=True):
+        return ExecutionResult(returncode=0, stdout="secret stdout", stderr="secret stderr"), False
+
+    async def add(**record):
+        records.append(record)
+
+    monkeypatch.setattr(execute, "_execute", fake_execute)
+    monkeypatch.setattr(execute.history_writer, "add", add)
+    caplog.set_level(logging.DEBUG, logger="app")
+
+    response = await execute._execute_and_record(ExecuteRequest(module="docker", command="ps"), Path("."))
+    assert response.success and records[0]["output"] == "secret stdout"
+    assert "docker ps" in caplog.text
+    assert "secret" not in caplog.text
+    assert capsys.readouterr().out == ""
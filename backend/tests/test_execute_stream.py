@@ -0,0 +1,116 @@
+"""
+流式执行：客户端断开时结束子进程并仍记录历史，调度队列已满或开始前出错时不记录
+"""
+
+import asyncio
+import json
+import os
+import textwrap
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+import pytest
+
+from app.api import execute
+from app.models.execute import ExecuteRequest
+from app.services.scheduler import SchedulerBusy
+
+
+class _Recorder:
+    """代替history_writer，记录add调用"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    async def add(self, **record: Any):
+        self.records.append(record)
+
+
+@pytest.fixture
+def toolkit(tmp_path, monkeypatch):
+    """每0.05秒输出一行、共输出40行的假ai_toolkit"""
+    package = tmp_path / "src" / "ai_toolkit"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "__main__.py").write_text(textwrap.dedent(f"""
+        import os, time
+        with open({str(tmp_path / "pid")!r}, "w") as f:
+            f.write(str(os.getpid()))
+        for i in range(40):
+            print(f"line {{i}}", flush=True)
+            time.sleep(0.05)
+    """))
+    monkeypatch.setattr(execute, "get_ai_toolkit_path", lambda: tmp_path)
+    recorder = _Recorder()
+    monkeypatch.setattr(execute, "history_writer", recorder)
+    return recorder
+
+
+def _events(chunks: List[str]) -> List[str]:
+    return [chunk.split("\n", 1)[0].removeprefix("event: ") for chunk in chunks]
+
+
+@pytest.mark.anyio
+async def test_disconnect_still_records(toolkit, monkeypatch, tmp_path):
+    invalidated = []
+    monkeypatch.setattr(execute.result_cache, "invalidate_targets", invalidated.append)
+
+    response = await execute.execute_command_stream(ExecuteRequest(module="docker", command="ps"))
+    stream = response.body_iterator
+    first = await stream.__anext__()
+    assert first.startswith("event: stdout")
+    await stream.aclose()  # 客户端断开
+
+    # 断开后子进程已被结束并回收
+    pid = int((tmp_path / "pid").read_text())
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+    await asyncio.gather(*execute._background_tasks)
+    assert len(toolkit.records) == 1
+    record = toolkit.records[0]
+    assert record["module"] == "docker" and record["command"] == "ps"
+    assert "line 0" in record["output"]
+    assert invalidated == [[]]
+
+
+@pytest.mark.anyio
+async def test_completed_stream_records_before_done(toolkit):
+    response = await execute.execute_command_stream(ExecuteRequest(module="docker", command="ps"))
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert _events(chunks)[-1] == "done"
+    assert json.loads(chunks[-1].split("data: ", 1)[1])["success"] is True
+    assert len(toolkit.records) == 1
+    assert toolkit.records[0]["output"].count("line") == 40
+
+
+@pytest.mark.anyio
+async def test_scheduler_busy_is_429_event(toolkit, monkeypatch):
+    @asynccontextmanager
+    async def busy_slot(*args: Any, **kwargs: Any):
+        raise SchedulerBusy("队列已满", retry_after=3)
+        yield
+
+    monkeypatch.setattr(execute, "_scheduler_slot", busy_slot)
+    response = await execute.execute_command_stream(ExecuteRequest(module="docker", command="ps"))
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert _events(chunks) == ["busy"]
+    data = json.loads(chunks[0].split("data: ", 1)[1])
+    assert data["status_code"] == 429 and data["retry_after"] == 3
+    assert toolkit.records == []
+
+
+@pytest.mark.anyio
+async def test_error_before_spawn_is_error_event(toolkit, monkeypatch):
+    @asynccontextmanager
+    async def broken_slot(*args: Any, **kwargs: Any):
+        raise RuntimeError("调度器异常")
+        yield
+
+    monkeypatch.setattr(execute, "_scheduler_slot", broken_slot)
+    response = await execute.execute_command_stream(ExecuteRequest(module="docker", command="ps"))
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert _events(chunks) == ["error"]
+    data = json.loads(chunks[0].split("data: ", 1)[1])
+    assert data["status_code"] == 500 and data["detail"] == "调度器异常"
+    assert toolkit.records == []
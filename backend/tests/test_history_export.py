@@ -0,0 +1,127 @@
+"""
+历史记录导出：NDJSON / CSV / gzip，按行数和输出大小分段读取
+"""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import async_db, db
+from app.services import history_export
+
+
+def _add(count: int, output_size: int = 10, module: str = "docker") -> list:
+    return [
+        db.add_history(module, "ps", {"n": i}, i % 2 == 0, f"{i}:" + "x" * output_size)
+        for i in range(count)
+    ]
+
+
+def test_ndjson_export(client):
+    ids = _add(3)
+    response = client.get("/api/history/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="history-' in response.headers["content-disposition"]
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == ids
+    assert list(rows[0]) == history_export.EXPORT_FIELDS
+    assert rows[1]["params"] == {"n": 1}
+    assert rows[1]["success"] is False
+    assert rows[1]["output"] == "1:" + "x" * 10
+
+
+def test_csv_export(client):
+    ids = _add(2)
+    db.add_history("git", "status", {}, True, 'quoted "text",\nnew line')
+    response = client.get("/api/history/export", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows[:2]] == ids
+    assert json.loads(rows[0]["params"]) == {"n": 0}
+    assert rows[2]["output"] == 'quoted "text",\nnew line'
+
+
+def test_empty_csv_has_header(client):
+    response = client.get("/api/history/export", params={"format": "csv"})
+    assert response.text.splitlines() == [",".join(history_export.EXPORT_FIELDS)]
+    assert client.get("/api/history/export").text == ""
+
+
+def test_gzip_export(client):
+    _add(3)
+    plain = client.get("/api/history/export").content
+    response = client.get("/api/history/export", params={"gzip": True})
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+    assert gzip.decompress(response.content) == plain
+
+
+def test_filters_and_preview(client):
+    _add(2, output_size=settings.HISTORY_PREVIEW_CHARS * 2)
+    _add(1, module="git")
+    response = client.get("/api/history/export", params={"module": "git"})
+    assert [json.loads(line)["module"] for line in response.text.splitlines()] == ["git"]
+
+    response = client.get("/api/history/export", params={"module": "docker", "include_output": False})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 2
+    assert all(len(row["output"]) == settings.HISTORY_PREVIEW_CHARS for row in rows)
+    assert rows[0]["output_size"] == settings.HISTORY_PREVIEW_CHARS * 2 + 2
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """记录每段读取的行数"""
+    sizes = []
+    read_chunk = async_db.export_history_chunk
+
+    async def export_history_chunk(*args, **kwargs):
+        rows = await read_chunk(*args, **kwargs)
+        sizes.append(len(rows))
+        return rows
+
+    monkeypatch.setattr(history_export.async_db, "export_history_chunk", export_history_chunk)
+    return sizes
+
+
+async def _export(**kwargs) -> bytes:
+    return b"".join([data async for data in history_export.export_history("ndjson", **kwargs)])
+
+
+@pytest.mark.anyio
+async def test_chunks_by_row_count(monkeypatch, chunks):
+    monkeypatch.setattr(settings, "HISTORY_EXPORT_CHUNK", 2)
+    ids = _add(5)
+    data = await _export()
+    assert [json.loads(line)["id"] for line in data.splitlines()] == ids
+    assert chunks == [2, 2, 1, 0]
+
+
+@pytest.mark.anyio
+async def test_chunks_by_output_size(monkeypatch, chunks):
+    # 每条输出约1000字符，每段最多读到累计2500字符为止
+    monkeypatch.setattr(settings, "HISTORY_EXPORT_CHUNK_CHARS", 2500)
+    ids = _add(7, output_size=1000)
+    data = await _export()
+    assert [json.loads(line)["id"] for line in data.splitlines()] == ids
+    assert chunks == [3, 3, 1, 0]
+
+    # 只导出预览时每条只计预览长度，一段即可读完
+    chunks.clear()
+    await _export(include_output=False)
+    assert chunks == [7, 0]
+
+
+def test_single_large_output_is_one_chunk():
+    ids = _add(2, output_size=100)
+    rows = db.export_history_chunk(100, max_chars=10)
+    assert [row["id"] for row in rows] == ids[:1]
+    rows = db.export_history_chunk(100, after=(rows[0]["created_at"], rows[0]["id"]), max_chars=10)
+    assert [row["id"] for row in rows] == ids[1:]
@@ -0,0 +1,94 @@
+"""
+旧版本数据库升级：启动时不补建全文索引、不迁移输出，后台按id分批进行，
+迁移前后读取和全文搜索结果一致
+"""
+
+import sqlite3
+
+from app.core.database import HistoryDatabase
+
+
+def _old_database(path, rows: int) -> None:
+    """生成旧版本数据库：输出保存在history.output中，没有history_fts_source视图"""
+    database = HistoryDatabase(str(path), pool_size=1)
+    database.close()
+    conn = sqlite3.connect(str(path))
+    conn.execute("DROP VIEW history_fts_source")
+    conn.executemany(
+        "INSERT INTO history (timestamp, module, command, params, success, output) VALUES (?, ?, ?, ?, ?, ?)",
+        [("2024-01-01T00:00:00", "docker", "ps", "{}", 1, f"container-{i} " + "x" * 300) for i in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_migration_runs_in_batches(tmp_path):
+    path = tmp_path / "old.db"
+    _old_database(path, 25)
+
+    database = HistoryDatabase(str(path), pool_size=1)
+    # 打开时不迁移也不建立索引，读取兼容旧格式
+    with database._connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM history WHERE output IS NOT NULL").fetchone()[0] == 25
+    assert database.pending_migrations() == ["history_fts"]
+    before = database.get_history(limit=100)
+    assert len(before[0]["output"]) == 200 and before[0]["output_truncated"]
+    assert database.search_history('"container-7"') == []
+
+    # 补建索引必须在输出迁移之前完成
+    assert [database.backfill_history_fts_batch(batch_size=10) for _ in range(4)] == [10, 10, 5, 0]
+    assert database.pending_migrations() == []
+    assert len(database.search_history('"container-7"')) == 1
+
+    last_id, batches, migrated = 0, 0, 0
+    while True:
+        last_id, count = database.migrate_history_output_batch(last_id, batch_size=10)
+        if last_id is None:
+            break
+        batches += 1
+        migrated += count
+    assert (batches, migrated) == (3, 25)
+
+    with database._connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM history WHERE output IS NOT NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM history_output").fetchone()[0] == 25
+    assert database.get_history(limit=100) == before
+    item = database.get_history_item(before[0]["id"])
+    assert item["output"].startswith("container-24 ") and len(item["output"]) == 313
+    # 全文索引没有重复也没有丢失
+    assert len(database.search_history('"container-7"')) == 1
+    assert len(database.search_history('"container"')) == 25
+    with database._connection() as conn:
+        conn.execute("INSERT INTO history_fts (history_fts) VALUES ('integrity-check')")
+
+    database.delete_history(before[0]["id"])
+    assert len(database.search_history('"container"')) == 24
+    database.close()
+
+
+def test_fts_backfill_with_concurrent_writes(tmp_path):
+    """补建期间删除未建索引的行、插入新行，索引保持一致且没有重复"""
+    path = tmp_path / "old.db"
+    _old_database(path, 20)
+    database = HistoryDatabase(str(path), pool_size=1)
+    ids = [item["id"] for item in database.get_history(limit=100)]
+
+    assert database.backfill_history_fts_batch(batch_size=5) == 5
+    database.delete_history(max(ids))  # 尚未建立索引
+    database.delete_history(min(ids))  # 已建立索引
+    new_id = database.add_history("docker", "ps", {}, True, "container-new")  # 由触发器建立索引
+
+    while database.backfill_history_fts_batch(batch_size=5):
+        pass
+    with database._connection() as conn:
+        conn.execute("INSERT INTO history_fts (history_fts) VALUES ('integrity-check')")
+    assert len(database.search_history('"container"')) == 19
+    assert [item["id"] for item in database.search_history('"container-new"')] == [new_id]
+    database.close()
+
+
+def test_new_database_has_no_pending_migrations(tmp_path):
+    database = HistoryDatabase(str(tmp_path / "new.db"), pool_size=1)
+    assert database.pending_migrations() == []
+    assert database.get_storage_stats()["pending_migrations"] == []
+    database.close()
@@ -0,0 +1,61 @@
+"""
+游标翻页：按 (created_at, id) 翻页，翻页期间新增记录不会造成重复或遗漏
+"""
+
+from app.core.database import db
+
+
+def _pages(client, path: str, limit: int) -> list:
+    pages = []
+    cursor = None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        data = client.get(path, params=params).json()
+        pages.append([item["id"] for item in data["items"]])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_history_cursor_paging(client):
+    ids = [db.add_history("docker", "ps", {}, True, f"run {i}") for i in range(7)]
+    pages = _pages(client, "/api/history", 3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == sorted(ids, reverse=True)
+
+
+def test_history_cursor_stable_under_inserts(client):
+    ids = [db.add_history("docker", "ps", {}, True, f"run {i}") for i in range(6)]
+    first = client.get("/api/history", params={"limit": 3}).json()
+    # 翻页期间新增的记录排在最前面，不影响后续页
+    db.add_history("docker", "ps", {}, True, "new")
+    second = client.get("/api/history", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    seen = [item["id"] for item in first["items"] + second["items"]]
+    assert seen == sorted(ids, reverse=True)
+    assert second["next_cursor"] is None
+
+
+def test_history_cursor_with_filter(client):
+    for i in range(4):
+        db.add_history("docker", "ps", {}, True, f"run {i}")
+        db.add_history("git", "status", {}, True, f"run {i}")
+    first = client.get("/api/history", params={"limit": 3, "module": "git"}).json()
+    second = client.get(
+        "/api/history", params={"limit": 3, "module": "git", "cursor": first["next_cursor"]}
+    ).json()
+    items = first["items"] + second["items"]
+    assert len(items) == 4 and {item["module"] for item in items} == {"git"}
+
+
+def test_favorites_cursor_paging(client):
+    ids = [
+        client.post("/api/history/favorites", json={"module": "docker", "command": f"cmd{i}"}).json()["id"]
+        for i in range(5)
+    ]
+    pages = _pages(client, "/api/history/favorites", 2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted(sum(pages, [])) == sorted(ids)
+
+
+def test_invalid_cursor_rejected(client):
+    assert client.get("/api/history", params={"cursor": "not-a-cursor"}).status_code == 400
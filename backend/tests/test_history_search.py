@@ -0,0 +1,63 @@
+"""
+历史记录全文搜索：trigram索引匹配、短词按子串匹配、过滤条件
+"""
+
+from app.core.database import db
+
+
+def _search(client, q, **params):
+    response = client.get("/api/history/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _seed():
+    db.add_history("model", "train", {"epochs": 3}, True, "模型训练完成 status ok")
+    db.add_history("docker", "ps", {}, True, "CONTAINER ID   IMAGE\nabc123   postgres")
+    db.add_history("db", "backup", {"target": "s3"}, False, "Error: connection refused")
+
+
+def test_search_long_terms_ranked_with_snippet(client):
+    _seed()
+    result = _search(client, "postgres")
+    assert [item["command"] for item in result["items"]] == ["ps"]
+    assert "<mark>" in result["items"][0]["snippet"]
+    assert result["items"][0]["score"] > 0
+
+    assert _search(client, "connection refused")["items"][0]["command"] == "backup"
+    assert _search(client, "postgres refused")["items"] == []
+
+
+def test_search_short_terms_fall_back_to_substring(client):
+    _seed()
+    result = _search(client, "模型")
+    assert [item["command"] for item in result["items"]] == ["train"]
+    assert "<mark>模型</mark>" in result["items"][0]["snippet"]
+
+    assert [item["command"] for item in _search(client, "OK")["items"]] == ["train"]
+    assert [item["command"] for item in _search(client, "s3")["items"]] == ["backup"]
+    assert [item["command"] for item in _search(client, "ep")["items"]] == ["train"]
+    # 短词匹配命令和参数
+    assert [item["command"] for item in _search(client, "ps")["items"]] == ["ps"]
+
+
+def test_search_mixed_terms_and_filters(client):
+    _seed()
+    assert [item["command"] for item in _search(client, "训练完成 ok")["items"]] == ["train"]
+    assert _search(client, "训练完成 db")["items"] == []
+    assert _search(client, "ok", module="docker")["items"] == []
+
+
+def test_search_short_terms_paging(client):
+    for i in range(5):
+        db.add_history("docker", "ps", {}, True, f"run {i} ok")
+    first = _search(client, "ok", limit=3)
+    assert len(first["items"]) == 3 and first["has_more"]
+    second = _search(client, "ok", limit=3, offset=3)
+    assert len(second["items"]) == 2 and not second["has_more"]
+    ids = [item["id"] for item in first["items"] + second["items"]]
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_search_empty_query_rejected(client):
+    assert client.get("/api/history/search", params={"q": "   "}).status_code in (400, 422)
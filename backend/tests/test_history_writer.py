@@ -0,0 +1,123 @@
+"""
+历史记录后写：flush等待此前入队的记录按顺序写入，缓冲区满（条数或输出字符数）时入队等待
+"""
+
+import pytest
+
+from app.core.database import db
+from app.services import history_writer as history_writer_module
+from app.services.history_writer import HistoryWriter
+
+
+def _record(i: int) -> dict:
+    return {"module": "docker", "command": "ps", "params": {}, "success": True, "output": f"run {i}"}
+
+
+def _outputs() -> list:
+    """按写入顺序（id从小到大）返回输出"""
+    items = db.get_history(limit=200)
+    return [item["output"] for item in sorted(items, key=lambda item: item["id"])]
+
+
+@pytest.mark.anyio
+async def test_flush_writes_buffered_records_in_order():
+    writer = HistoryWriter(max_buffer=100, batch_size=100, flush_interval=60)
+    writer.start()
+    try:
+        for i in range(3):
+            await writer.add(**_record(i))
+        # 未满一批也未到时间，还在缓冲区中
+        assert db.count_history() == 0
+        assert writer.stats()["buffered"] == 3
+
+        await writer.flush()
+        assert _outputs() == ["run 0", "run 1", "run 2"]
+        assert writer.stats()["buffered"] == 0
+
+        await writer.add_many([_record(i) for i in range(3, 6)])
+        await writer.flush()
+        assert _outputs() == [f"run {i}" for i in range(6)]
+        assert writer.batches == 2 and writer.written == 6
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.anyio
+async def test_full_buffer_applies_backpressure():
+    writer = HistoryWriter(max_buffer=2, batch_size=2, flush_interval=60)
+    writer.start()
+    try:
+        for i in range(7):
+            await writer.add(**_record(i))
+            assert writer.stats()["buffered"] <= 2
+        assert writer.backpressure > 0
+        # 缓冲区为空时超过上限的一组也能入队
+        await writer.flush()
+        await writer.add_many([_record(i) for i in range(7, 12)])
+        await writer.flush()
+        assert _outputs() == [f"run {i}" for i in range(12)]
+        assert writer.failed == 0
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.anyio
+async def test_buffer_bounded_by_output_size():
+    """条数未满但输出总字符数达到上限时同样等待写入"""
+    writer = HistoryWriter(max_buffer=100, batch_size=100, flush_interval=60, max_buffer_chars=2500)
+    writer.start()
+    try:
+        for i in range(5):
+            await writer.add(**{**_record(i), "output": f"{i}" * 1000})
+            assert writer.stats()["buffered_chars"] <= 2500
+            assert writer.stats()["buffered"] <= 2
+        assert writer.backpressure > 0
+        await writer.flush()
+        assert writer.stats()["buffered_chars"] == 0
+        assert [output[0] for output in _outputs()] == [str(i) for i in range(5)]
+
+        # 缓冲区为空时超过上限的单条记录也能入队
+        await writer.add(**{**_record(5), "output": "x" * 5000})
+        await writer.flush()
+        assert db.count_history() == 6 and writer.failed == 0
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.anyio
+async def test_add_many_is_written_in_its_own_transaction(monkeypatch):
+    batches = []
+    add_history_batch = history_writer_module.async_db.add_history_batch
+
+    async def recording_batch(records):
+        batches.append([record["output"] for record in records])
+        return await add_history_batch(records)
+
+    monkeypatch.setattr(history_writer_module.async_db, "add_history_batch", recording_batch)
+    writer = HistoryWriter(max_buffer=1000, batch_size=100, flush_interval=60)
+    writer.start()
+    try:
+        for i in range(30):
+            await writer.add(**_record(i))
+        await writer.add_many([_record(i) for i in range(30, 130)])
+        await writer.add(**_record(130))
+        await writer.flush()
+    finally:
+        await writer.stop()
+
+    assert batches == [
+        [f"run {i}" for i in range(30)],
+        [f"run {i}" for i in range(30, 130)],
+        ["run 130"],
+    ]
+    assert _outputs() == [f"run {i}" for i in range(131)]
+
+
+@pytest.mark.anyio
+async def test_stop_writes_remaining_records():
+    writer = HistoryWriter(max_buffer=100, batch_size=100, flush_interval=60)
+    writer.start()
+    await writer.add(**_record(0))
+    await writer.stop()
+    assert _outputs() == ["run 0"]
+    assert not writer.running
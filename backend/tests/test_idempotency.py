@@ -0,0 +1,68 @@
+"""
+幂等键：相同键重试时重放响应不重复执行，不同请求内容使用同一个键时返回422
+"""
+
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from app.api import execute
+from app.models.execute import ExecutionResult
+
+
+@pytest.fixture
+def executions(monkeypatch):
+    """代替实际执行和历史记录写入，记录执行次数"""
+    calls = []
+
+    async def add_history(**record):
+        pass
+
+    async def fake_execute(request, ai_toolkit_path, bounded=True):
+        calls.append(request.params)
+        return ExecutionResult(returncode=0, stdout=f"run {len(calls)}", stderr=""), False
+
+    monkeypatch.setattr(execute, "_execute", fake_execute)
+    monkeypatch.setattr(execute, "get_ai_toolkit_path", lambda: Path("."))
+    monkeypatch.setattr(execute, "validate_params", lambda request: None)
+    monkeypatch.setattr(execute.history_writer, "add", add_history)
+    return calls
+
+
+def _post(client, key: str, params: Optional[dict] = None):
+    return client.post(
+        "/api/execute",
+        json={"module": "docker", "command": "ps", "params": params or {}},
+        headers={"Idempotency-Key": key},
+    )
+
+
+def test_retry_replays_saved_response(client, executions):
+    key = uuid.uuid4().hex
+    first = _post(client, key)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    retry = _post(client, key)
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert len(executions) == 1
+
+    # 其他键正常执行
+    assert _post(client, uuid.uuid4().hex).json()["output"] == "run 2"
+
+
+def test_same_key_different_request_conflicts(client, executions):
+    key = uuid.uuid4().hex
+    assert _post(client, key, {"all": True}).status_code == 200
+    conflict = _post(client, key, {"all": False})
+    assert conflict.status_code == 422
+    assert len(executions) == 1
+
+
+def test_invalid_key_rejected(client, executions):
+    assert _post(client, "x" * 1000).status_code == 400
+    assert executions == []
@@ -0,0 +1,156 @@
+"""
+后台任务：提交后轮询到结束、取消时结束进程，时间字段格式与历史记录一致
+"""
+
+import os
+import re
+import textwrap
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from app.api import jobs as jobs_api
+from app.core.database import db
+from app.services import jobs
+
+TIME_FORMAT = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+
+class _Recorder:
+    """代替history_writer，记录add调用"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    async def add(self, **record: Any):
+        self.records.append(record)
+
+
+@pytest.fixture
+def toolkit(tmp_path, monkeypatch):
+    """假ai_toolkit：echo输出参数，fail以返回码3退出，sleep写入pid后长时间运行"""
+    package = tmp_path / "src" / "ai_toolkit"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "__main__.py").write_text(textwrap.dedent(f"""
+        import os, sys, time
+        command = sys.argv[2]
+        if command == "echo":
+            print(" ".join(sys.argv[3:]))
+        elif command == "fail":
+            print("boom", file=sys.stderr)
+            sys.exit(3)
+        elif command == "sleep":
+            with open({str(tmp_path / "pid")!r}, "w") as f:
+                f.write(str(os.getpid()))
+            print("started", flush=True)
+            time.sleep(30)
+    """))
+    monkeypatch.setattr(jobs_api, "get_ai_toolkit_path", lambda: tmp_path)
+    recorder = _Recorder()
+    monkeypatch.setattr(jobs, "history_writer", recorder)
+    return recorder
+
+
+def _submit(client, command: str, params=None) -> str:
+    response = client.post("/api/jobs", json={"module": "test", "command": command, "params": params or {}})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    return response.json()["job_id"]
+
+
+def _poll(client, job_id: str, until, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if until(job):
+            return job
+        assert time.monotonic() < deadline, job
+        time.sleep(0.02)
+
+
+def _finished(job: dict) -> bool:
+    return job["status"] in jobs.FINISHED_STATUSES
+
+
+def _wait_records(recorder: _Recorder, timeout: float = 5) -> List[Dict[str, Any]]:
+    """任务显示为结束时历史记录可能还在写入，等待记录出现"""
+    deadline = time.monotonic() + timeout
+    while not recorder.records:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return recorder.records
+
+
+def test_submit_and_poll(client, toolkit):
+    job_id = _submit(client, "echo", {"name": "world"})
+    job = _poll(client, job_id, _finished)
+    assert job["status"] == "succeeded"
+    assert job["returncode"] == 0
+    assert job["output"] == "--name world\n"
+
+    # 结束后从数据库读取，结果相同
+    stored = db.get_job(job_id)
+    assert stored["status"] == "succeeded" and stored["output"] == job["output"]
+
+    assert len(_wait_records(toolkit)) == 1
+    record = toolkit.records[0]
+    assert record["success"] is True and record["status"] == "success"
+    assert record["module"] == "test" and record["command"] == "echo"
+
+
+def test_failed_job(client, toolkit):
+    job = _poll(client, _submit(client, "fail"), _finished)
+    assert job["status"] == "failed"
+    assert job["returncode"] == 3
+    assert job["error"] == "boom\n"
+    assert _wait_records(toolkit)[0]["output"] == "boom\n"
+
+
+def test_cancel_running_job(client, toolkit, tmp_path):
+    job_id = _submit(client, "sleep")
+    job = _poll(client, job_id, lambda job: job["output"] == "started\n")
+    assert job["status"] == "running"
+
+    response = client.delete(f"/api/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+    # 进程已被结束并回收
+    pid = int((tmp_path / "pid").read_text())
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+    assert db.get_job(job_id)["status"] == "cancelled"
+    assert client.get(f"/api/jobs/{job_id}").json()["status"] == "cancelled"
+    # 已结束的任务不能再取消，取消的任务不写入历史记录
+    assert client.delete(f"/api/jobs/{job_id}").status_code == 409
+    assert toolkit.records == []
+
+
+def test_unknown_job(client):
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.delete("/api/jobs/missing").status_code == 404
+
+
+def test_timestamps_match_history_format(client, toolkit):
+    job_id = _submit(client, "echo")
+    _poll(client, job_id, _finished)
+
+    stored = db.get_job(job_id)
+    for field in ("created_at", "started_at", "finished_at"):
+        assert TIME_FORMAT.match(stored[field]), (field, stored[field])
+    assert stored["created_at"] <= stored["started_at"] <= stored["finished_at"]
+
+    db.add_history("test", "echo", {}, True, "x")
+    history = client.get("/api/history").json()["items"][0]
+    assert TIME_FORMAT.match(history["created_at"])
+
+
+def test_interrupted_jobs_use_same_format():
+    db.add_job("interrupted-job", "test", "sleep", {}, status="running")
+    db.interrupt_unfinished_jobs()
+    stored = db.get_job("interrupted-job")
+    assert stored["status"] == "interrupted"
+    assert TIME_FORMAT.match(stored["finished_at"])
@@ -0,0 +1,130 @@
+"""
+参数预检：未知参数、必填参数、类型和可选值，不通过时在执行之前返回422
+"""
+
+from pathlib import Path
+
+import pytest
+
+from app.api import execute
+from app.core.config import settings
+from app.services.catalog import catalog
+from app.services.param_validation import ParamValidationError, ParamValidator
+
+PARAMS = [
+    {"name": "query", "type": "textarea", "required": True},
+    {"name": "top", "type": "number", "default": 5},
+    {"name": "verbose", "type": "boolean"},
+    {"name": "provider", "type": "select", "options": ["openai", "anthropic"]},
+]
+
+
+def _errors(validator: ParamValidator, params: dict) -> dict:
+    with pytest.raises(ParamValidationError) as excinfo:
+        validator.validate(params)
+    return {error["loc"][-1]: error["type"] for error in excinfo.value.errors}
+
+
+def test_valid_params_are_normalized():
+    validator = ParamValidator(PARAMS)
+    assert validator.validate({
+        "top": "5", "verbose": "yes", "provider": "anthropic", "query": "hi",
+    }) == {"provider": "anthropic", "query": "hi", "top": 5, "verbose": True}
+    assert validator.validate({"query": "hi", "top": "0.5", "verbose": "off"}) == {
+        "query": "hi", "top": 0.5, "verbose": False,
+    }
+    # 值为空的可选参数被去掉
+    assert validator.validate({"query": "hi", "top": "", "provider": None}) == {"query": "hi"}
+
+
+def test_unknown_param_rejected():
+    validator = ParamValidator(PARAMS)
+    assert _errors(validator, {"query": "hi", "extra": 1}) == {"extra": "value_error.unknown"}
+
+
+def test_unknown_param_allowed_when_configured():
+    validator = ParamValidator(PARAMS, allow_unknown=True)
+    assert validator.validate({"query": "hi", "extra": 1}) == {"extra": 1, "query": "hi"}
+
+
+def test_allow_unknown_setting_applies_to_catalog(monkeypatch):
+    assert not catalog.validator("rag", "search").allow_unknown
+    monkeypatch.setattr(settings, "EXECUTE_ALLOW_UNKNOWN_PARAMS", True)
+    catalog.load_static()
+    try:
+        validator = catalog.validator("rag", "search")
+        assert validator.validate({"query": "hi", "extra": "x"}) == {"extra": "x", "query": "hi"}
+    finally:
+        monkeypatch.undo()
+        catalog.load_static()
+    assert not catalog.validator("rag", "search").allow_unknown
+
+
+def test_required_param_missing():
+    validator = ParamValidator(PARAMS)
+    assert _errors(validator, {}) == {"query": "value_error.missing"}
+    # 空值视为未传
+    assert _errors(validator, {"query": ""}) == {"query": "value_error.missing"}
+
+
+@pytest.mark.parametrize("name,value", [
+    ("top", "abc"),
+    ("top", True),
+    ("top", "inf"),
+    ("verbose", "maybe"),
+    ("provider", "azure"),
+    ("query", {"a": 1}),
+])
+def test_type_errors(name, value):
+    validator = ParamValidator(PARAMS)
+    params = {"query": "hi", name: value}
+    assert _errors(validator, params) == {name: "value_error.type"}
+
+
+def test_all_errors_reported_together():
+    validator = ParamValidator(PARAMS)
+    assert _errors(validator, {"top": "x", "extra": 1}) == {
+        "extra": "value_error.unknown",
+        "top": "value_error.type",
+        "query": "value_error.missing",
+    }
+
+
+def test_with_defaults():
+    validator = ParamValidator(PARAMS)
+    assert validator.with_defaults({"query": "hi"}) == {"query": "hi", "top": 5}
+
+
+@pytest.fixture
+def no_execution(monkeypatch):
+    """参数不合法时不应执行命令"""
+
+    async def fail_execute(*args, **kwargs):
+        raise AssertionError("参数不合法时不应执行")
+
+    monkeypatch.setattr(execute, "_execute", fail_execute)
+    monkeypatch.setattr(execute, "get_ai_toolkit_path", lambda: Path("."))
+
+
+def test_execute_rejects_invalid_params_before_running(client, no_execution):
+    response = client.post("/api/execute", json={
+        "module": "rag", "command": "search", "params": {"top": "many", "extra": "x"},
+    })
+    assert response.status_code == 422
+    errors = {tuple(error["loc"]): error["type"] for error in response.json()["detail"]}
+    assert errors == {
+        ("body", "params", "extra"): "value_error.unknown",
+        ("body", "params", "top"): "value_error.type",
+        ("body", "params", "query"): "value_error.missing",
+    }
+
+
+def test_batch_reports_item_index(client, no_execution):
+    response = client.post("/api/execute/batch", json={"items": [
+        {"module": "rag", "command": "search", "params": {"query": "hi"}},
+        {"module": "ecommerce", "command": "product", "params": {"action": "refund"}},
+    ]})
+    assert response.status_code == 422
+    assert [error["loc"] for error in response.json()["detail"]] == [
+        ["body", "items", 1, "params", "action"],
+    ]
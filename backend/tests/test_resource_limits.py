@@ -0,0 +1,135 @@
+"""
+资源限制：超时结束整个进程组并记录timeout状态，CPU时间和内存限制生效，
+请求覆盖值不超过配置上限
+"""
+
+import asyncio
+import textwrap
+from typing import Any, Dict, List
+
+import pytest
+
+from app.api import execute
+from app.core.config import settings
+from app.models.execute import ExecuteRequest, ResourceLimits
+from app.services import executor
+from app.services.executor import resolve_limits
+
+
+class _Recorder:
+    """代替history_writer，记录add调用"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    async def add(self, **record: Any):
+        self.records.append(record)
+
+
+@pytest.fixture
+def toolkit(tmp_path):
+    """假ai_toolkit，行为由命令决定：
+    sleep 启动一个孙进程后一起长时间运行（两者的pid写入文件），spin 一直占用CPU，
+    alloc 分配512MB内存
+    """
+    package = tmp_path / "src" / "ai_toolkit"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "__main__.py").write_text(textwrap.dedent(f"""
+        import os, subprocess, sys, time
+        command = sys.argv[2]
+        if command == "sleep":
+            child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+            with open({str(tmp_path / "pids")!r}, "w") as f:
+                f.write(f"{{os.getpid()}} {{child.pid}}")
+            print("started", flush=True)
+            time.sleep(30)
+        elif command == "spin":
+            while True:
+                pass
+        elif command == "alloc":
+            data = bytearray(512 * 1024 * 1024)
+            print("allocated")
+    """))
+    return tmp_path
+
+
+def _alive(pid: int) -> bool:
+    """进程存在且不是僵尸进程"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.anyio
+async def test_timeout_kills_process_group_and_records_status(toolkit, monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr(execute, "history_writer", recorder)
+
+    response = await execute._execute_and_record(
+        ExecuteRequest(module="test", command="sleep", timeout=1), toolkit
+    )
+    assert not response.success
+    assert response.status == "timeout"
+    assert response.message == "命令执行超时"
+    assert "命令执行超时（1秒）" in response.output
+
+    # 子进程和它启动的孙进程都已结束
+    pids = [int(pid) for pid in (toolkit / "pids").read_text().split()]
+    # 管道在进程退出过程中就已关闭，稍等进程完全结束
+    for _ in range(50):
+        if not any(_alive(pid) for pid in pids):
+            break
+        await asyncio.sleep(0.02)
+    assert not any(_alive(pid) for pid in pids)
+
+    [record] = recorder.records
+    assert record["status"] == "timeout" and record["success"] is False
+    assert record["duration_ms"] < 10_000
+
+
+@pytest.mark.anyio
+async def test_cpu_limit_stops_busy_process(toolkit):
+    result = await executor.spawn_command(["test", "spin"], toolkit, ResourceLimits(cpu_time=1, timeout=30))
+    assert not result.success and not result.timed_out
+    assert result.returncode < 0  # 被SIGXCPU / SIGKILL结束
+    assert result.cpu_ms >= 900
+
+
+@pytest.mark.anyio
+async def test_memory_limit_fails_large_allocation(toolkit):
+    result = await executor.spawn_command(["test", "alloc"], toolkit, ResourceLimits(memory_mb=128))
+    assert not result.success
+    assert "MemoryError" in result.stderr
+
+    result = await executor.spawn_command(["test", "alloc"], toolkit, ResourceLimits())
+    assert result.success and result.stdout.strip() == "allocated"
+
+
+@pytest.fixture
+def limit_settings(monkeypatch):
+    for name, value in {
+        "EXECUTE_DEFAULT_TIMEOUT": 60, "EXECUTE_MAX_TIMEOUT": 600,
+        "EXECUTE_DEFAULT_CPU_LIMIT": 0, "EXECUTE_MAX_CPU_LIMIT": 120,
+        "EXECUTE_DEFAULT_MEMORY_LIMIT": 0, "EXECUTE_MAX_MEMORY_LIMIT": 0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+
+def test_resolve_limits_precedence(limit_settings):
+    # 全局默认值；0表示不限制
+    assert resolve_limits({}) == ResourceLimits(timeout=60)
+    # 目录中的命令默认值覆盖全局默认值
+    assert resolve_limits({"timeout": 300, "cpu_limit": 30}) == ResourceLimits(timeout=300, cpu_time=30)
+    # 请求覆盖值优先，非正数视为未指定
+    limits = resolve_limits({"timeout": 300}, timeout=10, cpu_limit=5, memory_limit=256)
+    assert limits == ResourceLimits(timeout=10, cpu_time=5, memory_mb=256)
+    assert resolve_limits({"timeout": 300}, timeout=0, cpu_limit=-1) == ResourceLimits(timeout=300)
+
+
+def test_resolve_limits_caps_overrides(limit_settings):
+    # 请求和目录中的值都不超过上限；上限为0时不封顶
+    limits = resolve_limits({"cpu_limit": 1000}, timeout=100_000, memory_limit=1_000_000)
+    assert limits == ResourceLimits(timeout=600, cpu_time=120, memory_mb=1_000_000)
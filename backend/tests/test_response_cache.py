@@ -0,0 +1,62 @@
+"""
+响应缓存：写入后读取到新数据、浏览器不按TTL缓存
+"""
+
+from app.core.database import db
+from app.services.response_cache import response_cache
+
+
+def _add_history(count: int = 1):
+    for i in range(count):
+        db.add_history("docker", "ps", {}, True, f"output {i}")
+
+
+def test_read_endpoints_revalidate(client):
+    _add_history()
+    response = client.get("/api/history")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert "etag" in response.headers
+
+    cached = client.get("/api/history", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.headers["cache-control"] == "no-cache"
+
+
+def test_history_write_then_read_is_fresh(client):
+    _add_history(2)
+    assert client.get("/api/history").json()["total"] == 2
+    hits = response_cache.hits
+    assert client.get("/api/history").json()["total"] == 2
+    assert response_cache.hits == hits + 1
+
+    _add_history()
+    assert client.get("/api/history").json()["total"] == 3
+
+    history_id = client.get("/api/history").json()["items"][0]["id"]
+    assert client.get(f"/api/history/{history_id}").status_code == 200
+    assert client.delete(f"/api/history/{history_id}").status_code == 200
+    assert client.get(f"/api/history/{history_id}").status_code == 404
+    assert client.get("/api/history").json()["total"] == 2
+
+    assert client.delete("/api/history").status_code == 200
+    assert client.get("/api/history").json()["total"] == 0
+
+
+def test_favorite_write_then_read_is_fresh(client):
+    assert client.get("/api/history/favorites").json()["total"] == 0
+    assert client.get("/api/history/favorites/export").json()["total"] == 0
+
+    favorite = client.post("/api/history/favorites", json={"module": "docker", "command": "ps"}).json()
+    assert client.get("/api/history/favorites").json()["total"] == 1
+    assert client.get("/api/history/favorites/export").json()["total"] == 1
+
+    assert client.delete(f"/api/history/favorites/{favorite['id']}").status_code == 200
+    assert client.get("/api/history/favorites").json()["total"] == 0
+    assert client.get("/api/history/favorites/export").json()["total"] == 0
+
+
+def test_cache_key_includes_query_params(client):
+    _add_history(3)
+    assert len(client.get("/api/history?limit=1").json()["items"]) == 1
+    assert len(client.get("/api/history?limit=2").json()["items"]) == 2
@@ -0,0 +1,113 @@
+"""
+结果缓存和请求合并：资源限制不同的请求不共用结果，执行期间被失效的结果不缓存
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from app.api import execute
+from app.models.execute import ExecuteRequest, ExecutionResult, ResourceLimits
+from app.services.result_cache import ResultCache
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """只读、可合并的命令；run_command记录每次调用的资源限制"""
+    calls: List[ResourceLimits] = []
+
+    async def run_command(module, command, params, ai_toolkit_path, limits):
+        calls.append(limits)
+        await asyncio.sleep(0.05)
+        return ExecutionResult(returncode=0, stdout=f"timeout={limits.timeout}", stderr="")
+
+    @asynccontextmanager
+    async def slot(*args: Any, **kwargs: Any):
+        yield 0.0
+
+    monkeypatch.setattr(execute, "find_command", lambda module, command: {"cache_ttl": 60, "coalesce": True})
+    monkeypatch.setattr(execute, "run_command", run_command)
+    monkeypatch.setattr(execute, "_scheduler_slot", slot)
+    monkeypatch.setattr(execute, "result_cache", ResultCache())
+    return calls
+
+
+def _request(**limits: Any) -> ExecuteRequest:
+    return ExecuteRequest(module="docker", command="ps", **limits)
+
+
+@pytest.mark.anyio
+async def test_cache_key_includes_limits(runs):
+    result, cached = await execute._execute(_request(timeout=5), Path("."))
+    assert not cached and result.stdout == "timeout=5"
+
+    result, cached = await execute._execute(_request(timeout=5), Path("."))
+    assert cached and result.stdout == "timeout=5"
+
+    result, cached = await execute._execute(_request(timeout=10), Path("."))
+    assert not cached and result.stdout == "timeout=10"
+    assert [limits.timeout for limits in runs] == [5, 10]
+
+
+@pytest.mark.anyio
+async def test_single_flight_key_includes_limits(runs, monkeypatch):
+    monkeypatch.setattr(execute, "find_command", lambda module, command: {"coalesce": True})
+    results = await asyncio.gather(
+        execute._execute(_request(memory_limit=256), Path(".")),
+        execute._execute(_request(memory_limit=256), Path(".")),
+        execute._execute(_request(memory_limit=512), Path(".")),
+    )
+    assert sorted(limits.memory_mb for limits in runs) == [256, 512]
+    assert all(not cached for _, cached in results)
+
+
+@pytest.mark.anyio
+async def test_result_not_cached_when_invalidated_during_run(runs, monkeypatch):
+    """读命令执行期间写命令完成并失效了模块，读到的旧结果不缓存"""
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_list(module, command, params, ai_toolkit_path, limits):
+        runs.append(limits)
+        started.set()
+        await release.wait()
+        return ExecutionResult(returncode=0, stdout=f"before pull {len(runs)}", stderr="")
+
+    monkeypatch.setattr(execute, "run_command", slow_list)
+    monkeypatch.setattr(execute, "find_command", lambda module, command: {"cache_ttl": 60})
+    read = asyncio.create_task(execute._execute(ExecuteRequest(module="models", command="list"), Path(".")))
+    await started.wait()
+
+    # 并发的 models pull 在读完成之前结束
+    execute.result_cache.invalidate_targets(["models:list"])
+    release.set()
+    result, cached = await read
+    assert not cached and result.stdout == "before pull 1"
+    assert execute.result_cache.stats()["stale_discards"] == 1
+
+    # 下一次读重新执行，之后才被缓存
+    result, cached = await execute._execute(ExecuteRequest(module="models", command="list"), Path("."))
+    assert not cached and result.stdout == "before pull 2"
+    result, cached = await execute._execute(ExecuteRequest(module="models", command="list"), Path("."))
+    assert cached and result.stdout == "before pull 2"
+
+
+def test_invalidate_changes_generation_even_without_entries():
+    cache = ResultCache()
+    generation = cache.generation("models")
+    cache.invalidate("models", "list")
+    assert cache.generation("models") != generation
+    assert cache.generation("docker") == (0, 0)
+
+    key = ResultCache.make_key("models", "list", {}, ResourceLimits())
+    cache.set(key, ExecutionResult(returncode=0, stdout="stale", stderr=""), 60, generation)
+    assert cache.get(key) is None
+
+    generation = cache.generation("docker")
+    cache.clear()
+    key = ResultCache.make_key("docker", "ps", {}, ResourceLimits())
+    cache.set(key, ExecutionResult(returncode=0, stdout="stale", stderr=""), 60, generation)
+    assert cache.get(key) is None
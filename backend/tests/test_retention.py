@@ -0,0 +1,133 @@
+"""
+数据保留：按时间、条数和模块规则分批删除历史记录，默认不删除；增量回收模式的切换
+"""
+
+import os
+import sqlite3
+import time
+import uuid
+from typing import Optional
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import HistoryDatabase, db
+from app.services.artifacts import artifact_store
+from app.services.retention import RetentionManager
+
+
+@pytest.fixture
+def retention(monkeypatch):
+    """批次很小的保留实例，默认关闭全部规则"""
+    for name in ("HISTORY_RETENTION_DAYS", "HISTORY_RETENTION_MAX_ROWS",
+                 "HISTORY_RETENTION_MAX_BYTES", "JOB_RETENTION_DAYS", "RUN_STATS_RETENTION_DAYS"):
+        monkeypatch.setattr(settings, name, 0)
+    monkeypatch.setattr(settings, "HISTORY_RETENTION_MODULES", {})
+    return RetentionManager(batch_size=2, batch_pause=0)
+
+
+def _add(module: str, days_ago: int = 0, artifact_id: Optional[str] = None) -> int:
+    history_id = db.add_history(module, "ps", {}, True, "output", artifact_id=artifact_id)
+    if days_ago:
+        with db._connection() as conn:
+            conn.execute(
+                "UPDATE history SET created_at = datetime('now', ?) WHERE id = ?",
+                (f"-{days_ago} days", history_id),
+            )
+    return history_id
+
+
+def _remaining() -> set:
+    return {item["id"] for item in db.get_history(limit=100)}
+
+
+@pytest.mark.anyio
+async def test_default_policy_keeps_everything(retention):
+    ids = {_add("docker", days_ago=400) for _ in range(3)}
+    result = await retention.run_once()
+    assert _remaining() == ids
+    assert sum(result["deleted"].values()) == 0
+
+
+@pytest.mark.anyio
+async def test_delete_by_age_in_batches(retention, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_RETENTION_DAYS", 30)
+    for _ in range(5):
+        _add("docker", days_ago=60)
+    recent = {_add("docker", days_ago=1), _add("git")}
+
+    result = await retention.run_once()
+    assert result["deleted"]["age"] == 5
+    assert _remaining() == recent
+    assert db.count_history() == 2
+
+
+@pytest.mark.anyio
+async def test_delete_oldest_over_max_rows(retention, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_RETENTION_MAX_ROWS", 3)
+    ids = [_add("docker", days_ago=10 - i) for i in range(7)]
+
+    result = await retention.run_once()
+    assert result["deleted"]["rows"] == 4
+    assert _remaining() == set(ids[4:])
+
+
+@pytest.mark.anyio
+async def test_module_rules_override_global(retention, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "HISTORY_RETENTION_MODULES", {"docker": {"days": 5}, "git": {"max_rows": 1}})
+    docker_recent = _add("docker", days_ago=1)
+    _add("docker", days_ago=10)
+    _add("git", days_ago=3)
+    git_new = _add("git", days_ago=2)
+    _add("models", days_ago=60)
+    models_recent = _add("models", days_ago=10)
+
+    result = await retention.run_once()
+    assert _remaining() == {docker_recent, git_new, models_recent}
+    assert result["deleted"]["age"] == 2 and result["deleted"]["rows"] == 1
+
+
+@pytest.mark.anyio
+async def test_deleted_rows_release_artifacts(retention, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_RETENTION_DAYS", 30)
+    artifact_id = uuid.uuid4().hex
+    _add("docker", days_ago=60, artifact_id=artifact_id)
+    artifact_store.directory.mkdir(parents=True, exist_ok=True)
+    path = artifact_store.directory / f"{artifact_id}.log"
+    path.write_text("full output")
+    old = time.time() - 60 * 86400
+    os.utime(path, (old, old))
+
+    result = await retention.run_once()
+    assert result["deleted"]["age"] == 1
+    assert artifact_store.path_for(artifact_id) is None
+
+
+def test_new_database_uses_incremental_vacuum(tmp_path):
+    database = HistoryDatabase(str(tmp_path / "new.db"), pool_size=1)
+    assert database.get_storage_stats()["auto_vacuum"] == "incremental"
+    database.close()
+
+
+def test_existing_database_is_converted_only_on_request(tmp_path, client):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE filler (data TEXT)")
+    conn.executemany("INSERT INTO filler VALUES (?)", [("x" * 1000,) for _ in range(100)])
+    conn.commit()
+    conn.close()
+
+    # 打开时不执行VACUUM
+    database = HistoryDatabase(str(path), pool_size=1)
+    assert database.get_storage_stats()["auto_vacuum"] == "none"
+
+    result = database.enable_incremental_vacuum()
+    assert result["converted"] and result["auto_vacuum"] == "incremental"
+    assert database.get_storage_stats()["auto_vacuum"] == "incremental"
+    assert not database.enable_incremental_vacuum()["converted"]
+    database.close()
+
+    response = client.post("/api/admin/db/vacuum")
+    assert response.status_code == 200
+    assert response.json()["result"]["auto_vacuum"] == "incremental"
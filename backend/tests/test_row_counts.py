@@ -0,0 +1,116 @@
+"""
+计数表：插入、删除、批量删除后列表总数与实际行数一致
+"""
+
+import sqlite3
+
+from app.core.database import HistoryDatabase, db
+
+
+def _actual(module=None, command=None) -> int:
+    conditions, params = [], []
+    for column, value in (("module", module), ("command", command)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with db._connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM history {where}", params).fetchone()[0]
+
+
+def _assert_counts():
+    for module, command in ((None, None), ("docker", None), (None, "ps"),
+                            ("docker", "ps"), ("git", "status"), ("git", "ps")):
+        assert db.count_history(module, command) == _actual(module, command), (module, command)
+
+
+def _record(module: str, command: str, success: bool = True) -> dict:
+    return {"module": module, "command": command, "params": {}, "success": success, "output": "x"}
+
+
+def test_history_counts_follow_inserts_and_deletes():
+    ids = [db.add_history("docker", "ps", {}, True, "x") for _ in range(3)]
+    db.add_history("git", "status", {}, True, "x")
+    db.add_history_batch([_record("git", "ps"), _record("docker", "ps", success=False)])
+    _assert_counts()
+    assert db.count_history() == 6
+    assert db.count_history("docker", "ps") == 4
+    assert db.count_history(command="ps") == 5
+
+    db.delete_history(ids[0])
+    db.delete_history(ids[0])  # 已删除的记录不重复计数
+    _assert_counts()
+
+    assert db.delete_history_batch([ids[1], ids[1], 999999]) == 1
+    _assert_counts()
+
+    assert db.delete_history_where(module="docker", success=False) == 1
+    _assert_counts()
+
+    db.delete_oldest_history(1, module="git")
+    _assert_counts()
+
+    db.clear_history()
+    _assert_counts()
+    assert db.count_history() == 0
+    assert db.count_history("docker") == 0
+
+
+def test_favorite_counts():
+    favorites = [db.add_favorite("docker", "ps", name=f"f{i}") for i in range(3)]
+    assert db.count_favorites() == 3
+
+    db.delete_favorite(favorites[0]["id"])
+    assert db.count_favorites() == 2
+
+    db.add_favorites_batch([{"module": "git", "command": "status"}], skip_duplicates=False)
+    db.delete_favorites_batch([favorite["id"] for favorite in favorites])
+    assert db.count_favorites() == len(db.export_favorites()) == 1
+
+
+def test_listing_total_uses_counts(client):
+    for _ in range(3):
+        db.add_history("docker", "ps", {}, True, "x")
+    db.add_history("git", "status", {}, True, "x")
+
+    assert client.get("/api/history", params={"limit": 1}).json()["total"] == 4
+    assert client.get("/api/history", params={"module": "docker"}).json()["total"] == 3
+    assert client.get("/api/history", params={"module": "docker", "command": "status"}).json()["total"] == 0
+
+    db.add_favorite("docker", "ps")
+    db.add_favorite("git", "status")
+    assert client.get("/api/history/favorites", params={"limit": 1}).json()["total"] == 2
+
+
+def test_existing_database_counts_are_rebuilt(tmp_path):
+    path = tmp_path / "old.db"
+    HistoryDatabase(str(path)).close()
+    # 模拟升级前的数据库：有数据但没有计数表和触发器
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE row_counts")
+    for trigger in ("history_count_insert", "history_count_delete",
+                    "favorites_count_insert", "favorites_count_delete"):
+        conn.execute(f"DROP TRIGGER {trigger}")
+    conn.execute("""
+        INSERT INTO history (timestamp, module, command, params, success, output)
+        VALUES ('t', 'docker', 'ps', '{}', 1, 'x'), ('t', 'git', 'status', '{}', 1, 'x')
+    """)
+    conn.execute("INSERT INTO favorites (module, command) VALUES ('docker', 'ps')")
+    conn.commit()
+    conn.close()
+
+    upgraded = HistoryDatabase(str(path))
+    try:
+        # 启动时不重建，重建完成前直接统计
+        assert upgraded.pending_migrations() == ["row_counts"]
+        upgraded.add_history("docker", "ps", {}, True, "x")
+        for rebuilt in (False, True):
+            assert upgraded.count_history() == 3
+            assert upgraded.count_history("docker", "ps") == 2
+            assert upgraded.count_history(command="status") == 1
+            assert upgraded.count_favorites() == 1
+            # 后台重建后从计数表读取，结果相同
+            assert upgraded.rebuild_counts() is not rebuilt
+        assert upgraded.pending_migrations() == []
+    finally:
+        upgraded.close()
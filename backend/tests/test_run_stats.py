@@ -0,0 +1,116 @@
+"""
+执行统计：子进程资源使用的采集、按小时的汇总和 /api/history/stats
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import uuid
+
+import pytest
+
+from app.core.database import db
+from app.services import executor
+
+
+@pytest.fixture
+def module() -> str:
+    """汇总表不随历史记录清空，每个测试用独立的模块名"""
+    return f"stats-{uuid.uuid4().hex[:8]}"
+
+
+def _record(module: str, command: str, success: bool, duration_ms: float, **usage) -> dict:
+    return {"module": module, "command": command, "params": {}, "success": success,
+            "output": "", "duration_ms": duration_ms, **usage}
+
+
+@pytest.mark.anyio
+async def test_spawn_records_resource_usage(tmp_path):
+    package = tmp_path / "src" / "ai_toolkit"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "__main__.py").write_text(textwrap.dedent("""
+        data = bytearray(32 * 1024 * 1024)
+        total = sum(range(2_000_000))
+        print(total)
+    """))
+    result = await executor.spawn_command(["docker", "ps"], tmp_path)
+    assert result.success
+    assert result.cpu_ms > 0
+    assert result.max_rss_kb > 32 * 1024
+    assert set(result.usage()) >= {"cpu_ms", "max_rss_kb", "queue_ms"}
+
+
+def test_wait4_after_loop_closed_is_ignored():
+    """事件循环关闭后子进程才结束，回收线程不报错"""
+    errors = []
+    hook = threading.excepthook
+    threading.excepthook = errors.append
+    try:
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"])
+        loop = asyncio.new_event_loop()
+
+        async def start():
+            executor._wait4(process.pid)
+
+        loop.run_until_complete(start())
+        loop.close()
+        thread = next(t for t in threading.enumerate() if t.name == f"wait4-{process.pid}")
+        thread.join(timeout=5)
+    finally:
+        threading.excepthook = hook
+    assert errors == []
+
+
+def test_rollups_aggregate_runs(module):
+    db.add_history_batch([
+        _record(module, "ps", True, 100, queue_ms=10, cpu_ms=50, max_rss_kb=1000),
+        _record(module, "ps", True, 200, queue_ms=30, cpu_ms=150, max_rss_kb=3000),
+        _record(module, "ps", False, 300),  # 命中缓存或未测量：不计入排队和CPU平均值
+        _record(module, "logs", True, 1000, cpu_ms=10),
+    ])
+    db.add_history(module, "ps", {}, True, "")  # 没有耗时的记录不计入统计
+
+    data = db.get_run_stats("2000-01-01 00:00:00", module=module)
+    rows = {row["command"]: row for row in data["rollups"]}
+    assert rows["ps"]["runs"] == 3 and rows["ps"]["successes"] == 2
+    assert rows["ps"]["total_ms"] == 600
+    assert rows["ps"]["queue_runs"] == 2 and rows["ps"]["total_queue_ms"] == 40
+    assert rows["ps"]["cpu_runs"] == 2 and rows["ps"]["total_cpu_ms"] == 200
+    assert rows["ps"]["max_rss_kb"] == 3000
+    assert rows["logs"]["max_rss_kb"] is None
+    assert sum(data["bins"][(module, "ps")].values()) == 3
+
+
+def test_stats_endpoint(client, module):
+    db.add_history_batch(
+        [_record(module, "ps", True, 100, queue_ms=10, cpu_ms=20, max_rss_kb=500) for _ in range(9)]
+        + [_record(module, "ps", False, 1000, queue_ms=30, cpu_ms=40, max_rss_kb=700)]
+        + [_record(module, "logs", True, 50) for _ in range(2)]
+    )
+    response = client.get("/api/history/stats", params={"window": "1h", "module": module})
+    assert response.status_code == 200
+    data = response.json()
+
+    total = data["total"]
+    assert total["runs"] == 12 and total["successes"] == 11
+    assert total["max_rss_kb"] == 700
+
+    commands = {item["command"]: item for item in data["commands"]}
+    assert [item["command"] for item in data["commands"]] == ["ps", "logs"]
+    ps = commands["ps"]
+    assert ps["success_rate"] == 0.9
+    assert ps["avg_ms"] == 190
+    assert ps["avg_queue_ms"] == 12 and ps["avg_cpu_ms"] == 22
+    # 分位数为对数分桶的估算值，相对误差约5%
+    assert ps["p50_ms"] == pytest.approx(100, rel=0.05)
+    assert ps["p99_ms"] == pytest.approx(1000, rel=0.05)
+    assert commands["logs"]["avg_queue_ms"] is None
+
+    assert data["interval"] == "hour"
+    assert sum(point["runs"] for point in data["series"]) == 12
+
+    assert client.get("/api/history/stats", params={"window": "2h"}).status_code == 422
@@ -0,0 +1,106 @@
+"""
+执行调度：通道等待队列满时拒绝，API返回429和Retry-After
+"""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.api import execute
+from app.services.scheduler import AdmissionScheduler, SchedulerBusy
+
+
+def _scheduler(max_queue: int) -> AdmissionScheduler:
+    return AdmissionScheduler(
+        max_concurrency=4,
+        lanes={
+            "interactive": {"max_concurrency": 1, "max_queue": max_queue},
+            "heavy": {"max_concurrency": 1, "max_queue": max_queue},
+        },
+        module_concurrency=4,
+    )
+
+
+@pytest.mark.anyio
+async def test_full_queue_rejects_with_retry_after():
+    scheduler = _scheduler(max_queue=1)
+    release = asyncio.Event()
+
+    async def hold(bounded: bool = True):
+        async with scheduler.slot("docker", bounded=bounded):
+            await release.wait()
+
+    running = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert scheduler.stats()["lanes"]["interactive"]["queue_depth"] == 1
+
+    with pytest.raises(SchedulerBusy) as busy:
+        async with scheduler.slot("docker"):
+            pass
+    assert busy.value.retry_after >= 1
+    assert scheduler.stats()["lanes"]["interactive"]["rejected"] == 1
+
+    # 其他通道不受影响；不受队列上限约束的请求照常排队
+    async with scheduler.slot("docker", lane="heavy"):
+        pass
+    unbounded = asyncio.create_task(hold(bounded=False))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["lanes"]["interactive"]["queue_depth"] == 2
+
+    release.set()
+    await asyncio.gather(running, queued, unbounded)
+    assert scheduler.stats()["lanes"]["interactive"]["admitted"] == 3
+
+
+def test_api_returns_429_with_retry_after(client, monkeypatch):
+    scheduler = _scheduler(max_queue=0)
+    lane = scheduler._lanes["interactive"]
+    lane.semaphore = asyncio.Semaphore(0)  # 名额已全部占用
+    lane.running = 1
+    lane.avg_run = 2.5
+    monkeypatch.setattr(execute, "scheduler", scheduler)
+    monkeypatch.setattr(execute, "get_ai_toolkit_path", lambda: Path("."))
+    monkeypatch.setattr(execute, "find_command", lambda module, command: {})
+
+    response = client.post("/api/execute", json={"module": "docker", "command": "ps"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert lane.rejected == 1
+    assert client.get("/api/history").json()["total"] == 0
+
+
+@pytest.mark.anyio
+async def test_saturated_module_does_not_block_other_modules():
+    scheduler = AdmissionScheduler(
+        max_concurrency=8,
+        lanes={
+            "interactive": {"max_concurrency": 8, "max_queue": 32},
+            "heavy": {"max_concurrency": 2, "max_queue": 8},
+        },
+        module_concurrency=4,
+    )
+    release = asyncio.Event()
+
+    async def hold(module: str):
+        async with scheduler.slot(module):
+            await release.wait()
+
+    models = [asyncio.create_task(hold("models")) for _ in range(8)]
+    await asyncio.sleep(0)
+    stats = scheduler.stats()
+    assert stats["modules"]["models"] == {"running": 4, "queue_depth": 4}
+    assert stats["lanes"]["interactive"]["running"] == 4
+
+    # models排满后，api模块的请求不需要等待
+    async def run_api() -> int:
+        async with scheduler.slot("api"):
+            return scheduler.stats()["modules"]["api"]["running"]
+
+    assert await asyncio.wait_for(run_api(), timeout=1) == 1
+
+    release.set()
+    await asyncio.gather(*models)
+    assert scheduler.stats()["lanes"]["interactive"]["admitted"] == 9
@@ -0,0 +1,89 @@
+"""
+常驻进程池：命令开始执行后出错不回退重新执行，进程池不可用时唤醒等待的调用
+"""
+
+import asyncio
+import textwrap
+
+import pytest
+
+from app.models.execute import ResourceLimits
+from app.services import executor
+from app.services.executor import build_env
+from app.services.worker_pool import WorkerJobFailed, WorkerPool, WorkerUnavailable
+
+
+@pytest.fixture
+def toolkit(tmp_path):
+    """每次执行在runs.log追加参数；参数为crash时结束所在的常驻进程"""
+    package = tmp_path / "src" / "ai_toolkit"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "__main__.py").write_text(textwrap.dedent(f"""
+        import os, signal, sys, time
+        with open({str(tmp_path / "runs.log")!r}, "a") as f:
+            f.write(" ".join(sys.argv[1:]) + "\\n")
+        # 只结束常驻进程（回退到新进程执行时父进程是测试进程本身）
+        parent = open(f"/proc/{{os.getppid()}}/cmdline", "rb").read()
+        if "crash" in sys.argv and b"worker.py" in parent:
+            os.kill(os.getppid(), signal.SIGKILL)
+            time.sleep(0.5)
+        print("ok")
+    """))
+    return tmp_path
+
+
+def _runs(toolkit) -> list:
+    path = toolkit / "runs.log"
+    return path.read_text().splitlines() if path.exists() else []
+
+
+@pytest.mark.anyio
+async def test_crash_after_start_is_not_retried(toolkit, monkeypatch):
+    pool = WorkerPool(size=1, max_jobs=100)
+    await pool.start(toolkit, build_env(toolkit))
+    monkeypatch.setattr(executor, "worker_pool", pool)
+    try:
+        result = await executor.run_command("docker", "ps", {}, toolkit)
+        assert result.success and result.stdout.strip() == "ok"
+
+        with pytest.raises(WorkerJobFailed):
+            await executor.run_command("docker", "crash", {}, toolkit)
+        assert _runs(toolkit) == ["docker ps", "docker crash"]
+    finally:
+        await pool.stop()
+
+
+@pytest.mark.anyio
+async def test_unavailable_before_start_falls_back(toolkit, monkeypatch):
+    pool = WorkerPool(size=1)
+    pool.started = True  # 已启动但没有可用进程
+    monkeypatch.setattr(executor, "worker_pool", pool)
+    result = await executor.run_command("docker", "ps", {}, toolkit)
+    assert result.success
+    assert _runs(toolkit) == ["docker ps"]
+
+
+class _DeadWorker:
+    async def close(self):
+        pass
+
+
+@pytest.mark.anyio
+async def test_waiters_released_when_pool_becomes_unavailable(monkeypatch):
+    pool = WorkerPool(size=1)
+    pool.available = True
+    pool._idle = asyncio.Queue()  # 唯一的进程正在使用
+
+    waiters = [asyncio.create_task(pool.run(["docker", "ps"], ResourceLimits())) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    async def spawn_fails():
+        raise OSError("无法启动")
+
+    monkeypatch.setattr(pool, "_spawn_worker", spawn_fails)
+    await pool._replace(_DeadWorker())
+    assert not pool.available
+
+    results = await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True), timeout=1)
+    assert all(isinstance(result, WorkerUnavailable) for result in results)
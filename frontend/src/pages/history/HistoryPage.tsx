@@ -12,6 +12,7 @@ import {
   Input,
   Tooltip,
   Popconfirm,
+  Modal,
   message,
 } from 'antd'
 import {
@@ -47,7 +48,9 @@ interface HistoryItem {
   command: string
   params: Record&lt;string, any&gt;
   success: boolean
-  output: string
+  output: string // 列表中为输出预览，完整输出通过 GET /history/{id} 获取
+  output_size?: number
+  output_truncated?: boolean
   created_at: string
 }
 
@@ -66,6 +69,8 @@ const HistoryPage: React.FC = () =&gt; {
   const [statusFilter, setStatusFilter] = useState&lt;string&gt;('all')
   const [moduleFilter, setModuleFilter] = useState&lt;string&gt;('all')
   const [data, setData] = useState&lt;HistoryItem[]&gt;([])
+  const [detail, setDetail] = useState&lt;HistoryItem | null&gt;(null)
+  const [detailLoading, setDetailLoading] = useState(false)
 
   // 获取历史记录
   const fetchHistory = async () =&gt; {
@@ -137,6 +142,19 @@ const HistoryPage: React.FC = () =&gt; {
     }
   }
 
+  // 查看完整输出
+  const showDetail = async (id: number) =&gt; {
+    setDetailLoading(true)
+    try {
+      const response = await apiClient.get&lt;HistoryItem&gt;(`/history/${id}`)
+      setDetail(response.data)
+    } catch (error: any) {
+      message.error('获取完整输出失败: ' + (error.response?.data?.detail || error.message))
+    } finally {
+      setDetailLoading(false)
+    }
+  }
+
   const reRun = (item: HistoryItem) =&gt; {
     navigate(`/tools/${item.module}/${item.command}`)
   }
@@ -198,9 +216,20 @@ const HistoryPage: React.FC = () =&gt; {
       dataIndex: 'output',
       key: 'output',
       ellipsis: true,
-      render: (text) =&gt; (
-        &lt;Tooltip title={text}&gt;
-          &lt;Text type="secondary" ellipsis={{ rows: 1 }}&gt;
+      render: (text, record) =&gt; (
+        &lt;Tooltip
+          title={
+            record.output_truncated
+              ? `${text}…（共 ${record.output_size} 字符，点击查看完整输出）`
+              : text
+          }
+        &gt;
+          &lt;Text
+            type="secondary"
+            ellipsis={{ rows: 1 }}
+            style={{ cursor: 'pointer' }}
+            onClick={() =&gt; showDetail(record.id)}
+          &gt;
             {text}
           &lt;/Text&gt;
         &lt;/Tooltip&gt;
@@ -338,6 +367,23 @@ const HistoryPage: React.FC = () =&gt; {
           scroll={{ x: 1200 }}
         /&gt;
       &lt;/Card&gt;
+
+      {/* 完整输出 */}
+      &lt;Modal
+        title={detail ? `${detail.module} ${detail.command} 的输出` : '输出'}
+        open={detail !== null || detailLoading}
+        onCancel={() =&gt; setDetail(null)}
+        footer={null}
+        width={800}
+      &gt;
+        {detailLoading ? (
+          &lt;Loading tip="正在加载输出..." fullscreen={false} /&gt;
+        ) : (
+          &lt;pre style={{ maxHeight: '60vh', overflow: 'auto', whiteSpace: 'pre-wrap' }}&gt;
+            {detail?.output}
+          &lt;/pre&gt;
+        )}
+      &lt;/Modal&gt;
     &lt;/div&gt;
   )
 }